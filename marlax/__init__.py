@@ -1,2 +1,3 @@
 from marlax.engines import Engine
-from marlax.tracers import Tracer
\ No newline at end of file
+from marlax.tracers import Tracer
+from marlax.qtables import DenseQTable, StateIndexer
\ No newline at end of file
@@ -11,6 +11,13 @@ class Agent(ABC):
     def update(self, state_key, action, reward, next_state_key, alpha=0.1, gamma=0.99):
         raise NotImplementedError("Update method not implemented.")
     
+    def remember_max_state(self, possible_states):
+        """
+        Return the best of the possible states. Agents may remember it to answer a
+        following `choose` on the same candidate list without searching again.
+        """
+        return self.get_max_state(possible_states)
+    
 class Environment(ABC):
     @abstractmethod
     def reset(self):
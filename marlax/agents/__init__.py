@@ -1,2 +1,3 @@
 from marlax.agents.qagent import QAgent
-from marlax.agents.qvagent import QValueAgent
\ No newline at end of file
+from marlax.agents.qvagent import QValueAgent
+from marlax.agents.deepqagent import DeepQAgent
\ No newline at end of file
@@ -0,0 +1,267 @@
+from marlax.abstracts import Agent
+from marlax.envs.gridworld.tables import REWARD_TARGETS
+
+import random
+import numpy as np
+
+class ReplayBuffer:
+    def __init__(self, capacity, state_width):
+        """
+        Fixed-size ring buffer of transitions, stored as one preallocated array per field.
+
+        States are stored as the feature rows of QNetwork.encode, so a transition
+        takes 2 * state_width int32 plus one float32 whatever the grid size.
+        Once full, new transitions overwrite the oldest ones.
+
+        Args:
+            capacity (int): Maximum number of transitions kept.
+            state_width (int): Feature rows per state.
+        """
+        self.capacity = capacity
+        self.states = np.zeros((capacity, state_width), dtype=np.int32)
+        self.next_states = np.zeros((capacity, state_width), dtype=np.int32)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.position = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state, reward, next_state):
+        i = self.position
+        self.states[i] = state
+        self.next_states[i] = next_state
+        self.rewards[i] = reward
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, batch_size, generator):
+        """Return (states, rewards, next_states) of batch_size transitions drawn uniformly with replacement."""
+        ids = generator.integers(0, self.size, batch_size)
+        return self.states[ids], self.rewards[ids], self.next_states[ids]
+
+class QNetwork:
+    def __init__(self, grid, n_agents, targets = REWARD_TARGETS, hidden = 64, learning_rate = 1e-3, seed = None):
+        """
+        Two-layer perceptron estimating the value of a global state, with a target copy.
+
+        A state ((pos1, pos2, ...), target) is given to the network as one-hot
+        columns and rows of every agent plus a one-hot target, so the input has
+        n_agents * (width + height) + len(targets) features instead of one entry per
+        state like the tables. Only the 2 * n_agents + 1 active features are
+        stored: the first layer is a sum of the weight rows they select.
+
+        Args:
+            grid (tuple): (width, height) of the grid.
+            n_agents (int): Number of agents in the state.
+            targets (tuple): Reward targets of the states.
+            hidden (int): Units of the hidden layer.
+            learning_rate (float): Step size of the Adam optimizer.
+            seed (int): Seed of the weight initialization.
+        """
+        self.grid = tuple(grid)
+        self.n_agents = n_agents
+        self.targets = tuple(targets)
+        self.target_codes = {target: code for code, target in enumerate(self.targets)}
+        self.learning_rate = learning_rate
+        width, height = self.grid
+        self.n_features = n_agents * (width + height) + len(self.targets)
+        # Feature row of x and of y for every agent: x, then width + y, in the agent's block.
+        self.x_offsets = [i * (width + height) for i in range(n_agents)]
+        self.y_offsets = [offset + width for offset in self.x_offsets]
+        self.target_offset = n_agents * (width + height)
+
+        generator = np.random.default_rng(seed)
+        # He initialization; every state activates 2 * n_agents + 1 input features.
+        self.params = {
+            "w1": (generator.standard_normal((self.n_features, hidden)) * np.sqrt(2 / (2 * n_agents + 1))).astype(np.float32),
+            "b1": np.zeros(hidden, dtype=np.float32),
+            "w2": (generator.standard_normal(hidden) * np.sqrt(2 / hidden)).astype(np.float32),
+            "b2": np.zeros((), dtype=np.float32),
+        }
+        self.target_params = {name: value.copy() for name, value in self.params.items()}
+        self.moments = {name: (np.zeros_like(value), np.zeros_like(value)) for name, value in self.params.items()}
+        self.n_updates = 0
+
+    def encode(self, state_key):
+        """Return the active feature rows of a state key, an int32 array of 2 * n_agents + 1."""
+        positions, target = state_key
+        rows = []
+        for (x, y), x_offset, y_offset in zip(positions, self.x_offsets, self.y_offsets):
+            rows.append(x_offset + x)
+            rows.append(y_offset + y)
+        rows.append(self.target_offset + self.target_codes[target])
+        return np.array(rows, dtype=np.int32)
+
+    def values(self, rows, target = False):
+        """Values of a batch of states encoded as rows of shape (n, 2 * n_agents + 1), from the target network if `target`."""
+        params = self.target_params if target else self.params
+        hidden = np.maximum(params["w1"][rows].sum(axis=1) + params["b1"], 0)
+        return hidden @ params["w2"] + params["b2"]
+
+    def candidate_values(self, possible_states):
+        """
+        Values of all candidate states with one pass through the network.
+
+        For a CandidateStates the first layer is built from each agent's distinct
+        next positions and broadcast over their product, in candidate order, so the
+        states are never materialized; the output layer is one matrix product.
+        """
+        params = self.params
+        if not hasattr(possible_states, "agent_neighbors"):
+            return self.values(np.stack([self.encode(state_key) for state_key in possible_states]))
+        w1 = params["w1"]
+        pre_activation = (w1[self.target_offset + self.target_codes[possible_states.target]] + params["b1"])[None, :]
+        for neighbors, x_offset, y_offset in zip(possible_states.agent_neighbors, self.x_offsets, self.y_offsets):
+            cells = np.array(neighbors).reshape(-1, 2)
+            contribution = w1[x_offset + cells[:, 0]] + w1[y_offset + cells[:, 1]]
+            # The last agent varies fastest, like the product of CandidateStates.
+            pre_activation = (pre_activation[:, None, :] + contribution[None, :, :]).reshape(-1, w1.shape[1])
+        return np.maximum(pre_activation, 0) @ params["w2"] + params["b2"]
+
+    def train_step(self, states, rewards, next_states, gamma):
+        """
+        One Adam step on the squared TD errors of a minibatch, bootstrapping from the target network.
+
+        Returns:
+            td_errors (np.ndarray): TD errors of the minibatch before the step.
+        """
+        params = self.params
+        td_targets = rewards + gamma * self.values(next_states, target=True)
+        pre_activation = params["w1"][states].sum(axis=1) + params["b1"]
+        hidden = np.maximum(pre_activation, 0)
+        td_errors = td_targets - (hidden @ params["w2"] + params["b2"])
+
+        # Gradients of the mean of 0.5 * td_error ** 2.
+        d_values = -td_errors / len(td_errors)
+        d_hidden = d_values[:, None] * params["w2"][None, :] * (pre_activation > 0)
+        # The rows of one state are distinct, so the one-hot inputs can be scattered without np.add.at.
+        inputs = np.zeros((len(states), self.n_features), dtype=np.float32)
+        inputs[np.arange(len(states))[:, None], states] = 1
+        grads = {"w1": inputs.T @ d_hidden, "b1": d_hidden.sum(axis=0), "w2": hidden.T @ d_values, "b2": d_values.sum()}
+
+        self.n_updates += 1
+        beta1, beta2, eps = 0.9, 0.999, 1e-8
+        step_size = self.learning_rate * np.sqrt(1 - beta2 ** self.n_updates) / (1 - beta1 ** self.n_updates)
+        for name, grad in grads.items():
+            mean, square = self.moments[name]
+            mean *= beta1
+            mean += (1 - beta1) * grad
+            square *= beta2
+            square += (1 - beta2) * grad * grad
+            params[name] = (params[name] - step_size * mean / (np.sqrt(square) + eps)).astype(np.float32)
+        return td_errors
+
+    def sync_target(self):
+        """Copy the online weights into the target network."""
+        self.target_params = {name: value.copy() for name, value in self.params.items()}
+
+class DeepQAgent(Agent):
+    def __init__(self, grid, n_agents, init_position = None, actions = ['stay', 'up', 'down', 'left', 'right'],
+                 targets = REWARD_TARGETS, hidden = 64, learning_rate = 1e-3, batch_size = 32, train_every = 4,
+                 target_update_every = 250, replay_capacity = 50_000, q_table = None, rng = None, seed = None):
+        """
+        Initialize an agent that learns values of global states with a neural network.
+
+        The agent plays like QValueAgent: it moves towards the candidate next state
+        of highest value. Values come from a QNetwork instead of a table, so its
+        memory grows with the width and height of the grid, not with the number of
+        states. Transitions go to a replay buffer; every `train_every` updates one
+        minibatch of `batch_size` is drawn from it and the network takes one Adam
+        step towards r + gamma * V_target(s'), the target network being refreshed
+        every `target_update_every` minibatches.
+
+        The network is kept in `q_table`, so the engine checkpoints and the Tracer
+        pickles it like the Q-tables (format="npy" is for tables only); the replay
+        buffer starts empty after a resume.
+
+        Args:
+            grid (tuple): (width, height) of the grid.
+            n_agents (int): Number of agents in the state.
+            init_position (tuple): The (x, y) starting coordinates.
+            actions (list): List of possible actions.
+            targets (tuple): Reward targets of the states, see QNetwork.
+            hidden (int): Units of the hidden layer.
+            learning_rate (float): Step size of the network; `alpha` of `update` is not used.
+            batch_size (int): Transitions per minibatch.
+            train_every (int): Updates between minibatches.
+            target_update_every (int): Minibatches between target network refreshes.
+            replay_capacity (int): Transitions kept in the replay buffer.
+            q_table (QNetwork): Optional network to start from.
+            rng (marlax.rng.RandomStream): Optional exploration stream. Defaults to
+                the global `random` module.
+            seed (int): Seed of the weights and of the minibatch sampling. Drawn from
+                the global `random` module if None.
+        """
+        self.position = init_position
+        self.actions = actions
+        self.rng = rng
+        seed = random.getrandbits(63) if seed is None else seed
+        self.q_table = QNetwork(grid, n_agents, targets, hidden, learning_rate, seed) if q_table is None else q_table
+        self.batch_size = batch_size
+        self.train_every = train_every
+        self.target_update_every = target_update_every
+        self.replay = ReplayBuffer(replay_capacity, 2 * n_agents + 1)
+        self.generator = np.random.default_rng(seed + 1)
+        self.n_steps = 0
+        # (candidate list, best position) from remember_max_state, valid until the next minibatch.
+        self._max_state_memo = None
+
+        self.action_map = {
+                (0, 0):'stay',
+                (0, -1):'up',
+                (0, 1):'down',
+                (-1, 0):'left',
+                (1, 0):'right',
+            }
+
+    def _max_state_id(self, possible_states):
+        memo = self._max_state_memo
+        if memo is not None and memo[0] is possible_states:
+            return memo[1]
+        return int(np.argmax(self.q_table.candidate_values(possible_states)))
+
+    def choose(self, possible_states, epsilon=0.1, agent_id = 0):
+        rng = self.rng or random
+        if rng.random() < epsilon:
+            return rng.choice(self.actions)
+        next_pos = possible_states[self._max_state_id(possible_states)][0][agent_id]
+        return self.action_map[(next_pos[0] - self.position[0], next_pos[1] - self.position[1])]
+
+    def get_max_state(self, possible_states):
+        return possible_states[self._max_state_id(possible_states)]
+
+    def remember_max_state(self, possible_states):
+        """Return the best of the possible states and remember it for the following `choose`."""
+        self._max_state_memo = None
+        max_state_id = self._max_state_id(possible_states)
+        self._max_state_memo = (possible_states, max_state_id)
+        return possible_states[max_state_id]
+
+    def update(self, state_key, action, reward, next_state_key, alpha=0.1, gamma=0.99):
+        """
+        Store the transition and, every `train_every` calls, train on a minibatch.
+
+        Args:
+            state_key: Current global state key.
+            action (str): Action taken, unused like in QValueAgent.
+            reward (float): Immediate reward received.
+            next_state_key: Best next global state key.
+            alpha (float): Unused, the network learns with its own learning rate.
+            gamma (float): Discount factor.
+
+        Returns:
+            td_error (float): Mean absolute TD error of the minibatch trained on, or None
+                when this call did not train.
+        """
+        network = self.q_table
+        self.replay.add(network.encode(state_key), reward, network.encode(next_state_key))
+        self.n_steps += 1
+        if self.n_steps % self.train_every == 0 and len(self.replay) >= self.batch_size:
+            td_errors = network.train_step(*self.replay.sample(self.batch_size, self.generator), gamma)
+            if network.n_updates % self.target_update_every == 0:
+                network.sync_target()
+            # Every value changed, the remembered best state may be stale.
+            self._max_state_memo = None
+            return float(np.abs(td_errors).mean())
+        return None
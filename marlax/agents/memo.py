@@ -0,0 +1,50 @@
+class MaxStateMemo:
+    """
+    Mixin for tabular agents that remembers the best state of a candidate list.
+
+    The engine enumerates the candidate states once per step: it asks for the
+    best next state with `remember_max_state`, updates the Q-table, then passes
+    the very same list to `choose` on the next step. Between those calls only
+    the value of the updated state changes, so the remembered argmax is patched
+    in `_refresh_max_state` instead of searching the candidates again.
+
+    Subclasses provide `_max_state_id(possible_states)`, returning the position
+    of the first best state, and `_state_value(state_key)`, returning the value
+    the states are ranked by.
+    """
+    _max_state_memo = None
+
+    def remember_max_state(self, possible_states):
+        """
+        Return the best of the possible states and remember it for the following
+        `choose` on the same candidate list.
+        """
+        max_state_id = self._max_state_id(possible_states)
+        self._max_state_memo = (possible_states, max_state_id,
+                                self._state_value(possible_states[max_state_id]))
+        return possible_states[max_state_id]
+
+    def _remembered_max_state_id(self, possible_states):
+        """Return the position of the best state, reusing the memo for the same candidate list."""
+        memo = self._max_state_memo
+        if memo is not None and memo[0] is possible_states:
+            return memo[1]
+        return self._max_state_id(possible_states)
+
+    def _refresh_max_state(self, state_key):
+        """Keep the remembered best state exact after the value of `state_key` changed."""
+        memo = self._max_state_memo
+        if memo is None:
+            return
+        possible_states, best_id, best_value = memo
+        try:
+            state_id = possible_states.index(state_key)
+        except ValueError:
+            return
+        value = self._state_value(state_key)
+        if state_id == best_id and value < best_value:
+            # The best state got worse, another candidate may now win.
+            self.remember_max_state(possible_states)
+        elif state_id == best_id or value > best_value or (value == best_value and state_id < best_id):
+            # Ties go to the earliest candidate, like the full search.
+            self._max_state_memo = (possible_states, state_id, value)
@@ -1,21 +1,31 @@
 from marlax.abstracts import Agent
+from marlax.agents.memo import MaxStateMemo
+from marlax.qtables import DenseQTable
 
 import random
+import numpy as np
+from collections.abc import MutableMapping
 
-class QAgent(Agent):
-    def __init__(self, init_position = None, actions = ['stay', 'up', 'down', 'left', 'right']):
+class QAgent(MaxStateMemo, Agent):
+    def __init__(self, init_position = None, actions = ['stay', 'up', 'down', 'left', 'right'], q_table = None, rng = None):
         """
         Initialize an agent with a starting position and possible action set.
         
         Args:
             init_position (tuple): The (x, y) starting coordinates.
             actions (list): List of possible actions (e.g., ['stay', 'up','down','left','right']).
+            q_table (DenseQTable): Optional dense table with one column per action.
+                Defaults to a dict of per-state action dicts.
+            rng (marlax.rng.RandomStream): Optional exploration stream. Defaults to
+                the global `random` module.
         """
         self.position = init_position  # Agent's (x, y) position on the grid.
         self.actions = actions # List of possible actions.
+        self.action_ids = {action: i for i, action in enumerate(actions)}
         # Q-table: maps global state (all agents' positions + active reward target) to action values.
         # default dict with partial that  defaults to 0.0
-        self.q_table = {}
+        self.q_table = {} if q_table is None else q_table
+        self.rng = rng
 
     def choose(self, possible_states, epsilon=0.1, agent_id = 0):
         """
@@ -28,11 +38,15 @@ class QAgent(Agent):
         Returns:
             action (str): Chosen action.
         """
-        if random.random() < epsilon:
-            return random.choice(self.actions)
+        rng = self.rng or random
+        if rng.random() < epsilon:
+            return rng.choice(self.actions)
+        elif isinstance(self.q_table, DenseQTable):
+            best_state_id = self._remembered_max_state_id(possible_states)
+            return self.actions[int(np.argmax(self.q_table[possible_states[best_state_id]]))]
         else:
             # for all the possible states, get the action with the highest q-value
-            best_state = self.get_max_state(possible_states)
+            best_state = possible_states[self._remembered_max_state_id(possible_states)]
             best_possible_q_value = float('-inf')
             best_possible_action = None
 
@@ -44,13 +58,20 @@ class QAgent(Agent):
             return best_possible_action
         
     def get_max_state(self, possible_states):
+        return possible_states[self._max_state_id(possible_states)]
+    
+    def _max_state_id(self, possible_states):
+        if isinstance(self.q_table, DenseQTable):
+            return self.q_table.argmax(possible_states)
+        
         best_possible_action = None
         best_possible_q_value = float('-inf')
-        best_state = None
+        best_state_id = None
         
-        for state_key in possible_states:
+        for state_id, state_key in enumerate(possible_states):
             
-            if state_key not in self.q_table:
+            # A saved QTableView is read-only and already returns zeros for unseen states.
+            if state_key not in self.q_table and isinstance(self.q_table, MutableMapping):
                 self.q_table[state_key] = {a: 0.0 for a in self.actions}
             
             best_action = None
@@ -64,9 +85,12 @@ class QAgent(Agent):
             if best_q_value > best_possible_q_value:
                 best_possible_action = best_action
                 best_possible_q_value = best_q_value
-                best_state = state_key
+                best_state_id = state_id
         
-        return best_state
+        return best_state_id
+    
+    def _state_value(self, state_key):
+        return self.q_table[state_key].max() if isinstance(self.q_table, DenseQTable) else max(self.q_table[state_key].values())
 
     def update(self, state_key, action, reward, next_state_key, alpha=0.1, gamma=0.99):
         """
@@ -81,12 +105,56 @@ class QAgent(Agent):
             next_state_key: Next global state key.
             alpha (float): Learning rate.
             gamma (float): Discount factor.
+        
+        Returns:
+            td_error (float): TD error of the transition before the update.
+        """
+        if isinstance(self.q_table, DenseQTable):
+            values = self.q_table.values
+            state_id = self.q_table.indexer.encode(state_key)
+            next_state_id = self.q_table.indexer.encode(next_state_key)
+            action_id = self.action_ids[action]
+            td_target = reward + gamma * values[next_state_id].max()
+            td_error = td_target - values[state_id, action_id]
+            values[state_id, action_id] += alpha * td_error
+            self.q_table.visited[state_id] = True
+            self.q_table.visited[next_state_id] = True
+        else:
+            if state_key not in self.q_table:
+                self.q_table[state_key] = {a: 0.0 for a in self.actions}
+            if next_state_key not in self.q_table:
+                self.q_table[next_state_key] = {a: 0.0 for a in self.actions}
+            best_next_value = max(self.q_table[next_state_key].values())
+            td_target = reward + gamma * best_next_value
+            td_error = td_target - self.q_table[state_key][action]
+            self.q_table[state_key][action] += alpha * td_error
+        self._refresh_max_state(state_key)
+        return float(td_error)
+
+    def update_batch(self, state_keys, actions, rewards, next_state_keys, alpha=0.1, gamma=0.99):
+        """
+        Update Q-values for a batch of transitions.
+        
+        With a dense Q-table all TD targets are computed from the values before the
+        batch and applied in one vectorized step; otherwise the transitions are
+        applied one after another with `update`.
+        
+        Args:
+            state_keys (list): Current global state keys.
+            actions (list): Actions taken.
+            rewards (list): Immediate rewards received.
+            next_state_keys (list): Next global state keys.
+            alpha (float): Learning rate.
+            gamma (float): Discount factor.
         """
-        if state_key not in self.q_table:
-            self.q_table[state_key] = {a: 0.0 for a in self.actions}
-        if next_state_key not in self.q_table:
-            self.q_table[next_state_key] = {a: 0.0 for a in self.actions}
-        best_next_value = max(self.q_table[next_state_key].values())
-        td_target = reward + gamma * best_next_value
-        td_error = td_target - self.q_table[state_key][action]
-        self.q_table[state_key][action] += alpha * td_error
+        if isinstance(self.q_table, DenseQTable):
+            self.q_table.update_batch(self.q_table.indexer.encode_many(state_keys),
+                                      np.array([self.action_ids[a] for a in actions]),
+                                      np.asarray(rewards, dtype=self.q_table.values.dtype),
+                                      self.q_table.indexer.encode_many(next_state_keys),
+                                      alpha, gamma)
+            # Many values changed at once, the remembered best state may be stale.
+            self._max_state_memo = None
+        else:
+            for transition in zip(state_keys, actions, rewards, next_state_keys):
+                self.update(*transition, alpha, gamma)
@@ -1,16 +1,29 @@
 from marlax.abstracts import Agent
+from marlax.agents.memo import MaxStateMemo
+from marlax.qtables import DenseQTable
 
 import random
 import numpy as np
 from collections import defaultdict
 from functools import partial
 
-class QValueAgent(Agent):
-    def __init__(self,  init_position = None, actions = ['stay', 'up', 'down', 'left', 'right']):
+class QValueAgent(MaxStateMemo, Agent):
+    def __init__(self,  init_position = None, actions = ['stay', 'up', 'down', 'left', 'right'], q_table = None, rng = None):
+        """
+        Initialize an agent that learns values of global states.
         
+        Args:
+            init_position (tuple): The (x, y) starting coordinates.
+            actions (list): List of possible actions.
+            q_table (DenseQTable): Optional dense state-value table. Defaults to a
+                defaultdict keyed by state tuples.
+            rng (marlax.rng.RandomStream): Optional exploration stream. Defaults to
+                the global `random` module.
+        """
         self.position = init_position
         self.actions = actions
-        self.q_table = defaultdict(partial(int, 0))
+        self.q_table = defaultdict(partial(int, 0)) if q_table is None else q_table
+        self.rng = rng
         
         self.action_map = {
                 (0, 0):'stay',
@@ -22,11 +35,12 @@ class QValueAgent(Agent):
         
     def choose(self, possible_states, epsilon=0.1, agent_id = 0):
         
-        if random.random() < epsilon:
-            return random.choice(self.actions)
+        rng = self.rng or random
+        if rng.random() < epsilon:
+            return rng.choice(self.actions)
         else:
         # print(possible_states)
-            max_state = self.get_max_state(possible_states)
+            max_state = possible_states[self._remembered_max_state_id(possible_states)]
             
             current_pos = self.position
             next_pos = max_state[0][agent_id]
@@ -38,9 +52,36 @@ class QValueAgent(Agent):
             return action
     
     def get_max_state(self, possible_states):
-        max_state_id = np.argmax([self.q_table[state_key] for state_key in possible_states])
+        max_state_id = self._max_state_id(possible_states)
         max_state = possible_states[max_state_id]
         return max_state
     
+    def _max_state_id(self, possible_states):
+        if isinstance(self.q_table, DenseQTable):
+            return self.q_table.argmax(possible_states)
+        return int(np.argmax([self.q_table[state_key] for state_key in possible_states]))
+    
+    def _state_value(self, state_key):
+        return self.q_table[state_key]
+    
     def update(self, state_key, action, reward, next_state_key, alpha=0.1, gamma=0.99):
-        self.q_table[state_key] = (1 - alpha) * self.q_table[state_key] + alpha * (reward + gamma * self.q_table[next_state_key])
\ No newline at end of file
+        """
+        Move the value of `state_key` towards reward + gamma * V(next_state_key).
+        
+        Returns:
+            td_error (float): reward + gamma * V(next_state_key) - V(state_key) before the update.
+        """
+        if isinstance(self.q_table, DenseQTable):
+            # Encode each key once and work on the flat indices.
+            values = self.q_table.values
+            state_id = self.q_table.indexer.encode(state_key)
+            next_state_id = self.q_table.indexer.encode(next_state_key)
+            value, td_target = values[state_id], reward + gamma * values[next_state_id]
+            values[state_id] = (1 - alpha) * value + alpha * td_target
+            self.q_table.visited[state_id] = True
+            self.q_table.visited[next_state_id] = True
+        else:
+            value, td_target = self.q_table[state_key], reward + gamma * self.q_table[next_state_key]
+            self.q_table[state_key] = (1 - alpha) * value + alpha * td_target
+        self._refresh_max_state(state_key)
+        return float(td_target - value)
\ No newline at end of file
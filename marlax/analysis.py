@@ -0,0 +1,242 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+def log_filename(base, seed, who = "testing", regime_idx = 1, kind = "logs"):
+    """Return {base}/{seed}/{kind}/{who}_{regime_idx}.parquet, the layout the Tracer writes."""
+    return os.path.join(base, str(seed), kind, f"{who}_{regime_idx}.parquet")
+
+def agent_columns(path):
+    """Return the number of agents of a frame log, from its a{i}x columns."""
+    names = pq.ParquetDataset(path).schema.names
+    return max((int(m.group(1)) for m in map(re.compile(r"a(\d+)x$").match, names) if m), default=0)
+
+def read_log(path, columns = None, frames = None, filters = None):
+    """
+    Read a frame log with column projection and row-group pruning.
+
+    Only the requested columns are decoded, and row groups whose frame_idx statistics
+    fall outside `frames` are skipped without being read. Works for single files and
+    for the part-file directories written with checkpointing.
+
+    Args:
+        path (str): Log file or directory.
+        columns (list): Columns to read, all if None.
+        frames (tuple): (first, last) frame_idx to keep, both included.
+        filters (list): Extra pyarrow filters, e.g. [("terminated", "=", True)].
+
+    Returns:
+        columns (dict): Column name -> NumPy array, sorted by frame_idx.
+    """
+    filters = list(filters or [])
+    if frames is not None:
+        filters += [("frame_idx", ">=", frames[0]), ("frame_idx", "<=", frames[1])]
+    if columns is not None and "frame_idx" not in columns:
+        columns = ["frame_idx"] + list(columns)
+    table = pq.read_table(path, columns=columns, filters=filters or None)
+    data = {name: table.column(name).to_numpy() for name in table.column_names}
+    order = np.argsort(data["frame_idx"], kind="stable")
+    if np.any(order[1:] < order[:-1]):
+        data = {name: column[order] for name, column in data.items()}
+    return data
+
+def read_occupancy(path, target = None, phase = None):
+    """
+    Read the visit counts a Tracer with occupancy=True wrote, e.g. occupancy/training_1.npz.
+
+    Args:
+        path (str): The .npz file.
+        target (str): Keep one reward target ("None", "u", "ur", ...), all if None.
+        phase (str): Keep "before_activation" or "after_activation", both if None.
+
+    Returns:
+        counts (np.ndarray): (n_chunks, [n_targets, n_phases,] n_agents, width, height),
+            the target and phase axes being dropped when selected.
+        chunk_start (np.ndarray): First step of every chunk.
+    """
+    with np.load(path) as occupancy:
+        counts = occupancy["counts"]
+        if phase is not None:
+            counts = counts[:, :, list(occupancy["phases"]).index(phase)]
+        if target is not None:
+            counts = counts[:, list(occupancy["targets"]).index(target)]
+        return counts, occupancy["chunk_start"]
+
+def trial_offsets(terminated):
+    """
+    Return the trial boundaries of a frame sequence: trial i spans frames
+    offsets[i]:offsets[i + 1]. A trial ends on its terminated frame, as in
+    `terminated.cumsum().shift(fill_value=0)`; a last unfinished trial is kept.
+    """
+    terminated = np.asarray(terminated, dtype=bool)
+    ends = np.flatnonzero(terminated) + 1
+    if len(terminated) and not terminated[-1]:
+        ends = np.append(ends, len(terminated))
+    return np.concatenate(([0], ends)).astype(np.int64)
+
+def trial_ids(terminated):
+    """Return the trial index of every frame, same as `terminated.cumsum().shift(fill_value=0)`."""
+    offsets = trial_offsets(terminated)
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+def pad_trials(values, offsets, pad_size = None, fill = np.nan):
+    """
+    Gather per-frame values into a (n_trials, pad_size, ...) array, one row per trial.
+
+    Args:
+        values (np.ndarray): Per-frame values, first axis being frames.
+        offsets (np.ndarray): Trial boundaries from `trial_offsets`.
+        pad_size (int): Frames per row; longer trials are truncated. Defaults to the longest trial.
+        fill: Value of the padding. Integer values are cast to float for NaN.
+
+    Returns:
+        padded (np.ndarray): Shape (n_trials, pad_size) + values.shape[1:].
+    """
+    values = np.asarray(values)
+    lengths = np.diff(offsets)
+    if pad_size is None:
+        pad_size = int(lengths.max(initial=0))
+    steps = np.arange(pad_size)
+    index = offsets[:-1, None] + steps
+    mask = steps < lengths[:, None]
+    gathered = values[np.where(mask, index, 0)] if len(values) else np.zeros(index.shape + values.shape[1:], values.dtype)
+    if isinstance(fill, float) and np.isnan(fill) and not np.issubdtype(gathered.dtype, np.floating):
+        gathered = gathered.astype(np.float64)
+    mask = mask.reshape(mask.shape + (1,) * (values.ndim - 1))
+    return np.where(mask, gathered, fill)
+
+def trial_summary(data, offsets):
+    """
+    Vectorized per-trial reductions of a frame log.
+
+    Returns:
+        summary (pd.DataFrame): trial_id, trial_start, trial_length and, when the columns
+            were read, collected, terminated, steps_without_reward and reward_loc of the
+            last frame and reward_counter (sum of r1).
+    """
+    starts, ends = offsets[:-1], offsets[1:]
+    summary = {
+        "trial_id": np.arange(len(starts)),
+        "trial_start": data["frame_idx"][starts] if len(starts) else np.zeros(0, np.int64),
+        "trial_length": ends - starts,
+    }
+    last = ends - 1
+    for name in ("collected", "terminated", "steps_without_reward", "reward_loc"):
+        if name in data:
+            summary[name] = data[name][last]
+    if "r1" in data:
+        summary["reward_counter"] = np.add.reduceat(data["r1"], starts) if len(starts) else np.zeros(0)
+    return pd.DataFrame(summary)
+
+def load_trials(path, pad_size = None, frames = None, stats_path = None, extra_columns = ()):
+    """
+    Read a frame log and segment it into padded per-trial trajectories.
+
+    Args:
+        path (str): Frame log file or directory.
+        pad_size (int): Frames per trial row, see `pad_trials`.
+        frames (tuple): (first, last) frame_idx to read. The first trial may then be partial.
+        stats_path (str): Trial statistics file to attach, e.g. trial_stats/testing_1.parquet.
+        extra_columns (tuple): Further per-frame columns to pad into `columns`.
+
+    Returns:
+        trials (dict):
+            trajectories: float array (n_trials, pad_size, n_agents, 2) of x, y, NaN-padded.
+            lengths: frames per trial.
+            offsets: trial boundaries into the frames read.
+            summary: DataFrame from `trial_summary`.
+            columns: {name: (n_trials, pad_size)} for extra_columns.
+            stats: DataFrame of the trial statistics, or None.
+    """
+    n_agents = agent_columns(path)
+    position_columns = [f"a{i+1}{axis}" for i in range(n_agents) for axis in "xy"]
+    wanted = ["terminated", "collected", "steps_without_reward", "reward_loc", "r1"] + position_columns + list(extra_columns)
+    data = read_log(path, list(dict.fromkeys(wanted)), frames)
+    offsets = trial_offsets(data["terminated"])
+    positions = np.stack([data[name] for name in position_columns], axis=1).reshape(-1, n_agents, 2)
+    return {
+        "trajectories": pad_trials(positions, offsets, pad_size),
+        "lengths": np.diff(offsets),
+        "offsets": offsets,
+        "summary": trial_summary(data, offsets),
+        "columns": {name: pad_trials(data[name], offsets, pad_size) for name in extra_columns},
+        "stats": pd.read_parquet(stats_path) if stats_path and os.path.exists(stats_path) else None,
+    }
+
+def leader_follower(trajectories, leaders):
+    """
+    Split two-agent trajectories into leader and follower traces, as the notebooks' get_lf.
+
+    Trials led by a1 come first, then trials led by a2, each in trial order; trials
+    with any other label (None, "tie") are left out.
+
+    Args:
+        trajectories (np.ndarray): (n_trials, pad_size, 2, 2) from `load_trials`.
+        leaders (array-like): Per-trial label, e.g. the activated_by column of the trial stats.
+
+    Returns:
+        leader (np.ndarray): (n_led, pad_size, 2) positions of the leading agent.
+        follower (np.ndarray): (n_led, pad_size, 2) positions of the other agent.
+    """
+    leaders = np.asarray(leaders, dtype=object)
+    led_by = [np.flatnonzero(leaders == "a1"), np.flatnonzero(leaders == "a2")]
+    trials = np.concatenate(led_by)
+    leader_ids = np.repeat([0, 1], [len(ids) for ids in led_by])
+    leader = trajectories[trials, :, leader_ids]
+    follower = trajectories[trials, :, 1 - leader_ids]
+    return leader, follower
+
+def _load_seed(args):
+    base, seed, who, regime_idx, pad_size, frames, extra_columns = args
+    trials = load_trials(log_filename(base, seed, who, regime_idx), pad_size, frames,
+                         log_filename(base, seed, who, regime_idx, "trial_stats"), extra_columns)
+    return seed, trials
+
+def load_seeds(base, seeds = None, who = "testing", regime_idx = 1, pad_size = 60, frames = None, extra_columns = (), n_workers = None):
+    """
+    Load and segment the logs of many seed directories on a process pool.
+
+    Args:
+        base (str): Directory holding one Tracer directory per seed, e.g. "store_bk".
+        seeds (list): Seed directory names; all subdirectories of base holding a
+            logs/ directory if None.
+        who (str): "training" or "testing".
+        regime_idx (int): Regime of the logs to load.
+        pad_size (int): Frames per trial row, shared by all seeds.
+        frames (tuple): (first, last) frame_idx to read from every log.
+        extra_columns (tuple): Further per-frame columns to pad.
+        n_workers (int): Worker processes; 1 loads in this process.
+
+    Returns:
+        trials (dict): The arrays of `load_trials` concatenated over seeds, plus
+            "seed" (seed of every trial) and "stats" with a seed column.
+    """
+    if seeds is None:
+        # Only Tracer directories; a sweep directory (manifest, locks) may sit next to them.
+        seeds = sorted(name for name in os.listdir(base) if os.path.isdir(os.path.join(base, name, "logs")))
+    if not seeds:
+        raise ValueError(f"No seed directories to load in {base}.")
+    jobs = [(base, seed, who, regime_idx, pad_size, frames, tuple(extra_columns)) for seed in seeds]
+    if n_workers == 1:
+        results = list(map(_load_seed, jobs))
+    else:
+        with ProcessPoolExecutor(n_workers) as pool:
+            results = list(pool.map(_load_seed, jobs))
+
+    seed_of_trial = np.concatenate([np.full(len(trials["lengths"]), seed, dtype=object) for seed, trials in results])
+    summaries, stats = [], []
+    for seed, trials in results:
+        summaries.append(trials["summary"].assign(seed=seed))
+        if trials["stats"] is not None:
+            stats.append(trials["stats"].assign(seed=seed))
+    return {
+        "trajectories": np.concatenate([trials["trajectories"] for _, trials in results]),
+        "lengths": np.concatenate([trials["lengths"] for _, trials in results]),
+        "seed": seed_of_trial,
+        "summary": pd.concat(summaries, ignore_index=True),
+        "columns": {name: np.concatenate([trials["columns"][name] for _, trials in results]) for name in extra_columns},
+        "stats": pd.concat(stats, ignore_index=True) if stats else None,
+    }
@@ -0,0 +1,291 @@
+"""
+Benchmarks for the training hot path.
+
+    python -m marlax.bench --output bench.json
+    python -m marlax.bench --output new.json --baseline bench.json --threshold 0.1
+
+Microbenchmarks time single calls of the environment, agent and tracer methods;
+end-to-end benchmarks time Engine.train over grid sizes, agent counts and regimes.
+Results are written as JSON together with machine information. With a baseline,
+every benchmark whose median time grew by more than the threshold is reported
+and the command exits with status 1.
+"""
+from marlax.agents import QAgent, QValueAgent
+from marlax.engines import Engine
+from marlax.envs.gridworld.gridworld import GridWorld_r0, GridWorld_r3, GridWorld_r4
+from marlax.envs.pong.pong import Pong
+from marlax.tracers import Tracer
+
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+REGIMES = {"r0": GridWorld_r0, "r3": GridWorld_r3, "r4": GridWorld_r4}
+BENCHMARKS = []
+
+def benchmark(name, **params):
+    """Register a benchmark. The function takes n_ops, builds its fixtures and returns a callable doing n_ops operations."""
+    def register(fn):
+        BENCHMARKS.append((name, params, fn))
+        return fn
+    return register
+
+def make_env(grid = (11, 11), n_agents = 2, regime = "r3", agent = QValueAgent):
+    agents = [agent() for _ in range(n_agents)]
+    env = REGIMES[regime](grid, agents, [100] * n_agents, 0, -1)
+    env.reset()
+    return env
+
+def warm_up(env, num_steps = 5000):
+    """Fill the Q-tables with a short training run so lookups hit realistic tables."""
+    Engine(0.99, 0.5).train(env, None, num_steps=num_steps, verbose=False)
+    env.reset()
+
+def candidate_lists(env, n):
+    """Candidate lists of n random states, like the ones the engine hands to the agents."""
+    lists = []
+    for _ in range(n):
+        env.reset()
+        lists.append(env.get_possible_states())
+    return lists
+
+# Microbenchmarks
+@benchmark("gridworld.get_possible_states")
+def bench_get_possible_states(n_ops):
+    env = make_env()
+    def run():
+        for _ in range(n_ops):
+            env.get_possible_states()
+    return run
+
+@benchmark("gridworld.step")
+def bench_step(n_ops):
+    env = make_env()
+    actions = [[random.choice(env.agents[0].actions) for _ in env.agents] for _ in range(n_ops)]
+    def run():
+        for step_actions in actions:
+            env.step(step_actions)
+    return run
+
+@benchmark("qagent.choose")
+def bench_qagent_choose(n_ops):
+    env = make_env(agent=QAgent)
+    warm_up(env)
+    agent, lists = env.agents[0], candidate_lists(env, n_ops)
+    def run():
+        for possible_states in lists:
+            agent.choose(possible_states, 0.0)
+    return run
+
+@benchmark("qagent.get_max_state")
+def bench_qagent_get_max_state(n_ops):
+    env = make_env(agent=QAgent)
+    warm_up(env)
+    agent, lists = env.agents[0], candidate_lists(env, n_ops)
+    def run():
+        for possible_states in lists:
+            agent.get_max_state(possible_states)
+    return run
+
+def _update_benchmark(agent_class, n_ops):
+    env = make_env(agent=agent_class)
+    warm_up(env)
+    agent = env.agents[0]
+    lists = candidate_lists(env, n_ops + 1)
+    transitions = [(lists[i][0], random.choice(agent.actions), -1, lists[i + 1][0]) for i in range(n_ops)]
+    def run():
+        for state, action, reward, next_state in transitions:
+            agent.update(state, action, reward, next_state, 0.1, 0.9)
+    return run
+
+@benchmark("qagent.update")
+def bench_qagent_update(n_ops):
+    return _update_benchmark(QAgent, n_ops)
+
+@benchmark("qvalueagent.update")
+def bench_qvalueagent_update(n_ops):
+    return _update_benchmark(QValueAgent, n_ops)
+
+def _tracer_frames(n_ops):
+    env = make_env()
+    frames = []
+    for _ in range(n_ops):
+        state, rewards, info = env.step([random.choice(env.agents[0].actions) for _ in env.agents])
+        frames.append((state, rewards, info))
+    return env, frames
+
+@benchmark("tracer.log_frame")
+def bench_log_frame(n_ops):
+    env, frames = _tracer_frames(n_ops)
+    tracer = Tracer(tempfile.mkdtemp(prefix="marlax-bench-"))
+    # flush_every above n_ops, so only the buffering is timed.
+    tracer._init_logger(n_ops + 1, 0, "training", env)
+    def run():
+        tracer.log_size = 0
+        for step, (state, rewards, info) in enumerate(frames):
+            tracer._log_frame(step, state, rewards, info)
+    return run
+
+@benchmark("tracer.flush_buffer")
+def bench_flush_buffer(n_ops):
+    env, frames = _tracer_frames(1000)
+    tracer = Tracer(tempfile.mkdtemp(prefix="marlax-bench-"))
+    tracer._init_logger(len(frames) + 1, 0, "training", env)
+    for step, (state, rewards, info) in enumerate(frames):
+        tracer._log_frame(step, state, rewards, info)
+    def run():
+        # One op is one flush of 1000 frames; the buffer keeps its rows after a flush.
+        for _ in range(n_ops):
+            tracer.log_size = len(frames)
+            tracer._flush_buffer()
+    return run
+
+@benchmark("pong.step")
+def bench_pong_step(n_ops):
+    env = Pong((21, 15), [QValueAgent(), QValueAgent()])
+    env.reset()
+    actions = [[random.choice(["stay", "up", "down"]) for _ in env.agents] for _ in range(n_ops)]
+    def run():
+        for step_actions in actions:
+            env.step(step_actions)
+    return run
+
+for n_games in (64, 1024):
+    @benchmark("pong.step_batched", n_games=n_games)
+    def bench_pong_step_batched(n_ops, n_games=n_games):
+        # One op is one step of all games; divide by n_games for the cost of a game step.
+        env = Pong((21, 15), [QValueAgent(), QValueAgent()], n_games=n_games)
+        env.reset()
+        actions = np.random.default_rng(0).integers(0, 3, (16, n_games, 2))
+        def run():
+            for step in range(n_ops):
+                env.step(actions[step % len(actions)])
+        return run
+
+# End-to-end benchmarks
+for grid_size in (11, 21, 31):
+    for n_agents in (1, 2, 3, 4):
+        for regime in ("r0", "r3"):
+            @benchmark("engine.train", grid=grid_size, n_agents=n_agents, regime=regime)
+            def bench_train(n_ops, grid=grid_size, n_agents=n_agents, regime=regime):
+                env = make_env((grid, grid), n_agents, regime)
+                def run():
+                    Engine(0.99, 0.4).train(env, None, num_steps=n_ops, verbose=False)
+                return run
+
+def benchmark_id(name, params):
+    return name + "".join(f"[{key}={value}]" for key, value in params.items())
+
+def machine_info():
+    """Describe the machine and code version the results were taken on."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "node": platform.node(),
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def run_benchmarks(pattern = "*", micro_ops = 2000, train_steps = 2000, repeat = 5, seed = 0, verbose = True):
+    """
+    Run the registered benchmarks whose id matches a glob pattern.
+
+    Args:
+        pattern (str): fnmatch pattern on ids like "engine.train[grid=11][n_agents=2][regime=r3]".
+        micro_ops (int): Calls per repetition of a microbenchmark.
+        train_steps (int): Training steps per repetition of an end-to-end benchmark.
+        repeat (int): Timed repetitions; the median and minimum are reported.
+        seed (int): Seed of the global random state before each benchmark.
+
+    Returns:
+        results (dict): Machine info, settings and per-benchmark timings in seconds per op.
+    """
+    results = {}
+    for name, params, fn in BENCHMARKS:
+        bench_id = benchmark_id(name, params)
+        if not fnmatch.fnmatch(bench_id, pattern):
+            continue
+        random.seed(seed)
+        n_ops = train_steps if name == "engine.train" else micro_ops // 10 if name == "tracer.flush_buffer" else micro_ops
+        run = fn(n_ops)
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            times.append((time.perf_counter() - start) / n_ops)
+        results[bench_id] = {"name": name, "params": params, "n_ops": n_ops,
+                             "median": statistics.median(times), "min": min(times), "times": times}
+        if verbose:
+            print(f"{bench_id:60s} {results[bench_id]['median'] * 1e6:12.2f} us/op", flush=True)
+    return {"machine": machine_info(),
+            "settings": {"micro_ops": micro_ops, "train_steps": train_steps, "repeat": repeat, "seed": seed},
+            "benchmarks": results}
+
+def compare(results, baseline, threshold = 0.1):
+    """
+    Compare median times against a baseline.
+
+    Returns:
+        rows (list): (id, baseline median, new median, ratio, regressed) for common benchmarks.
+    """
+    rows = []
+    for bench_id, result in results["benchmarks"].items():
+        base = baseline["benchmarks"].get(bench_id)
+        if base is None:
+            continue
+        ratio = result["median"] / base["median"]
+        rows.append((bench_id, base["median"], result["median"], ratio, ratio > 1 + threshold))
+    return rows
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog="python -m marlax.bench", description="Benchmark the MARLAX training hot path.")
+    parser.add_argument("--output", "-o", help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", "-b", help="JSON results to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Allowed relative slowdown (default 0.1 = 10%%).")
+    parser.add_argument("--filter", "-k", default="*", help="Glob pattern on benchmark ids.")
+    parser.add_argument("--micro-ops", type=int, default=2000)
+    parser.add_argument("--train-steps", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--list", action="store_true", help="List the benchmark ids and exit.")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name, params, _ in BENCHMARKS:
+            print(benchmark_id(name, params))
+        return 0
+
+    results = run_benchmarks(args.filter, args.micro_ops, args.train_steps, args.repeat)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        rows = compare(results, baseline, args.threshold)
+        print(f"\n{'benchmark':60s} {'baseline':>12s} {'new':>12s} {'ratio':>7s}")
+        for bench_id, base, new, ratio, regressed in rows:
+            print(f"{bench_id:60s} {base * 1e6:10.2f}us {new * 1e6:10.2f}us {ratio:7.2f}{'  REGRESSION' if regressed else ''}")
+        if any(row[4] for row in rows):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
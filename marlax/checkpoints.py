@@ -0,0 +1,179 @@
+from marlax.envs.gridworld.tables import REWARD_TARGETS
+from marlax.qtables import DenseQTable, StateIndexer
+
+import json
+import os
+import pickle
+import numpy as np
+from collections import defaultdict
+from collections.abc import Mapping
+from functools import partial
+
+FORMAT_VERSION = 1
+
+def save_qtable(path, q_table, grid, n_agents, agent_class, actions, regime=None, action_values=False):
+    """
+    Save a Q-table as a directory of flat arrays that can be memory-mapped.
+
+    The directory holds:
+        keys.npy   - sorted int64 state indices (see StateIndexer over REWARD_TARGETS).
+        values.npy - float64 values, shape (n,) for state values or (n, n_actions) for action values.
+        meta.json  - grid size, number of agents, targets, regime, agent class and actions.
+
+    Args:
+        path (str): Directory to write.
+        q_table: A dict Q-table of QValueAgent or QAgent, or a DenseQTable. Other
+            value stores (the QNetwork of DeepQAgent) raise TypeError.
+        grid (tuple): (width, height) of the grid.
+        n_agents (int): Number of agents in the state keys.
+        agent_class (str): Name of the agent class that owns the table, kept as metadata.
+        actions (list): Action names of the agent.
+        regime (str): Name of the environment regime the table was last trained on.
+        action_values (bool): Whether a dict table maps states to {action: value}
+            rows (QAgent and its subclasses). Dense tables tell it by their shape.
+    """
+    if not isinstance(q_table, (DenseQTable, Mapping)):
+        raise TypeError(f"Cannot save the {type(q_table).__name__} of {agent_class} as a Q-table; "
+                        f"export it with format='pickle'.")
+    indexer = StateIndexer(grid, n_agents, REWARD_TARGETS)
+    if isinstance(q_table, DenseQTable):
+        # Re-encode from the table's own target set to the full one.
+        visited = np.flatnonzero(q_table.visited)
+        source = q_table.indexer
+        target_codes = np.array([indexer.target_codes[target] for target in source.targets])
+        keys = target_codes[visited // source.n_positions] * indexer.n_positions + visited % source.n_positions
+        values = q_table.values[visited]
+    else:
+        keys = indexer.encode_many(q_table.keys())
+        # Given by the caller, not read from the first row: an empty QAgent table still holds action values.
+        if action_values:
+            values = np.array([[row[a] for a in actions] for row in q_table.values()], dtype=np.float64).reshape(-1, len(actions))
+        else:
+            values = np.fromiter(q_table.values(), dtype=np.float64, count=len(q_table))
+    order = np.argsort(keys, kind="stable")
+
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "keys.npy"), keys[order])
+    np.save(os.path.join(path, "values.npy"), np.ascontiguousarray(values[order], dtype=np.float64))
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "grid": list(grid),
+        "n_agents": n_agents,
+        "targets": list(REWARD_TARGETS),
+        "regime": regime,
+        "agent_class": agent_class,
+        "actions": list(actions),
+        "action_values": values.ndim == 2,
+    }
+    # The header is written last, so a directory with meta.json is complete.
+    with open(os.path.join(path, "meta.json"), "w") as file:
+        json.dump(meta, file)
+
+def load_qtable(path, mmap_mode="r"):
+    """
+    Open a Q-table saved by `save_qtable` without materializing a dict.
+
+    Args:
+        path (str): Directory written by `save_qtable`.
+        mmap_mode (str): Passed to np.load; None reads the arrays into memory.
+
+    Returns:
+        QTableView: Read-only dict-like view over the arrays.
+    """
+    with open(os.path.join(path, "meta.json")) as file:
+        meta = json.load(file)
+    if meta["format_version"] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported Q-table format version {meta['format_version']} in {path}.")
+    keys = np.load(os.path.join(path, "keys.npy"), mmap_mode=mmap_mode)
+    values = np.load(os.path.join(path, "values.npy"), mmap_mode=mmap_mode)
+    return QTableView(keys, values, meta)
+
+class QTableView(Mapping):
+    def __init__(self, keys, values, meta):
+        """
+        Lazy dict-like view of a saved Q-table.
+
+        `view[state_key]` returns a float for state-value tables and an {action: value}
+        dict for action-value tables. Unseen states get 0.0 or a row of zeros, the
+        values QValueAgent and QAgent give them; the view itself is never written.
+
+        Args:
+            keys (np.ndarray): Sorted flat state indices.
+            values (np.ndarray): Values aligned with keys.
+            meta (dict): Header written by `save_qtable`.
+        """
+        self.keys_array = keys
+        self.values_array = values
+        self.meta = meta
+        self.actions = meta["actions"]
+        self.action_values = meta["action_values"]
+        self.indexer = StateIndexer(tuple(meta["grid"]), meta["n_agents"], tuple(meta["targets"]))
+
+    def _position(self, state_key):
+        index = self.indexer.encode(state_key)
+        position = int(np.searchsorted(self.keys_array, index))
+        if position < len(self.keys_array) and self.keys_array[position] == index:
+            return position
+        return None
+
+    def __getitem__(self, state_key):
+        position = self._position(state_key)
+        if position is None:
+            return dict.fromkeys(self.actions, 0.0) if self.action_values else 0.0
+        if self.action_values:
+            return dict(zip(self.actions, self.values_array[position].tolist()))
+        return float(self.values_array[position])
+
+    def __contains__(self, state_key):
+        return self._position(state_key) is not None
+
+    def __iter__(self):
+        for index in self.keys_array:
+            yield self.indexer.decode(index)
+
+    def __len__(self):
+        return len(self.keys_array)
+
+    def to_dict(self):
+        """Materialize the Q-table in the dict layout of its agent class."""
+        if self.action_values:
+            return {self.indexer.decode(index): dict(zip(self.actions, row))
+                    for index, row in zip(self.keys_array, self.values_array.tolist())}
+        q_table = defaultdict(partial(int, 0))
+        for index, value in zip(self.keys_array, self.values_array.tolist()):
+            q_table[self.indexer.decode(index)] = value
+        return q_table
+
+    def to_dense(self):
+        """Materialize the Q-table as a DenseQTable over all reward targets."""
+        table = DenseQTable(self.indexer.grid, self.indexer.n_agents, self.indexer.targets,
+                            n_actions=len(self.actions) if self.action_values else None)
+        table.values[self.keys_array] = self.values_array
+        table.visited[self.keys_array] = True
+        return table
+
+def save_training_checkpoint(path, checkpoint):
+    """
+    Atomically write a training checkpoint.
+
+    The checkpoint is pickled to a temporary file in the same directory, synced
+    and then renamed over `path`, so a crash never leaves a partial checkpoint.
+
+    Args:
+        path (str): Checkpoint file.
+        checkpoint (dict): Picklable training state, see `Engine.train`.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as file:
+        pickle.dump(checkpoint, file, protocol=pickle.HIGHEST_PROTOCOL)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+def load_training_checkpoint(path):
+    """Return the training checkpoint stored at `path`, or None if there is none."""
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as file:
+        return pickle.load(file)
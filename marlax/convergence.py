@@ -0,0 +1,208 @@
+from marlax.agents import QAgent
+
+import numpy as np
+from collections.abc import Mapping
+
+# Signals compared with the thresholds at every check.
+SIGNALS = ("td_error", "policy_change", "collection_change")
+
+class ConvergenceMonitor:
+    def __init__(self, window = 100_000, td_threshold = None, policy_threshold = None, collection_threshold = None,
+                 patience = 3, n_probes = 256, probe_every = 1000, on_converge = "stop", anneal_steps = None):
+        """
+        Convergence signals and early stopping for Engine.train.
+
+        Every `window` steps three signals are computed over the steps since the
+        last check:
+            td_error          - mean absolute TD error returned by the agents' `update`.
+            policy_change     - fraction of (probe state, agent) pairs where the agent's
+                                greedy action changed since the last check: the best
+                                action of the best state for action-value tables, the
+                                move towards the best state for state-value ones. Probes
+                                are candidate lists recorded every `probe_every` steps.
+            collection_change - change of the collection rate (collected rewards per
+                                trial) since the last check.
+        A check passes when every signal given a threshold is below it. After
+        `patience` passing checks in a row the run has converged: with
+        on_converge="stop" training ends there; with "anneal" epsilon first moves
+        linearly from its current value to the engine's epsilon_end over
+        `anneal_steps` (default: one window), then training ends.
+
+        Args:
+            window (int): Steps between checks.
+            td_threshold (float): Bound on the mean absolute TD error.
+            policy_threshold (float): Bound on the fraction of greedy changes.
+            collection_threshold (float): Bound on the change of the collection rate.
+            patience (int): Passing checks in a row needed to converge.
+            n_probes (int): Candidate lists kept to compare greedy choices.
+            probe_every (int): Steps between two recorded probes.
+            on_converge (str): "stop" or "anneal".
+            anneal_steps (int): Length of the final epsilon decay with "anneal".
+        """
+        if td_threshold is None and policy_threshold is None and collection_threshold is None:
+            raise ValueError("Give at least one of td_threshold, policy_threshold and collection_threshold.")
+        if on_converge not in ("stop", "anneal"):
+            raise ValueError(f"on_converge must be 'stop' or 'anneal', not {on_converge!r}.")
+        self.window = window
+        self.thresholds = dict(zip(SIGNALS, (td_threshold, policy_threshold, collection_threshold)))
+        self.patience = patience
+        self.n_probes = n_probes
+        self.probe_every = probe_every
+        self.on_converge = on_converge
+        self.anneal_steps = window if anneal_steps is None else anneal_steps
+        self.records = []
+
+    def start(self, regime_idx, num_steps, epsilon_end):
+        """Reset the signals at the beginning of a run."""
+        self.regime_idx = regime_idx
+        self.num_steps = num_steps
+        self.epsilon_end = epsilon_end
+        self.td_sum, self.td_count = 0.0, 0
+        self.collected, self.trials = 0, 0
+        self.collection_rate = None
+        self.probes = []
+        self.greedy = []
+        self.streak = 0
+        self.history = []
+        self.converged_step = None
+        self.converged_epsilon = None
+        self.epsilon_value = None
+
+    def checkpoint_state(self):
+        """Signals of the current run, for Engine checkpoints."""
+        return {name: getattr(self, name) for name in (
+            "td_sum", "td_count", "collected", "trials", "collection_rate", "probes", "greedy",
+            "streak", "history", "converged_step", "converged_epsilon", "epsilon_value")}
+
+    def restore_checkpoint_state(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def epsilon(self, step, epsilon):
+        """Return the epsilon of `step`: the engine's schedule, or the final decay after convergence."""
+        if self.converged_step is not None:
+            progress = min((step - self.converged_step) / max(self.anneal_steps, 1), 1.0)
+            epsilon = self.converged_epsilon + (self.epsilon_end - self.converged_epsilon) * progress
+        self.epsilon_value = epsilon
+        return epsilon
+
+    def add_td_error(self, td_error):
+        # Agents that did not learn on this step (DeepQAgent between minibatches) return None.
+        if td_error is not None:
+            self.td_sum += abs(td_error)
+            self.td_count += 1
+
+    def _greedy_actions(self, agents, probes):
+        """Each agent's greedy action on every probe, see `greedy_action`."""
+        return [tuple(greedy_action(agent, i, possible_states, positions) for i, agent in enumerate(agents))
+                for possible_states, positions in probes]
+
+    def observe(self, step, info, possible_states, env):
+        """
+        Account for one training step, checking the signals every `window` steps.
+
+        Returns:
+            stop (bool): Whether training should end after this step.
+        """
+        self.collected += info["collected"]
+        self.trials += info["terminated"]
+        if step % self.probe_every == 0 and len(self.probes) < self.n_probes:
+            self.probes.append((possible_states, tuple(agent.position for agent in env.agents)))
+        done = step + 1
+        if self.converged_step is not None:
+            return done >= self.converged_step + self.anneal_steps
+        if done % self.window == 0:
+            self._check(done, env)
+            if self.streak >= self.patience:
+                self.converged_step = done
+                self.converged_epsilon = self.epsilon_value
+                return self.on_converge == "stop"
+        return False
+
+    def _check(self, step, env):
+        record = {"step": step}
+        record["td_error"] = self.td_sum / self.td_count if self.td_count else None
+
+        greedy = self._greedy_actions(env.agents, self.probes)
+        compared = len(self.greedy) * len(env.agents)
+        changed = sum(a != b for previous, current in zip(self.greedy, greedy) for a, b in zip(previous, current))
+        record["policy_change"] = changed / compared if compared else None
+        self.greedy = greedy
+
+        rate = self.collected / self.trials if self.trials else None
+        record["collection_rate"] = rate
+        record["collection_change"] = (abs(rate - self.collection_rate)
+                                       if rate is not None and self.collection_rate is not None else None)
+        self.collection_rate = rate
+
+        # A signal without a value yet (no previous check, no trial) does not pass.
+        record["passed"] = all(record[name] is not None and record[name] < threshold
+                               for name, threshold in self.thresholds.items() if threshold is not None)
+        self.streak = self.streak + 1 if record["passed"] else 0
+        self.history.append(record)
+        self.td_sum, self.td_count = 0.0, 0
+        self.collected, self.trials = 0, 0
+
+    def stop(self, step, logger = None):
+        """
+        Finish the run and build its summary record. The Tracer, if any, writes it to
+        convergence/training_{regime_idx}.json next to the logs.
+
+        Args:
+            step (int): Number of steps the run reached.
+            logger (Tracer): Tracer of the run.
+
+        Returns:
+            summary (dict): Stop step, thresholds and the signals of every check.
+        """
+        summary = {
+            "regime_idx": self.regime_idx,
+            "num_steps": self.num_steps,
+            "stop_step": step,
+            "converged": self.converged_step is not None,
+            "converged_step": self.converged_step,
+            "on_converge": self.on_converge,
+            "window": self.window,
+            "patience": self.patience,
+            "thresholds": self.thresholds,
+            "history": [{name: float(value) if isinstance(value, (float, np.floating)) else value
+                         for name, value in record.items()} for record in self.history],
+        }
+        self.records.append(summary)
+        if logger:
+            logger._write_convergence(summary)
+        return summary
+
+def greedy_action(agent, agent_id, possible_states, positions):
+    """
+    Greedy action of an agent on a candidate list, read without writing the Q-table.
+
+    Dict tables are read with `in`, so unseen candidates count as zeros without
+    the rows that `get_max_state` would insert.
+
+    Args:
+        agent: Agent to query.
+        agent_id (int): Index of the agent in the states.
+        possible_states: Candidate next states.
+        positions (tuple): Positions of all agents when the candidates were listed.
+
+    Returns:
+        action: The action name for action-value agents, the (dx, dy) move towards
+            the best state otherwise.
+    """
+    q_table = agent.q_table
+    action_values = isinstance(agent, QAgent)
+    if isinstance(q_table, Mapping):
+        zero = dict.fromkeys(agent.actions, 0.0) if action_values else 0.0
+        rows = [q_table[state_key] if state_key in q_table else zero for state_key in possible_states]
+        best_id = int(np.argmax([max(row.values()) for row in rows] if action_values else rows))
+        if action_values:
+            # The first best action, like QAgent.choose.
+            return max(agent.actions, key=rows[best_id].__getitem__)
+        best_state = possible_states[best_id]
+    else:
+        best_state = agent.get_max_state(possible_states)
+        if action_values:
+            return agent.actions[int(np.argmax(q_table[best_state]))]
+    next_position, position = best_state[0][agent_id], positions[agent_id]
+    return (next_position[0] - position[0], next_position[1] - position[1])
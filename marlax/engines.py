@@ -1,3 +1,13 @@
+from marlax.checkpoints import load_training_checkpoint, save_training_checkpoint
+from marlax.evaluation import evaluate
+from marlax.hogwild import train_hogwild
+from marlax.profiling import TEST_PHASES, TRAIN_PHASES
+
+import os
+import random
+import warnings
+from time import perf_counter
+import numpy as np
 from tqdm import tqdm
 
 class Engine:
@@ -6,44 +16,196 @@ class Engine:
         self.epsilon_end = epsilon_end
         self.epsilon_test = epsilon_test
 
-    def train(self, env, logger, num_steps = 1_000_000, alpha=0.1, gamma=0.9, verbose=True, flush_every=1_000_000, regime_idx=0):
-        env.reset()
-        if logger: logger._init_logger(flush_every, regime_idx, "training")
-        for step in tqdm(range(num_steps), disable=not verbose, desc="Training"):
+    def train(self, env, logger, num_steps = 1_000_000, alpha=0.1, gamma=0.9, verbose=True, flush_every=1_000_000, regime_idx=0, checkpoint_every=None, resume=False, profiler=None, convergence=None):
+        """
+        Train the agents of `env` for num_steps, decaying epsilon linearly.
+        
+        Args:
+            checkpoint_every (int): Save a checkpoint next to the logs every this many steps.
+            resume (bool): Continue from the last checkpoint of this regime. The logger
+                must be created with resume=True; without a checkpoint training starts
+                from step 0 with a warning.
+            profiler (marlax.profiling.Profiler): Sampled per-phase timing.
+            convergence (marlax.convergence.ConvergenceMonitor): Track convergence signals
+                and end training early once they stay under its thresholds; the step
+                training stopped at is written next to the logs.
+        """
+        # Checkpoints live next to the logs: {log_path}/checkpoints/training_{regime_idx}.pkl
+        checkpoint_path = None
+        if checkpoint_every or resume:
+            if not logger:
+                raise ValueError("Checkpointing needs a Tracer to store the checkpoints next to the logs.")
+            checkpoint_path = os.path.join(logger.log_path, "checkpoints", f"training_{regime_idx}.pkl")
+        if resume and not logger.resume:
+            # Its constructor already removed the log directory, checkpoints included.
+            raise ValueError("resume=True needs a Tracer created with resume=True.")
+        checkpoint = load_training_checkpoint(checkpoint_path) if resume else None
+        if resume and checkpoint is None:
+            warnings.warn(f"No checkpoint at {checkpoint_path}, training regime {regime_idx} from step 0.")
+        if convergence: convergence.start(regime_idx, num_steps, self.epsilon_end)
+        
+        start_step = 0
+        if checkpoint is not None:
+            self._restore_checkpoint(env, checkpoint, num_steps, convergence)
+            if checkpoint["completed"]:
+                # Agents are restored to the end of this regime, nothing left to train.
+                return
+            start_step = checkpoint["step"]
+            logger._init_logger(flush_every, regime_idx, "training", env, resume_state=checkpoint["logger"])
+        else:
+            env.reset()
+            if logger: logger._init_logger(flush_every, regime_idx, "training", env, segmented=bool(checkpoint_every))
+        
+        if profiler: profiler.start("training", regime_idx, TRAIN_PHASES, start_step)
+        possible_next_states = env.get_possible_states()
+        progress = tqdm(range(start_step, num_steps), initial=start_step, total=num_steps, disable=not verbose, desc="Training")
+        for step in progress:
+            # Time one step in profiler.sample_every; the other steps only pay for this test.
+            sampled = profiler is not None and step % profiler.sample_every == 0
+            if sampled: t_choose = perf_counter()
+            
             # Linearly decay epsilon.
             epsilon = ((self.epsilon_end - self.epsilon_start) / num_steps) * step + self.epsilon_start
+            if convergence: epsilon = convergence.epsilon(step, epsilon)
             
-            possible_next_states = env.get_possible_states()
             actions = []
             # Each agent chooses an action based on the next possible states.
             for i, agent in enumerate(env.agents):
                 actions.append(agent.choose(possible_next_states, epsilon, agent_id = i))
+            if sampled: t_step = perf_counter()
             
             # Environment processes the actions.
             state, rewards, info = env.step(actions)
+            if sampled: t_possible = perf_counter()
             
+            # These candidates are also the ones the agents choose from on the next step,
+            # and agents remember their best one across the update.
             possible_next_states = env.get_possible_states()
+            if sampled: t_update = perf_counter()
             
             # Each agent updates its Q-table.
             for i, agent in enumerate(env.agents):
-                agent.update(state, actions[i], rewards[i], agent.get_max_state(possible_next_states), alpha, gamma)
+                td_error = agent.update(state, actions[i], rewards[i], agent.remember_max_state(possible_next_states), alpha, gamma)
+                if convergence: convergence.add_td_error(td_error)
+            if sampled: t_log = perf_counter()
             
             # Checkout the tracks
             if logger: logger._log_frame(step, state, rewards, info)
+            if sampled: profiler.record(step, (t_choose, t_step, t_possible, t_update, t_log, perf_counter()), env, progress)
+            
+            if convergence and convergence.observe(step, info, possible_next_states, env):
+                end_step = step + 1
+                progress.close()
+                break
+            
+            if checkpoint_every and (step + 1) % checkpoint_every == 0 and step + 1 < num_steps:
+                self._save_checkpoint(checkpoint_path, env, logger, step + 1, num_steps, regime_idx, convergence)
+        else:
+            end_step = num_steps
         
         if logger: logger._flush_logger()
+        if profiler: profiler.stop(end_step, logger)
+        if convergence: convergence.stop(end_step, logger)
+        if checkpoint_path: self._save_checkpoint(checkpoint_path, env, None, end_step, num_steps, regime_idx)
     
-    def test(self, env, logger, num_steps = 100_000, verbose = True, flush_every=1_000_000, regime_idx=0):
+    def train_hogwild(self, env, logger, num_steps = 1_000_000, alpha=0.1, gamma=0.9, n_workers=None, verbose=True, flush_every=1_000_000, regime_idx=0, **kwargs):
+        """
+        Train on n_workers processes updating shared Q-tables without locks, see
+        marlax.hogwild.train_hogwild. The agents end up with dense Q-tables.
+        
+        Returns:
+            summary (dict): Throughput, speedup over serial training (with baseline_steps) and staleness statistics.
+        """
+        return train_hogwild(self, env, logger, num_steps, alpha, gamma, n_workers, verbose,
+                             flush_every, regime_idx, **kwargs)
+    
+    def _save_checkpoint(self, path, env, logger, step, num_steps, regime_idx, convergence = None):
+        """
+        Save everything needed to continue training at `step`. The epsilon schedule
+        position follows from step and num_steps. A checkpoint without a logger
+        position marks the regime as completed.
+        """
+        checkpoint = {
+            "regime_idx": regime_idx,
+            "step": step,
+            "num_steps": num_steps,
+            "epsilon_start": self.epsilon_start,
+            "epsilon_end": self.epsilon_end,
+            "completed": logger is None,
+            # Closing the current log part first keeps the logs in line with the step.
+            "logger": logger._checkpoint_logger() if logger else None,
+            "q_tables": [agent.q_table for agent in env.agents],
+            "env": env.checkpoint_state(),
+            "random_state": random.getstate(),
+            "numpy_random_state": np.random.get_state(),
+            # Per-consumer streams (marlax.rng) are saved with their position in the block.
+            "env_rng": env.rng,
+            "agent_rngs": [getattr(agent, "rng", None) for agent in env.agents],
+            "convergence": convergence.checkpoint_state() if convergence else None,
+        }
+        save_training_checkpoint(path, checkpoint)
+    
+    def _restore_checkpoint(self, env, checkpoint, num_steps, convergence = None):
+        """Load agents, environment and random state from a checkpoint."""
+        if checkpoint["num_steps"] != num_steps:
+            raise ValueError(f"Checkpoint was taken for num_steps={checkpoint['num_steps']}, "
+                             f"resuming with num_steps={num_steps} would change the epsilon schedule.")
+        for agent, q_table in zip(env.agents, checkpoint["q_tables"]):
+            agent.q_table = q_table
+        env.restore_checkpoint_state(checkpoint["env"])
+        random.setstate(checkpoint["random_state"])
+        np.random.set_state(checkpoint["numpy_random_state"])
+        env.rng = checkpoint["env_rng"]
+        for agent, rng in zip(env.agents, checkpoint["agent_rngs"]):
+            agent.rng = rng
+        if convergence and checkpoint.get("convergence"):
+            convergence.restore_checkpoint_state(checkpoint["convergence"])
+    
+    def test(self, env, logger, num_steps = 100_000, verbose = True, flush_every=1_000_000, regime_idx=0, profiler=None, policy=None):
+        """
+        Run the frozen agents for num_steps with epsilon_test exploration.
+        
+        Args:
+            policy (marlax.policy.GreedyPolicy): Compiled greedy actions of the agents,
+                e.g. from compile_policy(env). Each step is then a table lookup instead
+                of a candidate search per agent; the frames are the same.
+        """
         env.reset()
-        if logger: logger._init_logger(flush_every, regime_idx, "testing")
-        for step in tqdm(range(num_steps), disable=not verbose, desc="Testing"):
+        if logger: logger._init_logger(flush_every, regime_idx, "testing", env)
+        if profiler: profiler.start("testing", regime_idx, TEST_PHASES)
+        progress = tqdm(range(num_steps), disable=not verbose, desc="Testing")
+        for step in progress:
+            sampled = profiler is not None and step % profiler.sample_every == 0
+            if sampled: t_possible = perf_counter()
             
-            actions = []
-            for i, agent in enumerate(env.agents):
-                actions.append(agent.choose(env.get_possible_states(), self.epsilon_test, agent_id = i))
+            if policy is not None:
+                if sampled: t_choose = t_possible
+                actions = policy.choose(env, self.epsilon_test)
+            else:
+                possible_next_states = env.get_possible_states()
+                if sampled: t_choose = perf_counter()
+                actions = []
+                for i, agent in enumerate(env.agents):
+                    actions.append(agent.choose(possible_next_states, self.epsilon_test, agent_id = i))
+            if sampled: t_step = perf_counter()
             
             # Environment processes the actions.
             state, rewards, info = env.step(actions)
+            if sampled: t_log = perf_counter()
             
             if logger: logger._log_frame(step, state, rewards, info)
-        if logger: logger._flush_logger()
\ No newline at end of file
+            if sampled: profiler.record(step, (t_possible, t_choose, t_step, t_log, perf_counter()), env, progress)
+        if logger: logger._flush_logger()
+        if profiler: profiler.stop(num_steps, logger)
+    
+    def evaluate(self, env, policy = None, precision = 0.01, n_envs = 1024, seed = None, verbose = True, **kwargs):
+        """
+        Estimate success, wrong-zone and timeout rates and trial lengths of the frozen
+        agents from independent episodes run in bulk, at epsilon_test, until the
+        confidence intervals are `precision` wide. See marlax.evaluation.evaluate.
+        
+        Returns:
+            results (dict): Per-episode outcomes and the summary of their means.
+        """
+        return evaluate(env, policy, self.epsilon_test, n_envs=n_envs, precision=precision,
+                        seed=seed, verbose=verbose, **kwargs)
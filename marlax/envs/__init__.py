@@ -1 +1,3 @@
-from marlax.envs.gridworld.gridworld import *
\ No newline at end of file
+from marlax.envs.gridworld.gridworld import *
+from marlax.envs.gridworld.vecgridworld import *
+from marlax.envs.pong.pong import *
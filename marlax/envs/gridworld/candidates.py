@@ -0,0 +1,94 @@
+from collections.abc import Sequence
+from itertools import product
+from math import prod
+import numpy as np
+
+class CandidateStates(Sequence):
+    def __init__(self, agent_neighbors, target):
+        """
+        Candidate next states of a GridWorld, without duplicates, built on demand.
+
+        The candidates are the product of each agent's distinct next positions, in
+        the order of GridWorld.poss_act_combinations with repeats dropped: a move
+        into a wall lands where 'stay' does, so it adds no new state. Dropping the
+        later copies keeps the first best state of any argmax unchanged.
+
+        The sequence can be consumed three ways:
+            - as a list of state keys, built on the first iteration and kept;
+            - lazily by position with `[i]` and `index`, by mixed-radix arithmetic;
+            - as a packed array of flat state indices with `state_ids`, which the
+              dense Q-tables search without creating any state tuple.
+
+        Args:
+            agent_neighbors (tuple): For each agent, the tuple of its distinct next positions.
+            target: Active reward target shared by all candidates.
+        """
+        self.agent_neighbors = agent_neighbors
+        self.target = target
+        self.sizes = tuple(len(neighbors) for neighbors in agent_neighbors)
+        self.length = prod(self.sizes)
+        self.states = None
+        self.packed = {}
+
+    def __len__(self):
+        return self.length
+
+    def _materialize(self):
+        if self.states is None:
+            target = self.target
+            self.states = [(positions, target) for positions in product(*self.agent_neighbors)]
+        return self.states
+
+    def __iter__(self):
+        return iter(self._materialize())
+
+    def __getitem__(self, i):
+        if self.states is not None or isinstance(i, slice):
+            return self._materialize()[i]
+        if i < 0:
+            i += self.length
+        if not 0 <= i < self.length:
+            raise IndexError("candidate index out of range")
+        # Mixed-radix digits, the last agent varying fastest.
+        positions = []
+        for neighbors, size in zip(reversed(self.agent_neighbors), reversed(self.sizes)):
+            i, j = divmod(i, size)
+            positions.append(neighbors[j])
+        return (tuple(reversed(positions)), self.target)
+
+    def index(self, state_key, start = 0, stop = None):
+        """Return the position of a state key, raising ValueError if it is not a candidate."""
+        positions, target = state_key
+        if target != self.target or len(positions) != len(self.sizes):
+            raise ValueError(f"{state_key} is not a candidate state")
+        i = 0
+        for position, neighbors, size in zip(positions, self.agent_neighbors, self.sizes):
+            # tuple.index raises ValueError for positions out of reach.
+            i = i * size + neighbors.index(position)
+        if i < start or (stop is not None and i >= stop):
+            raise ValueError(f"{state_key} is not in the requested range")
+        return i
+
+    def __contains__(self, state_key):
+        try:
+            self.index(state_key)
+        except (ValueError, TypeError):
+            return False
+        return True
+
+    def state_ids(self, indexer):
+        """
+        Return the flat indices of all candidates under a StateIndexer, in candidate order.
+        Computed with one broadcast per agent and cached per indexer.
+        """
+        key = (indexer.grid, indexer.n_agents, indexer.targets)
+        ids = self.packed.get(key)
+        if ids is None:
+            height = indexer.grid[1]
+            # Same Horner scheme as StateIndexer.encode: target first, then each agent's cell.
+            ids = np.array(indexer.target_codes[self.target], dtype=np.int64)
+            for neighbors in self.agent_neighbors:
+                cells = np.array([x * height + y for x, y in neighbors], dtype=np.int64)
+                ids = ids[..., None] * indexer.n_cells + cells
+            ids = self.packed[key] = ids.ravel()
+        return ids
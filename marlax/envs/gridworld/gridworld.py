@@ -1,10 +1,12 @@
 from marlax.abstracts import Environment
+from marlax.envs.gridworld.candidates import CandidateStates
+from marlax.envs.gridworld.tables import compile_tables
 
 from itertools import product
 import random
 
 class GridWorld(Environment):
-    def __init__(self, grid, agents, target_rewards, together_reward, travel_reward, wrong_zone_penalty = -500):
+    def __init__(self, grid, agents, target_rewards, together_reward, travel_reward, wrong_zone_penalty = -500, rng = None):
         """
         Initialize the environment.
         
@@ -14,6 +16,8 @@ class GridWorld(Environment):
             target_rewards (list): List of target rewards for each agent (e.g., [10, 10] for two agents).
             together_reward (float): Bonus reward if agents are at the same position.
             travel_reward (float): Penalty (energy cost) for each move.
+            rng (marlax.rng.RandomStream): Optional stream for the resets. Defaults to
+                the global `random` module.
         """
         self.grid = grid
         self.agents = agents # List of Agent instances.
@@ -21,6 +25,7 @@ class GridWorld(Environment):
         self.together_reward = together_reward
         self.travel_reward = travel_reward
         self.wrong_zone_penalty = wrong_zone_penalty
+        self.rng = rng
         
         # Active reward target managed by the environment.
         # It will be a tuple (like ('lr')) or None if not active.
@@ -52,12 +57,18 @@ class GridWorld(Environment):
             'right': (1, 0)
         }
         
-        self.poss_act_combinations = list(product(self.moves.keys(), repeat=len(self.agents)))
+        # Neighbor, successor and reward zone tables, shared by every environment on this grid.
+        self.tables = compile_tables(tuple(grid), len(self.agents))
         
         # For resetting when no rewards are collected over time.
         self.steps_without_reward = 0
         self.no_reward_threshold = 50
 
+    @property
+    def poss_act_combinations(self):
+        """All joint actions, 5 ** n_agents of them; built on access only."""
+        return list(product(self.moves.keys(), repeat=len(self.agents)))
+
     def get_state(self):
         """
         Return the combined global state:
@@ -73,11 +84,33 @@ class GridWorld(Environment):
         Reset agent positions randomly within the grid.
         Also clear the active reward target.
         """
+        rng = self.rng or random
         for agent in self.agents:
-            agent.position = (random.randint(0, self.grid[0]-1),
-                              random.randint(0, self.grid[1]-1))
+            agent.position = (rng.randint(0, self.grid[0]-1),
+                              rng.randint(0, self.grid[1]-1))
         self.active_reward_target = None
-        self.true_reward_target = random.choice(self.possibilities)
+        self.true_reward_target = rng.choice(self.possibilities)
+
+    def checkpoint_state(self):
+        """
+        Return everything needed to continue the current trial after a restart.
+        """
+        return {
+            "positions": [agent.position for agent in self.agents],
+            "active_reward_target": self.active_reward_target,
+            "true_reward_target": self.true_reward_target,
+            "steps_without_reward": self.steps_without_reward,
+        }
+
+    def restore_checkpoint_state(self, state):
+        """
+        Restore the trial state saved by `checkpoint_state`.
+        """
+        for agent, position in zip(self.agents, state["positions"]):
+            agent.position = position
+        self.active_reward_target = state["active_reward_target"]
+        self.true_reward_target = state["true_reward_target"]
+        self.steps_without_reward = state["steps_without_reward"]
 
     def move_agents(self, actions):
         """
@@ -87,29 +120,23 @@ class GridWorld(Environment):
             actions (list): List of actions (one per agent).
         """
 
+        successors = self.tables.successors
         for idx, action in enumerate(actions):
             agent = self.agents[idx]
-            dx, dy = self.moves.get(action, (0, 0))
-            new_x = max(0, min(self.grid[0] - 1, agent.position[0] + dx))
-            new_y = max(0, min(self.grid[1] - 1, agent.position[1] + dy))
-            agent.position = (new_x, new_y)
+            agent.position = successors[agent.position].get(action, agent.position)
 
     def get_possible_states(self):
         """
         make combinations of possible actions for each agent
         get the possible next positions if the agents would have moved according to the actions
+        
+        Joint actions that lead to the same positions (moves into walls, 'stay') give one
+        candidate, at the place of its first joint action in poss_act_combinations.
+        The CandidateStates sequence is only expanded into state keys when iterated.
         """
-        possible_positions = []
-        for action_comb in self.poss_act_combinations:
-            new_agent_positions = []
-            for idx, action in enumerate(action_comb):
-                agent = self.agents[idx]
-                dx, dy = self.moves.get(action, (0, 0))
-                new_x = max(0, min(self.grid[0] - 1, agent.position[0] + dx))
-                new_y = max(0, min(self.grid[1] - 1, agent.position[1] + dy))
-                new_agent_positions.append((new_x, new_y))
-            possible_positions.append((tuple(new_agent_positions), self.active_reward_target))
-        return possible_positions
+        unique_neighbor_positions = self.tables.unique_neighbor_positions
+        return CandidateStates(tuple(unique_neighbor_positions[agent.position] for agent in self.agents),
+                               self.active_reward_target)
         
     def step(self, actions):
         """
@@ -204,13 +231,13 @@ class GridWorld(Environment):
         """
         collected = False
         if self.active_reward_target:
-            coords = self.reward_place_to_coord.get(self.active_reward_target, None)
-            for reward_coord in coords:
-                if all(agent.position == reward_coord for agent in self.agents):
-                    for i in range(len(rewards)):
-                        rewards[i] += self.target_rewards[i]
-                    collected = True
-                    break
+            # All agents must share one cell of the active target.
+            position = self.agents[0].position
+            if position in self.tables.reward_cells[self.active_reward_target]\
+            and all(agent.position == position for agent in self.agents):
+                for i in range(len(rewards)):
+                    rewards[i] += self.target_rewards[i]
+                collected = True
         return collected, rewards
     
     def check_wrong_reward_zones(self):
@@ -219,17 +246,13 @@ class GridWorld(Environment):
         If so, end trial. no reward.
         """
         if self.active_reward_target is not None:
-            wrong_zones = {'u','r','d','l'} - set(self.active_reward_target)
-            for zone in wrong_zones:
-                coords = self.reward_place_to_coord.get(zone, None)
-                for reward_coord in coords:
-                    if any(agent.position == reward_coord for agent in self.agents):
-                        return True
+            wrong_cells = self.tables.wrong_cells[self.active_reward_target]
+            return any(agent.position in wrong_cells for agent in self.agents)
         return False
     
 class GridWorld_r0(GridWorld):
-    def __init__(self, grid, n_agents, target_rewards, together_reward, travel_reward):
-        super().__init__(grid, n_agents, target_rewards, together_reward, travel_reward)
+    def __init__(self, grid, n_agents, target_rewards, together_reward, travel_reward, rng = None):
+        super().__init__(grid, n_agents, target_rewards, together_reward, travel_reward, rng=rng)
         # Fixed reward target for regime 0.
         self.possibilities = [None]
         
@@ -242,18 +265,18 @@ class GridWorld_r0(GridWorld):
         return collected, rewards
 
 class GridWorld_r1(GridWorld):
-    def __init__(self, grid, n_agents, target_rewards, together_reward, travel_reward):
-        super().__init__(grid, n_agents, target_rewards, together_reward, travel_reward)
+    def __init__(self, grid, n_agents, target_rewards, together_reward, travel_reward, rng = None):
+        super().__init__(grid, n_agents, target_rewards, together_reward, travel_reward, rng=rng)
         self.possibilities = ["rl"]
 
 class GridWorld_r2(GridWorld):
-    def __init__(self, grid, n_agents, target_rewards, together_reward, travel_reward):
-        super().__init__(grid, n_agents, target_rewards, together_reward, travel_reward)
+    def __init__(self, grid, n_agents, target_rewards, together_reward, travel_reward, rng = None):
+        super().__init__(grid, n_agents, target_rewards, together_reward, travel_reward, rng=rng)
         self.possibilities = ["ud"]
 
 class GridWorld_r3(GridWorld):
-    def __init__(self, grid, n_agents, target_rewards, together_reward, travel_reward):
-        super().__init__(grid, n_agents, target_rewards, together_reward, travel_reward)
+    def __init__(self, grid, n_agents, target_rewards, together_reward, travel_reward, rng = None):
+        super().__init__(grid, n_agents, target_rewards, together_reward, travel_reward, rng=rng)
         self.possibilities = [
             "ur",
             "rd",
@@ -264,8 +287,8 @@ class GridWorld_r3(GridWorld):
         ]
         
 class GridWorld_r4(GridWorld):
-    def __init__(self, grid, n_agents, target_rewards, together_reward, travel_reward):
-        super().__init__(grid, n_agents, target_rewards, together_reward, travel_reward)
+    def __init__(self, grid, n_agents, target_rewards, together_reward, travel_reward, rng = None):
+        super().__init__(grid, n_agents, target_rewards, together_reward, travel_reward, rng=rng)
         self.possibilities = [            
             "ur",
             "rd",
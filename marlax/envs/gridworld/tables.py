@@ -0,0 +1,99 @@
+from functools import cached_property, lru_cache
+import numpy as np
+
+# Every reward target a regime can activate, in a fixed order so that targets
+# can be stored as small integer codes (code 0 is "no active target").
+REWARD_TARGETS = (None, "u", "r", "d", "l", "ur", "rd", "dl", "ul", "ud", "rl")
+
+# Moves in the order used by GridWorld.moves and the joint action combinations.
+MOVES = {
+    'stay': (0, 0),
+    'up':    (0, -1),
+    'down':  (0, 1),
+    'left':  (-1, 0),
+    'right': (1, 0)
+}
+
+class GridTables:
+    def __init__(self, grid, n_agents):
+        """
+        Precompute transition and reward lookup tables for one grid size.
+
+        Cells are numbered x * height + y. Tables come in two flavours: NumPy
+        arrays for the batched code paths and plain tuples/sets for the
+        per-step Python code in GridWorld.
+
+        Args:
+            grid (tuple): (width, height) of the grid.
+            n_agents (int): Number of agents moving on the grid.
+        """
+        self.grid = grid
+        self.n_agents = n_agents
+        self.n_cells = grid[0] * grid[1]
+        self.center_pos = (grid[0] // 2, grid[1] // 2)
+        self.move_deltas = np.array(list(MOVES.values()))
+
+        # Per-cell neighbor table for the five moves, shape (n_cells, n_moves).
+        xs, ys = np.divmod(np.arange(self.n_cells), grid[1])
+        new_xs = np.clip(xs[:, None] + self.move_deltas[:, 0], 0, grid[0] - 1)
+        new_ys = np.clip(ys[:, None] + self.move_deltas[:, 1], 0, grid[1] - 1)
+        self.neighbors = new_xs * grid[1] + new_ys
+        self.cell_coords = np.stack([xs, ys], axis=1)
+
+        # Python views of the neighbor table: position -> {action: next position}
+        # and position -> next positions in move order.
+        positions = [tuple(coord) for coord in self.cell_coords.tolist()]
+        self.successors = {
+            position: {action: positions[cell] for action, cell in zip(MOVES, row)}
+            for position, row in zip(positions, self.neighbors.tolist())
+        }
+        self.neighbor_positions = {
+            position: tuple(moves.values()) for position, moves in self.successors.items()
+        }
+        # Distinct next positions in first-move order; clipped moves repeat 'stay' and are dropped.
+        self.unique_neighbor_positions = {
+            position: tuple(dict.fromkeys(neighbors)) for position, neighbors in self.neighbor_positions.items()
+        }
+
+        # Reward zones and wrong zones per target, as cell sets and as boolean masks.
+        zone_coords = {
+            "u": (grid[0] // 2, grid[1] - 1),
+            "r": (grid[0] - 1, grid[1] // 2),
+            "d": (grid[0] // 2, 0),
+            "l": (0, grid[1] // 2),
+        }
+        self.reward_cells = {}
+        self.wrong_cells = {}
+        self.reward_mask = np.zeros((len(REWARD_TARGETS),) + tuple(grid), dtype=bool)
+        self.wrong_mask = np.zeros((len(REWARD_TARGETS),) + tuple(grid), dtype=bool)
+        for code, target in enumerate(REWARD_TARGETS):
+            target_zones = set(target or "")
+            self.reward_cells[target] = frozenset(zone_coords[z] for z in target_zones)
+            self.wrong_cells[target] = frozenset(zone_coords[z] for z in zone_coords if z not in target_zones) if target else frozenset()
+            for coord in self.reward_cells[target]:
+                self.reward_mask[code][coord] = True
+            for coord in self.wrong_cells[target]:
+                self.wrong_mask[code][coord] = True
+        self.center_mask = np.zeros(tuple(grid), dtype=bool)
+        self.center_mask[self.center_pos] = True
+
+    @cached_property
+    def joint_successors(self):
+        """
+        Joint successor table of shape (n_cells ** n_agents, n_moves ** n_agents).
+
+        Row j lists the joint positions reachable from joint position j (agent 1
+        being the most significant cell) for every joint action, in the order of
+        GridWorld.poss_act_combinations. Built on first access.
+        """
+        joint = np.zeros((1, 1), dtype=np.int64)
+        for _ in range(self.n_agents):
+            # Append one agent: (j, c) x (cell, move) -> (j * n_cells + cell, c * n_moves + move)
+            joint = (joint[:, None, :, None] * self.n_cells + self.neighbors[None, :, None, :])
+            joint = joint.reshape(joint.shape[0] * self.n_cells, -1)
+        return joint
+
+@lru_cache(maxsize=None)
+def compile_tables(grid, n_agents):
+    """Return the lookup tables for a grid size, shared by every environment using it."""
+    return GridTables(tuple(grid), n_agents)
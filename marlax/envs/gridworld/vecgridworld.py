@@ -0,0 +1,263 @@
+from marlax.abstracts import Environment
+from marlax.envs.gridworld.tables import MOVES, REWARD_TARGETS, compile_tables
+
+from itertools import product
+import numpy as np
+
+class VecGridWorld(Environment):
+    def __init__(self, grid, n_envs, n_agents, target_rewards, together_reward, travel_reward, wrong_zone_penalty = -500, seed = None):
+        """
+        Initialize a batch of GridWorld environments that are stepped in lockstep.
+
+        All per-environment state lives in NumPy arrays whose first axis is the
+        environment index, so one call to `step` advances every environment.
+        Reward targets are stored as integer codes into `REWARD_TARGETS`.
+
+        Args:
+            grid (tuple): (width, height) of the grid.
+            n_envs (int): Number of environments to simulate.
+            n_agents (int): Number of agents in each environment.
+            target_rewards (list): List of target rewards for each agent (e.g., [10, 10] for two agents).
+            together_reward (float): Bonus reward if agents are at the same position.
+            travel_reward (float): Penalty (energy cost) for each move.
+            wrong_zone_penalty (float): Penalty for stepping on an inactive reward zone.
+            seed (int): Seed for the environment random generator.
+        """
+        self.grid = grid
+        self.n_envs = n_envs
+        self.n_agents = n_agents
+        self.target_rewards = np.asarray(target_rewards)
+        self.together_reward = together_reward
+        self.travel_reward = travel_reward
+        self.wrong_zone_penalty = wrong_zone_penalty
+        self.rng = np.random.default_rng(seed)
+
+        # Reward targets that can be drawn on reset; overridden by the regimes.
+        self.possibilities = []
+
+        # Center of the grid.
+        self.center_pos = (grid[0] // 2, grid[1] // 2)
+
+        # Same action order and deltas as GridWorld.moves.
+        self.actions = list(MOVES)
+        self.poss_act_combinations = np.array(list(product(range(len(self.actions)), repeat=n_agents)))
+
+        # Neighbor table and board masks indexed by [target_code, x, y], shared with GridWorld.
+        self.tables = compile_tables(tuple(grid), n_agents)
+        self.reward_mask = self.tables.reward_mask
+        self.wrong_mask = self.tables.wrong_mask
+        self.center_mask = self.tables.center_mask
+
+        # Per-environment state.
+        self.positions = np.zeros((n_envs, n_agents, 2), dtype=np.int64)
+        self.active_reward_target = np.zeros(n_envs, dtype=np.int64)
+        self.true_reward_target = np.zeros(n_envs, dtype=np.int64)
+        self.terminated = np.zeros(n_envs, dtype=bool)
+
+        # For resetting when no rewards are collected over time.
+        self.steps_without_reward = np.zeros(n_envs, dtype=np.int64)
+        self.no_reward_threshold = 50
+
+    def get_state(self):
+        """
+        Return the batched global state:
+            - Array of agent positions, shape (n_envs, n_agents, 2).
+            - Array of active reward target codes, shape (n_envs,).
+        """
+        return (self.positions.copy(), self.active_reward_target.copy())
+
+    def get_state_keys(self):
+        """
+        Return the state of every environment as a GridWorld state key,
+        i.e. ((pos1, pos2, ...), target), so tabular agents can be used directly.
+        """
+        return [
+            (tuple(map(tuple, positions.tolist())), REWARD_TARGETS[target])
+            for positions, target in zip(self.positions, self.active_reward_target)
+        ]
+
+    def reset(self, mask = None):
+        """
+        Reset agent positions randomly within the grid and clear the active reward target.
+
+        Args:
+            mask (np.ndarray): Boolean array of shape (n_envs,) selecting the
+                environments to reset. Resets all environments if None.
+        """
+        if mask is None:
+            mask = np.ones(self.n_envs, dtype=bool)
+        n_reset = int(np.count_nonzero(mask))
+        if n_reset == 0:
+            return
+        codes = np.array([REWARD_TARGETS.index(p) for p in self.possibilities])
+        self.positions[mask] = self.rng.integers(0, self.grid, size=(n_reset, self.n_agents, 2))
+        self.active_reward_target[mask] = 0
+        self.true_reward_target[mask] = self.rng.choice(codes, size=n_reset)
+
+    def move_agents(self, actions):
+        """
+        Update every agent's position based on the given actions.
+
+        Args:
+            actions (np.ndarray): Action indices of shape (n_envs, n_agents).
+        """
+        cells = self.positions[..., 0] * self.grid[1] + self.positions[..., 1]
+        self.positions[:] = self.tables.cell_coords[self.tables.neighbors[cells, actions]]
+
+    def get_possible_states(self):
+        """
+        Return the positions the agents would occupy for every joint action,
+        along with the active reward targets.
+
+        Returns:
+            positions (np.ndarray): Shape (n_envs, n_combinations, n_agents, 2).
+            targets (np.ndarray): Shape (n_envs,).
+        """
+        cells = self.positions[..., 0] * self.grid[1] + self.positions[..., 1]
+        next_cells = self.tables.neighbors[cells[:, None, :], self.poss_act_combinations[None]]
+        return self.tables.cell_coords[next_cells], self.active_reward_target.copy()
+
+    def step(self, actions):
+        """
+        Execute one time step in every environment, with the same ordering as GridWorld.step:
+          1. Move agents according to their actions.
+          2. Check for reward activation (e.g., an agent reaching the center).
+          3. Check if agents are at the designated reward positions.
+          4. Apply travel penalty and together bonus.
+          5. Reset environments where no reward is collected for too long.
+
+        Args:
+            actions (np.ndarray): Action indices of shape (n_envs, n_agents).
+
+        Returns:
+            next_state (tuple): Batched global state, see `get_state`.
+            rewards (np.ndarray): Reward for each agent, shape (n_envs, n_agents).
+            info (dict): Per-environment arrays of trial events.
+        """
+        # 1. Move agents.
+        self.move_agents(np.asarray(actions))
+        rewards = np.zeros((self.n_envs, self.n_agents),
+                           dtype=np.result_type(self.target_rewards, self.together_reward,
+                                                self.travel_reward, self.wrong_zone_penalty))
+
+        # 2. Check for reward activation if none is active.
+        activated = self.check_and_activate_rewards()
+
+        # 3. Compute rewards based on agent positions and active reward target.
+        collected, rewards = self.compute_rewards(rewards)
+
+        reached_wrong_zone = self.check_wrong_reward_zones()
+
+        # 4. Add together bonus if all agents are at the same position.
+        together = self.agents_together()
+        rewards[together] += self.together_reward
+
+        # 5. Add travel (energy loss) penalty.
+        rewards += self.travel_reward
+
+        rewards[reached_wrong_zone] += self.wrong_zone_penalty
+
+        # Trial ends on collection, on running too long or on a wrong zone.
+        terminated = collected | (self.steps_without_reward > self.no_reward_threshold) | reached_wrong_zone
+        self.steps_without_reward += ~terminated
+
+        next_state = self.get_state()
+
+        info = {
+            "activated": activated,
+            "collected": collected,
+            "terminated": terminated,
+            "steps_without_reward": self.steps_without_reward.copy(),
+        }
+
+        # Reset should happen very last
+        self.terminated = terminated
+        self.steps_without_reward[terminated] = 0
+        self.reset(terminated)
+
+        return next_state, rewards, info
+
+    def agents_together(self):
+        """Return a boolean array marking environments where all agents share one cell."""
+        return (self.positions == self.positions[:, :1]).all(axis=(1, 2))
+
+    def check_and_activate_rewards(self):
+        """
+        Activate the reward target in environments where an agent is at the
+        center and no reward target is active.
+        """
+        at_center = self.center_mask[self.positions[..., 0], self.positions[..., 1]].any(axis=1)
+        # A regime whose true target is None reports activation without changing state,
+        # exactly like GridWorld.
+        activated = (self.active_reward_target == 0) & at_center
+        self.active_reward_target[activated] = self.true_reward_target[activated]
+        return activated
+
+    def compute_rewards(self, rewards):
+        """
+        Give every agent its target reward in environments where all agents
+        stand on the same cell of the active reward target.
+        Returns:
+            collected (np.ndarray): Boolean array marking environments where the reward was collected.
+        """
+        on_reward = self.reward_mask[self.active_reward_target, self.positions[:, 0, 0], self.positions[:, 0, 1]]
+        collected = on_reward & self.agents_together()
+        rewards[collected] += self.target_rewards
+        return collected, rewards
+
+    def check_wrong_reward_zones(self):
+        """
+        Return a boolean array marking environments where any agent is at a
+        reward zone that is not part of the active target.
+        """
+        targets = self.active_reward_target[:, None]
+        return self.wrong_mask[targets, self.positions[..., 0], self.positions[..., 1]].any(axis=1)
+
+class VecGridWorld_r0(VecGridWorld):
+    def __init__(self, grid, n_envs, n_agents, target_rewards, together_reward, travel_reward, seed = None):
+        super().__init__(grid, n_envs, n_agents, target_rewards, together_reward, travel_reward, seed=seed)
+        # Fixed reward target for regime 0.
+        self.possibilities = [None]
+
+    def compute_rewards(self, rewards):
+        collected = self.center_mask[self.positions[..., 0], self.positions[..., 1]].any(axis=1)
+        rewards[collected] += self.target_rewards
+        return collected, rewards
+
+class VecGridWorld_r1(VecGridWorld):
+    def __init__(self, grid, n_envs, n_agents, target_rewards, together_reward, travel_reward, seed = None):
+        super().__init__(grid, n_envs, n_agents, target_rewards, together_reward, travel_reward, seed=seed)
+        self.possibilities = ["rl"]
+
+class VecGridWorld_r2(VecGridWorld):
+    def __init__(self, grid, n_envs, n_agents, target_rewards, together_reward, travel_reward, seed = None):
+        super().__init__(grid, n_envs, n_agents, target_rewards, together_reward, travel_reward, seed=seed)
+        self.possibilities = ["ud"]
+
+class VecGridWorld_r3(VecGridWorld):
+    def __init__(self, grid, n_envs, n_agents, target_rewards, together_reward, travel_reward, seed = None):
+        super().__init__(grid, n_envs, n_agents, target_rewards, together_reward, travel_reward, seed=seed)
+        self.possibilities = [
+            "ur",
+            "rd",
+            "dl",
+            "ul",
+            "rl",
+            "ud"
+        ]
+
+class VecGridWorld_r4(VecGridWorld):
+    def __init__(self, grid, n_envs, n_agents, target_rewards, together_reward, travel_reward, seed = None):
+        super().__init__(grid, n_envs, n_agents, target_rewards, together_reward, travel_reward, seed=seed)
+        self.possibilities = [
+            "ur",
+            "rd",
+            "dl",
+            "ul",
+            "rl",
+            "ud"
+        ]
+
+    def get_possible_states(self):
+        # only get the current state and not the entire combination
+        return self.positions[:, None].copy(), self.active_reward_target.copy()
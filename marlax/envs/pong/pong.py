@@ -0,0 +1,196 @@
+from marlax.abstracts import Environment
+from marlax.envs.gridworld.candidates import CandidateStates
+from marlax.envs.pong.tables import LEFT_HIT, POINT, RIGHT_HIT, compile_pong_tables
+from marlax.qtables import DenseQTable
+
+import random
+import numpy as np
+
+class Pong(Environment):
+    def __init__(self, grid, agents, n_games = 1, paddle_height = 3, score_reward = 1, hit_reward = 0, max_rally = 200, rng = None):
+        """
+        Two-agent discrete Pong, stepping one or many games per call.
+
+        All game state lives in NumPy arrays whose first axis is the game, and
+        the dynamics are lookups into precomputed tables (see PongTables), so
+        the same `step` advances one game or thousands.
+
+        With n_games=1 the environment follows the GridWorld protocol used by
+        Engine: states are keys ((paddle 1, paddle 2), ball) where a paddle is
+        (0, row) and ball is an integer code, and each agent's `position` is
+        kept on its paddle, so QValueAgent and QAgent work unchanged. Use
+        agents with actions ['stay', 'up', 'down']; 'left' and 'right' keep the
+        paddle in place. With n_games > 1, `step` takes an (n_games, 2) array of
+        action codes and returns arrays.
+
+        A rally ends when a player concedes a point or after max_rally steps;
+        the ball is then served again from the middle.
+
+        The Tracer logs its frames (reward_loc is the ball code) and occupancy
+        counts (all under target None, activation being a paddle hit); trial
+        statistics are about GridWorld reward zones and raise a TypeError.
+
+        Args:
+            grid (tuple): (width, height) of the board.
+            agents (list): The two agents; agent 1 plays the left paddle.
+            n_games (int): Games stepped in parallel.
+            paddle_height (int): Cells covered by a paddle.
+            score_reward (float): Reward for scoring, the opponent gets its negative.
+            hit_reward (float): Reward for returning the ball.
+            max_rally (int): Steps after which a rally without a point ends.
+            rng (marlax.rng.RandomStream): Optional stream for the serves. Defaults to
+                the global `random` module.
+        """
+        if len(agents) != 2:
+            raise ValueError("Pong is played by two agents.")
+        self.grid = grid
+        self.agents = agents
+        self.n_games = n_games
+        self.score_reward = score_reward
+        self.hit_reward = hit_reward
+        self.max_rally = max_rally
+        self.rng = rng
+        self.tables = compile_pong_tables(tuple(grid), paddle_height)
+        self.actions = self.tables.actions
+        self.action_codes = {action: code for code, action in enumerate(self.actions)}
+
+        # Rewards of both agents for every entry of the transition table.
+        n_balls = self.tables.n_balls
+        packed = np.arange((n_balls + 2) * 4)
+        codes, events = packed // 4, packed % 4
+        reward_table = np.zeros((len(packed), 2))
+        reward_table[events == LEFT_HIT, 0] = hit_reward
+        reward_table[events == RIGHT_HIT, 1] = hit_reward
+        left_scored = (events == POINT) & (codes == n_balls)
+        right_scored = (events == POINT) & (codes == n_balls + 1)
+        reward_table[left_scored] = (score_reward, -score_reward)
+        reward_table[right_scored] = (-score_reward, score_reward)
+        if float(score_reward).is_integer() and float(hit_reward).is_integer():
+            reward_table = reward_table.astype(np.int64)
+        self.reward_table = reward_table
+        self.reward_rows = reward_table.tolist()
+
+        self.paddles = np.zeros((n_games, 2), dtype=np.int64)
+        self.ball = np.zeros(n_games, dtype=np.int64)
+        # Steps since the serve, reported as steps_without_reward like GridWorld's.
+        self.rally = np.zeros(n_games, dtype=np.int64)
+
+    def make_qtable(self, n_actions = None):
+        """
+        Dense Q-table over all (paddle rows, ball) states, for QValueAgent (n_actions
+        None) or QAgent (n_actions=len(agent.actions)).
+        """
+        return DenseQTable((1, self.tables.n_paddle_positions), 2, tuple(range(self.tables.n_balls)), n_actions)
+
+    def _serve(self, games):
+        """Draw a serve for every selected game."""
+        rng = self.rng or random
+        serves = self.tables.serve_codes
+        self.ball[games] = [serves[int(rng.random() * len(serves))] for _ in range(len(games))]
+        self.rally[games] = 0
+
+    def reset(self):
+        """Center the paddles and serve in every game."""
+        self.paddles[:] = self.tables.n_paddle_positions // 2
+        self._serve(np.arange(self.n_games))
+        self._sync_agents()
+
+    def _sync_agents(self):
+        if self.n_games == 1:
+            for agent, row in zip(self.agents, self.paddles[0].tolist()):
+                agent.position = (0, row)
+
+    def get_state(self):
+        """
+        Return the global state: the key ((paddle 1, paddle 2), ball) for a single game,
+        or the arrays (paddle rows (n_games, 2), ball codes (n_games,)) for many.
+        """
+        if self.n_games == 1:
+            left, right = self.paddles[0].tolist()
+            return (((0, left), (0, right)), int(self.ball[0]))
+        return (self.paddles.copy(), self.ball.copy())
+
+    def get_possible_states(self):
+        """
+        Next states of a single game for every joint paddle move, with the current ball,
+        like GridWorld's candidates with the current reward target.
+        """
+        unique_positions = self.tables.unique_paddle_positions
+        return CandidateStates(tuple(unique_positions[agent.position] for agent in self.agents), int(self.ball[0]))
+
+    def checkpoint_state(self):
+        return {"paddles": self.paddles.copy(), "ball": self.ball.copy(), "rally": self.rally.copy()}
+
+    def restore_checkpoint_state(self, state):
+        self.paddles[:] = state["paddles"]
+        self.ball[:] = state["ball"]
+        self.rally[:] = state["rally"]
+        self._sync_agents()
+
+    def step(self, actions):
+        """
+        Move the paddles, then the ball, in every game.
+
+        Args:
+            actions: For a single game, one action name per agent. For many games, an
+                array of action codes (indices into self.actions) of shape (n_games, 2).
+
+        Returns:
+            next_state: The state key for action names, the arrays of `get_state` for action
+                codes; taken before finished rallies are served again.
+            rewards: Reward of each agent, a list or an (n_games, 2) array.
+            info (dict): activated (ball returned by a paddle), collected (point scored),
+                terminated (rally over) and steps_without_reward (rally length).
+        """
+        if self.n_games == 1 and not isinstance(actions, np.ndarray):
+            return self._step_single(actions)
+        tables = self.tables
+        paddles = self.paddles = tables.paddle_next[self.paddles, actions]
+        packed = tables.transitions[self.ball, paddles[:, 0], paddles[:, 1]]
+        rewards = self.reward_table[packed]
+        events = packed & 3
+        scored = events == POINT
+        self.rally += 1
+        terminated = scored | (self.rally > self.max_rally)
+        self.ball = np.where(scored, 0, packed >> 2)
+        next_state = (paddles.copy(), self.ball.copy())
+        info = {
+            "activated": (events == LEFT_HIT) | (events == RIGHT_HIT),
+            "collected": scored,
+            "terminated": terminated,
+            "steps_without_reward": self.rally.copy(),
+        }
+        games = np.flatnonzero(terminated)
+        if len(games):
+            self._serve(games)
+        self._sync_agents()
+        return next_state, rewards, info
+
+    def _step_single(self, actions):
+        """`step` of a single game on the list copies of the tables, same results as the batched path."""
+        tables = self.tables
+        n_positions = tables.n_paddle_positions
+        left, right = self.paddles[0].tolist()
+        left = tables.paddle_next_rows[left][self.action_codes[actions[0]]]
+        right = tables.paddle_next_rows[right][self.action_codes[actions[1]]]
+        self.paddles[0] = (left, right)
+        packed = tables.flat_transitions[(int(self.ball[0]) * n_positions + left) * n_positions + right]
+        event = packed & 3
+        scored = event == POINT
+        rally = int(self.rally[0]) + 1
+        terminated = scored or rally > self.max_rally
+        ball = 0 if scored else packed >> 2
+        self.ball[0] = ball
+        self.rally[0] = rally
+        self.agents[0].position = (0, left)
+        self.agents[1].position = (0, right)
+        next_state = (((0, left), (0, right)), ball)
+        info = {
+            "activated": event == LEFT_HIT or event == RIGHT_HIT,
+            "collected": scored,
+            "terminated": terminated,
+            "steps_without_reward": rally,
+        }
+        if terminated:
+            self._serve([0])
+        return next_state, list(self.reward_rows[packed]), info
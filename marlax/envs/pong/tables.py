@@ -0,0 +1,97 @@
+from marlax.envs.gridworld.tables import MOVES
+
+from functools import lru_cache
+import numpy as np
+
+# Events of a ball transition, stored in the two low bits of the transition table.
+NO_EVENT, LEFT_HIT, RIGHT_HIT, POINT = 0, 1, 2, 3
+
+class PongTables:
+    def __init__(self, grid, paddle_height):
+        """
+        Precompute the paddle and ball dynamics of discrete Pong for one board size.
+
+        The ball moves on the cells of the board with vx in {-1, 1} and vy in
+        {-1, 0, 1}, bouncing off the top and bottom walls. Paddles fill the first
+        and last column; the ball stays in the columns between them. A ball state
+        is one integer code ((x * height + y) * 2 + (vx > 0)) * 3 + vy + 1, and a
+        paddle position is the row of its top cell.
+
+        Args:
+            grid (tuple): (width, height) of the board.
+            paddle_height (int): Cells covered by a paddle.
+        """
+        width, height = grid
+        self.grid = grid
+        self.paddle_height = paddle_height
+        self.n_paddle_positions = height - paddle_height + 1
+        self.n_balls = width * height * 6
+
+        # Paddle moves in the order of GridWorld.moves; 'left' and 'right' keep the paddle in place.
+        self.actions = list(MOVES)
+        dy = np.array([delta[1] for delta in MOVES.values()])
+        self.paddle_next = np.clip(np.arange(self.n_paddle_positions)[:, None] + dy, 0, self.n_paddle_positions - 1)
+        # Distinct next positions of a paddle in first-move order, as (0, row) state positions.
+        self.unique_paddle_positions = {
+            (0, row): tuple(dict.fromkeys((0, int(next_row)) for next_row in next_rows))
+            for row, next_rows in enumerate(self.paddle_next.tolist())
+        }
+
+        codes = np.arange(self.n_balls)
+        self.ball_x = codes // (height * 6)
+        self.ball_y = codes // 6 % height
+        self.ball_vx = np.where(codes // 3 % 2 == 1, 1, -1)
+        self.ball_vy = codes % 3 - 1
+
+        # Serves: from the middle column, any row, any direction.
+        self.serve_codes = np.array([self.encode_ball(width // 2, y, vx, vy)
+                                     for y in range(height) for vx in (-1, 1) for vy in (-1, 0, 1)])
+        self.transitions = self._transitions()
+        # Python-list copies for stepping a single game without NumPy call overhead.
+        self.paddle_next_rows = self.paddle_next.tolist()
+        self.flat_transitions = self.transitions.ravel().tolist()
+
+    def encode_ball(self, x, y, vx, vy):
+        return ((x * self.grid[1] + y) * 2 + (vx > 0)) * 3 + vy + 1
+
+    def _transitions(self):
+        """
+        Table of shape (n_balls, n_paddle_positions, n_paddle_positions): the next ball
+        code of a ball given the left and right paddle rows, shifted left by two bits,
+        plus the event. A point stores n_balls (left scored) or n_balls + 1 (right scored).
+        """
+        width, height = self.grid
+        n_positions = self.n_paddle_positions
+        x = self.ball_x[:, None, None]
+        vx = self.ball_vx[:, None, None]
+        left = np.arange(n_positions)[None, :, None]
+        right = np.arange(n_positions)[None, None, :]
+        shape = (self.n_balls, n_positions, n_positions)
+
+        # Free flight with bounces off the top and bottom walls.
+        y = self.ball_y + self.ball_vy
+        vy = np.where((y < 0) | (y > height - 1), -self.ball_vy, self.ball_vy)
+        y = np.where(y < 0, -y, np.where(y > height - 1, 2 * (height - 1) - y, y))
+        y, vy = np.broadcast_to(y[:, None, None], shape), np.broadcast_to(vy[:, None, None], shape)
+        next_x = np.broadcast_to(x + vx, shape)
+
+        # Reaching a paddle column: bounce off the paddle or concede the point.
+        at_left, at_right = next_x <= 0, next_x >= width - 1
+        paddle = np.where(at_left, left, right)
+        offset = y - paddle
+        hit = (at_left | at_right) & (offset >= 0) & (offset < self.paddle_height)
+        # The top of a paddle sends the ball up, the bottom down, the middle straight.
+        hit_vy = np.sign(2 * offset - (self.paddle_height - 1))
+        new_x = np.where(hit, np.where(at_left, 1, width - 2), next_x)
+        new_vx = np.where(hit, -vx, vx)
+        new_vy = np.where(hit, hit_vy, vy)
+        codes = self.encode_ball(new_x, y, new_vx, new_vy)
+        missed = (at_left | at_right) & ~hit
+        codes = np.where(missed, np.where(at_right, self.n_balls, self.n_balls + 1), codes)
+        events = np.where(missed, POINT, np.where(hit, np.where(at_left, LEFT_HIT, RIGHT_HIT), NO_EVENT))
+        return (codes * 4 + events).astype(np.int64)
+
+@lru_cache(maxsize=None)
+def compile_pong_tables(grid, paddle_height):
+    """Return the lookup tables for a board, shared by every Pong environment using it."""
+    return PongTables(tuple(grid), paddle_height)
@@ -0,0 +1,203 @@
+from marlax.envs.gridworld import vecgridworld
+from marlax.envs.gridworld.tables import REWARD_TARGETS
+from marlax.policy import MOVE_NAMES, compile_policy
+
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+# Per-episode outcomes whose means are tracked with confidence intervals.
+OUTCOMES = ("success", "wrong_zone", "timeout", "length")
+RATES = ("success", "wrong_zone", "timeout")
+
+class RunningStats:
+    def __init__(self, names, confidence = 0.95, rates = ()):
+        """
+        Streaming means and confidence intervals.
+
+        Only the count, sum and sum of squares of every metric are kept, so
+        batches of any size can be folded in as they arrive. Means of 0/1
+        metrics listed in `rates` get Wilson score intervals, which stay wide
+        for rates near 0 or 1; the others get normal-approximation intervals.
+
+        Args:
+            names (tuple): Metric names.
+            confidence (float): Coverage of the intervals.
+            rates (tuple): Names of the 0/1 metrics.
+        """
+        self.names = tuple(names)
+        self.rates = np.array([name in rates for name in self.names])
+        self.z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        self.n = 0
+        self.sums = np.zeros(len(self.names))
+        self.squares = np.zeros(len(self.names))
+
+    def add(self, values):
+        """Fold in a batch, an array of shape (n, len(names))."""
+        values = np.asarray(values, dtype=np.float64)
+        self.n += len(values)
+        self.sums += values.sum(axis=0)
+        self.squares += (values ** 2).sum(axis=0)
+
+    def mean(self):
+        return self.sums / max(self.n, 1)
+
+    def interval(self):
+        """Return (low, high) bounds of every mean; infinite before two samples."""
+        if self.n < 2:
+            return np.full(len(self.names), -np.inf), np.full(len(self.names), np.inf)
+        n, z, mean = self.n, self.z, self.mean()
+        variance = np.maximum(self.squares - n * mean ** 2, 0) / (n - 1)
+        half_width = z * np.sqrt(variance / n)
+        # Wilson score interval for the rates.
+        center = (mean + z ** 2 / (2 * n)) / (1 + z ** 2 / n)
+        wilson = z / (1 + z ** 2 / n) * np.sqrt(np.clip(mean * (1 - mean), 0, None) / n + z ** 2 / (4 * n ** 2))
+        low = np.where(self.rates, center - wilson, mean - half_width)
+        high = np.where(self.rates, center + wilson, mean + half_width)
+        return low, high
+
+    def half_width(self):
+        """Half width of the confidence interval of every mean."""
+        low, high = self.interval()
+        return (high - low) / 2
+
+    def summary(self):
+        """Return a DataFrame with mean, ci_low, ci_high and half_width per metric."""
+        low, high = self.interval()
+        return pd.DataFrame({"mean": self.mean(), "ci_low": low, "ci_high": high,
+                             "half_width": (high - low) / 2}, index=list(self.names))
+
+def vec_env_for(env, n_envs, seed = None):
+    """Build the VecGridWorld regime matching a GridWorld, with the same rewards and thresholds."""
+    vec_class = getattr(vecgridworld, "Vec" + type(env).__name__, None)
+    if vec_class is None:
+        raise TypeError(f"No batched version of {type(env).__name__}.")
+    vec_env = vec_class(env.grid, n_envs, len(env.agents), env.target_rewards,
+                        env.together_reward, env.travel_reward, seed=seed)
+    vec_env.wrong_zone_penalty = env.wrong_zone_penalty
+    vec_env.no_reward_threshold = env.no_reward_threshold
+    return vec_env
+
+def evaluate(env, policy = None, epsilon = 0.0, n_envs = 1024, precision = 0.01, confidence = 0.95,
+             min_episodes = 1000, max_episodes = 1_000_000, metrics = ("success",), seed = None, verbose = True):
+    """
+    Estimate trial outcomes of frozen agents from many independent episodes run in bulk.
+
+    The agents' greedy actions are looked up in a compiled policy and `n_envs`
+    episodes are stepped at once in the VecGridWorld of the same regime. Every
+    terminated trial is one episode; its environment resets and starts the next.
+    Means and confidence intervals are updated after every step, and no new
+    episode is counted once every metric in `metrics` is known to `precision`.
+    The episodes still running then finish, so long episodes are not cut off.
+
+    Outcomes follow TrialStats: success is a collected reward, wrong_zone a trial
+    ended without reward before the time limit, timeout a trial that ran out of steps.
+
+    Args:
+        env: GridWorld whose agents hold the frozen Q-tables.
+        policy (GreedyPolicy): Compiled policy of the agents; compiled from env if None.
+        epsilon (float): Probability of a uniformly random action, per agent and step.
+        n_envs (int): Episodes run in parallel.
+        precision (float): Target half width of the confidence intervals.
+        confidence (float): Coverage of the confidence intervals.
+        min_episodes (int): Episodes to collect before checking the precision.
+        max_episodes (int): Stop counting new episodes after this many.
+        metrics (tuple): Outcomes (from OUTCOMES) that must reach the precision.
+        seed (int): Seed of the batched environment and of the exploration.
+        verbose (bool): Show a progress bar of the episodes collected.
+
+    Returns:
+        results (dict):
+            episodes: DataFrame, one row per episode with success, wrong_zone, timeout,
+                length, activated_by, reward_loc and reward (of the first agent).
+            summary: DataFrame of means and confidence intervals per outcome.
+            n_episodes, n_steps: Episodes counted and batched steps run.
+    """
+    if policy is None:
+        policy = compile_policy(env)
+    vec_env = vec_env_for(env, n_envs, seed)
+    rng = np.random.default_rng(None if seed is None else seed + 1)
+    n_agents = vec_env.n_agents
+    # Policy target code of every REWARD_TARGETS code.
+    target_codes = np.array([policy.indexer.target_codes.get(target, 0) for target in REWARD_TARGETS])
+    agent_moves = [np.array([MOVE_NAMES.index(action) for action in agent.actions]) for agent in env.agents]
+    table = np.asarray(policy.table)
+    stats = RunningStats(OUTCOMES, confidence, RATES)
+    checked = [OUTCOMES.index(metric) for metric in metrics]
+
+    # State of the running episodes.
+    length = np.zeros(n_envs, dtype=np.int64)
+    reward = np.zeros(n_envs)
+    activated_by = np.full(n_envs, -1, dtype=np.int64)  # agent index, n_agents for a tie
+    counted = np.ones(n_envs, dtype=bool)  # whether the running episode will be recorded
+    records = []
+    n_episodes, n_steps = 0, 0
+    vec_env.reset()
+    progress = tqdm(total=max_episodes, disable=not verbose, desc="Evaluating")
+    while counted.any():
+        state_ids = policy.indexer.encode_arrays(vec_env.positions, target_codes[vec_env.active_reward_target])
+        actions = table[state_ids].astype(np.int64)
+        if epsilon > 0:
+            explore = rng.random((n_envs, n_agents)) < epsilon
+            for i, moves in enumerate(agent_moves):
+                random_moves = moves[rng.integers(0, len(moves), n_envs)]
+                actions[:, i] = np.where(explore[:, i], random_moves, actions[:, i])
+
+        # The returned state is taken before terminated environments reset.
+        (positions, targets), rewards, info = vec_env.step(actions)
+        n_steps += 1
+        length += 1
+        reward += rewards[:, 0]
+        if info["activated"].any():
+            first = info["activated"] & (activated_by < 0)
+            at_center = vec_env.center_mask[positions[..., 0], positions[..., 1]]
+            who = np.where(at_center.sum(axis=1) > 1, n_agents, np.argmax(at_center, axis=1))
+            activated_by[first] = who[first]
+
+        done = info["terminated"]
+        if done.any():
+            collected = info["collected"][done]
+            timed_out = info["steps_without_reward"][done] > vec_env.no_reward_threshold
+            finished = {
+                "success": collected,
+                "wrong_zone": ~collected & ~timed_out,
+                "timeout": ~collected & timed_out,
+                "length": length[done],
+                "activated_by": activated_by[done],
+                "reward_loc": targets[done],
+                "reward": reward[done],
+            }
+            keep = counted[done]
+            if keep.any():
+                batch = {name: values[keep] for name, values in finished.items()}
+                records.append(batch)
+                stats.add(np.stack([batch[name] for name in OUTCOMES], axis=1))
+                n_episodes += int(keep.sum())
+                progress.update(int(keep.sum()))
+            length[done] = 0
+            reward[done] = 0
+            activated_by[done] = -1
+            # Stop counting new episodes once precise enough; running ones still finish.
+            stop = n_episodes >= max_episodes or (
+                n_episodes >= min_episodes and np.all(stats.half_width()[checked] <= precision))
+            counted[done] = not stop
+            if verbose:
+                progress.set_postfix({name: f"{mean:.3f}±{hw:.3f}" for name, mean, hw
+                                      in zip(stats.names, stats.mean(), stats.half_width()) if name in metrics},
+                                     refresh=False)
+    progress.close()
+
+    columns = {name: np.concatenate([batch[name] for batch in records]) if records else np.zeros(0)
+               for name in ("success", "wrong_zone", "timeout", "length", "activated_by", "reward_loc", "reward")}
+    leaders = np.array([None] + [f"a{i+1}" for i in range(n_agents)] + ["tie"], dtype=object)
+    episodes = pd.DataFrame({
+        "success": columns["success"].astype(bool),
+        "wrong_zone": columns["wrong_zone"].astype(bool),
+        "timeout": columns["timeout"].astype(bool),
+        "length": columns["length"].astype(np.int64),
+        "activated_by": leaders[columns["activated_by"].astype(np.int64) + 1],
+        "reward_loc": np.array(REWARD_TARGETS, dtype=object)[columns["reward_loc"].astype(np.int64)],
+        "reward": columns["reward"],
+    })
+    return {"episodes": episodes, "summary": stats.summary(), "n_episodes": n_episodes, "n_steps": n_steps}
@@ -0,0 +1,268 @@
+from marlax.agents import QAgent
+from marlax.qtables import DenseQTable, SharedQTable
+from marlax.rng import ExperimentRNG
+
+import copy
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import queue
+import random
+from time import perf_counter
+import numpy as np
+from tqdm import tqdm
+
+def _shared_tables(env):
+    """Replace every agent's Q-table by a SharedQTable holding the same values."""
+    tables = []
+    for agent in env.agents:
+        q_table = agent.q_table
+        if not isinstance(q_table, DenseQTable):
+            q_table = DenseQTable.from_dict(q_table, env.grid, len(env.agents),
+                                            actions=agent.actions if isinstance(agent, QAgent) else None)
+        agent.q_table = SharedQTable(q_table)
+        tables.append(agent.q_table)
+    return tables
+
+def _frame_block(columns, n_agents, reward_dtype):
+    """Column arrays of the frames collected by a worker, named like the Tracer buffer."""
+    reward_locs, activated, collected, terminated, steps_without_reward, positions, rewards = columns
+    block = {
+        "frame_idx": np.zeros(len(terminated), dtype=np.int64),  # numbered by the coordinator
+        "reward_loc": np.array(reward_locs, dtype=np.int32),
+        "activated": np.array(activated, dtype=bool),
+        "collected": np.array(collected, dtype=bool),
+        "terminated": np.array(terminated, dtype=bool),
+        "steps_without_reward": np.array(steps_without_reward, dtype=np.int64),
+    }
+    positions = np.array(positions, dtype=np.int64).reshape(-1, n_agents, 2)
+    rewards = np.array(rewards, dtype=reward_dtype).reshape(-1, n_agents)
+    for i in range(n_agents):
+        block[f"a{i+1}x"] = positions[:, i, 0]
+        block[f"a{i+1}y"] = positions[:, i, 1]
+    for i in range(n_agents):
+        block[f"r{i+1}"] = rewards[:, i]
+    return block
+
+def _worker(worker_id, env, num_steps, alpha, gamma, shared, messages, log_frames, block_size, sample_every, seed):
+    """
+    Training loop of one worker: the loop of Engine.train on its own environment copy,
+    updating the shared Q-tables without locks. Epsilon is read from the coordinator.
+    """
+    epsilon_view, counters = (np.ndarray(shape, dtype=dtype, buffer=block.buf) for block, shape, dtype in shared)
+    rng = ExperimentRNG(seed)
+    n_agents = len(env.agents)
+    env.rng = rng.stream("worker_env", worker_id)
+    for i, agent in enumerate(env.agents):
+        agent.rng = rng.stream("worker_agent", worker_id * n_agents + i)
+    random.seed(seed * 1_000_003 + worker_id)
+
+    reward_loc_codes, reward_loc_values = {None: 0}, [None]
+    columns = tuple([] for _ in range(7))
+    reward_locs, activated, collected, terminated, steps_without_reward, positions, rewards = columns
+    staleness = []
+    reward_dtype = None
+
+    start = perf_counter()
+    env.reset()
+    possible_next_states = env.get_possible_states()
+    for step in range(num_steps):
+        if step % 256 == 0:
+            epsilon = float(epsilon_view[0])
+        sampled = step % sample_every == 0
+        if sampled:
+            others_before = int(counters.sum() - counters[worker_id])
+
+        actions = []
+        for i, agent in enumerate(env.agents):
+            actions.append(agent.choose(possible_next_states, epsilon, agent_id = i))
+        state, step_rewards, info = env.step(actions)
+        possible_next_states = env.get_possible_states()
+        for i, agent in enumerate(env.agents):
+            agent.update(state, actions[i], step_rewards[i], agent.remember_max_state(possible_next_states), alpha, gamma)
+        counters[worker_id] = step + 1
+
+        if sampled:
+            # Updates other workers applied between this step's reads and writes.
+            staleness.append(int(counters.sum() - counters[worker_id]) - others_before)
+
+        if log_frames:
+            agent_states, reward_loc = state
+            code = reward_loc_codes.get(reward_loc)
+            if code is None:
+                code = reward_loc_codes[reward_loc] = len(reward_loc_values)
+                reward_loc_values.append(reward_loc)
+            reward_locs.append(code)
+            activated.append(info["activated"])
+            collected.append(info["collected"])
+            terminated.append(info["terminated"])
+            steps_without_reward.append(info["steps_without_reward"])
+            for position in agent_states:
+                positions.append(position)
+            rewards.extend(step_rewards)
+            if reward_dtype is None:
+                reward_dtype = np.asarray(step_rewards).dtype
+            # Blocks end on a trial boundary, so every trial of the log comes from one worker.
+            if len(terminated) >= block_size and info["terminated"]:
+                messages.put(("frames", worker_id, _frame_block(columns, n_agents, reward_dtype), list(reward_loc_values)))
+                for column in columns:
+                    column.clear()
+    if log_frames and terminated:
+        messages.put(("frames", worker_id, _frame_block(columns, n_agents, reward_dtype), list(reward_loc_values)))
+    messages.put(("done", worker_id, {"steps": num_steps, "wall_time": perf_counter() - start, "staleness": staleness}))
+
+def _serial_rate(engine, env, num_steps, alpha, gamma):
+    """
+    Steps per second of Engine.train on a private copy of the environment and its tables.
+    The global random states are put back, so the measurement does not shift the real run.
+    """
+    env = copy.deepcopy(env)
+    random_state, numpy_random_state = random.getstate(), np.random.get_state()
+    try:
+        start = perf_counter()
+        engine.train(env, None, num_steps=num_steps, alpha=alpha, gamma=gamma, verbose=False)
+        return num_steps / (perf_counter() - start)
+    finally:
+        random.setstate(random_state)
+        np.random.set_state(numpy_random_state)
+
+def train_hogwild(engine, env, logger, num_steps = 1_000_000, alpha = 0.1, gamma = 0.9, n_workers = None,
+                  verbose = True, flush_every = 1_000_000, regime_idx = 0, block_size = 10_000,
+                  sample_every = 1000, baseline_steps = 0, seed = None):
+    """
+    Train the agents of `env` on several processes sharing their Q-tables, Hogwild style.
+
+    Every agent's Q-table is moved to shared memory (dict tables are converted to
+    DenseQTable first) and each worker process runs the loop of Engine.train on its
+    own copy of the environment, applying its updates to the shared tables without
+    locks. This process coordinates: it owns the global step count, sets epsilon
+    on the schedule of Engine.train from it, and writes the frames the workers
+    send to the Tracer. Workers send frames in blocks that end on a trial
+    boundary; the coordinator numbers them in arrival order, so frame_idx is
+    contiguous and each trial comes from one worker.
+
+    Updates from different workers may interleave between one worker's read and
+    write of a table; the number of such updates is sampled as staleness.
+    Trial statistics and occupancy counts of the Tracer are not collected here.
+
+    Args:
+        engine (Engine): Provides the epsilon schedule.
+        env: Environment whose agents are trained; they hold the trained tables at the end.
+        logger (Tracer): Receives the frames, may be None.
+        num_steps (int): Total steps over all workers.
+        n_workers (int): Worker processes, defaults to the number of CPUs.
+        block_size (int): Minimum frames per block sent by a worker.
+        sample_every (int): Measure the staleness of one step in this many.
+        baseline_steps (int): Steps of a serial Engine.train run on a copy of env, timed for
+            the speedup. Off (0) by default; the global random state is restored after it.
+        seed (int): Seed of the workers' random streams.
+
+    Returns:
+        summary (dict): Wall time, steps per second, speedup over the serial rate (None
+            without baseline_steps) and
+            staleness statistics. Also written to profiles/hogwild_{regime_idx}.json.
+    """
+    if logger and (logger.trial_stats or logger.occupancy):
+        raise ValueError("Hogwild training only logs frames; disable trial_stats and occupancy on the Tracer.")
+    n_workers = n_workers or mp.cpu_count()
+    seed = np.random.SeedSequence().entropy if seed is None else seed
+    serial_rate = _serial_rate(engine, env, baseline_steps, alpha, gamma) if baseline_steps else None
+    tables = _shared_tables(env)
+
+    context = mp.get_context()
+    epsilon_block = shared_memory.SharedMemory(create=True, size=8)
+    counter_block = shared_memory.SharedMemory(create=True, size=8 * n_workers)
+    epsilon_view = np.ndarray((1,), dtype=np.float64, buffer=epsilon_block.buf)
+    counters = np.ndarray((n_workers,), dtype=np.int64, buffer=counter_block.buf)
+    epsilon_view[0] = engine.epsilon_start
+    counters[:] = 0
+    messages = context.Queue()
+    quotas = [num_steps // n_workers + (w < num_steps % n_workers) for w in range(n_workers)]
+    workers = []
+    try:
+        env.reset()
+        start = perf_counter()
+        for worker_id, quota in enumerate(quotas):
+            worker = context.Process(target=_hogwild_entry, name=f"marlax-hogwild-{worker_id}",
+                                     args=(worker_id, env, quota, alpha, gamma,
+                                           [(epsilon_block.name, (1,), np.float64), (counter_block.name, (n_workers,), np.int64)],
+                                           messages, bool(logger and logger.log_frames), block_size, sample_every, seed))
+            worker.start()
+            workers.append(worker)
+        # After the workers are forked, so they never inherit the Tracer's writer thread.
+        if logger: logger._init_logger(flush_every, regime_idx, "training", env)
+
+        progress = tqdm(total=num_steps, disable=not verbose, desc="Training (hogwild)")
+        next_frame, finished, results = 0, 0, {}
+        while finished < n_workers:
+            try:
+                message = messages.get(timeout=0.05)
+            except queue.Empty:
+                message = None
+                if any(worker.exitcode not in (None, 0) for worker in workers):
+                    raise RuntimeError("A hogwild worker process failed.")
+            # The coordinator owns the global step and the epsilon schedule.
+            step = int(counters.sum())
+            epsilon_view[0] = ((engine.epsilon_end - engine.epsilon_start) / num_steps) * step + engine.epsilon_start
+            progress.update(step - progress.n)
+            if message is None:
+                continue
+            kind, worker_id, payload = message[:3]
+            if kind == "frames":
+                size = len(payload["frame_idx"])
+                payload["frame_idx"] = np.arange(next_frame, next_frame + size, dtype=np.int64)
+                next_frame += size
+                logger._log_block(payload, message[3])
+            else:
+                results[worker_id] = payload
+                finished += 1
+        wall_time = perf_counter() - start
+        progress.update(num_steps - progress.n)
+        progress.close()
+        for worker in workers:
+            worker.join()
+        if logger: logger._flush_logger()
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        # Hand private copies back to the agents and free the shared blocks.
+        for agent, table in zip(env.agents, tables):
+            agent.q_table = table.to_dense()
+            table.unlink()
+        for block in (epsilon_block, counter_block):
+            block.close()
+            block.unlink()
+
+    staleness = np.concatenate([np.asarray(results[w]["staleness"], dtype=np.float64) for w in sorted(results)])
+    steps_per_second = num_steps / wall_time
+    summary = {
+        "who": "hogwild",
+        "regime_idx": regime_idx,
+        "steps": num_steps,
+        "n_workers": n_workers,
+        "wall_time": wall_time,
+        "steps_per_second": steps_per_second,
+        "serial_steps_per_second": serial_rate,
+        "speedup": steps_per_second / serial_rate if serial_rate else None,
+        "worker_steps_per_second": [results[w]["steps"] / results[w]["wall_time"] for w in sorted(results)],
+        "staleness_mean": float(staleness.mean()) if len(staleness) else None,
+        "staleness_p50": float(np.percentile(staleness, 50)) if len(staleness) else None,
+        "staleness_p95": float(np.percentile(staleness, 95)) if len(staleness) else None,
+        "staleness_max": float(staleness.max()) if len(staleness) else None,
+        "staleness_samples": len(staleness),
+    }
+    if logger:
+        logger._write_profile(summary)
+    return summary
+
+def _hogwild_entry(worker_id, env, num_steps, alpha, gamma, shared, messages, log_frames, block_size, sample_every, seed):
+    """Process entry point: attach the coordinator's shared counters and run the worker loop."""
+    blocks = []
+    for name, shape, dtype in shared:
+        block = shared_memory.SharedMemory(name=name)
+        blocks.append((block, shape, dtype))
+    try:
+        _worker(worker_id, env, num_steps, alpha, gamma, blocks, messages, log_frames, block_size, sample_every, seed)
+    finally:
+        for block, _, _ in blocks:
+            block.close()
@@ -0,0 +1,341 @@
+from marlax.envs.gridworld.gridworld import GridWorld_r0, GridWorld_r4
+from marlax.envs.gridworld.tables import REWARD_TARGETS, compile_tables
+from marlax.qtables import DenseQTable
+
+from functools import partial
+from itertools import product
+import numpy as np
+import pandas as pd
+
+try:
+    import jax
+    import jax.numpy as jnp
+    from jax import lax
+except ImportError:
+    jax = None
+
+# Candidate states and reward rules of each regime, see marlax.envs.gridworld.
+REGIMES = {
+    "r0": {"possibilities": [None], "center_reward": True, "stay_only": False},
+    "r1": {"possibilities": ["rl"], "center_reward": False, "stay_only": False},
+    "r2": {"possibilities": ["ud"], "center_reward": False, "stay_only": False},
+    "r3": {"possibilities": ["ur", "rd", "dl", "ul", "rl", "ud"], "center_reward": False, "stay_only": False},
+    "r4": {"possibilities": ["ur", "rd", "dl", "ul", "rl", "ud"], "center_reward": False, "stay_only": True},
+}
+
+def _require_jax():
+    if jax is None:
+        raise ImportError("The JAX backend needs jax, install it with `pip install jax`.")
+
+class JaxGridWorld:
+    def __init__(self, grid, n_agents, target_rewards, together_reward, travel_reward, regime = "r3", wrong_zone_penalty = -500):
+        """
+        Functional GridWorld on fixed-shape arrays, for use inside jit, scan and vmap.
+
+        The environment holds only constants; the trial state is a dict of arrays
+        passed in and out of `reset` and `step`. Positions are cells (x * height + y)
+        and reward targets are codes into REWARD_TARGETS, as in the NumPy tables.
+
+        Args:
+            grid (tuple): (width, height) of the grid.
+            n_agents (int): Number of agents.
+            target_rewards (list): Reward of each agent when the target is collected.
+            together_reward (float): Bonus reward if agents are at the same position.
+            travel_reward (float): Penalty (energy cost) for each move.
+            regime (str): One of "r0" .. "r4", matching GridWorld_r0 .. GridWorld_r4.
+            wrong_zone_penalty (float): Penalty for stepping on an inactive reward zone.
+        """
+        _require_jax()
+        self.grid = tuple(grid)
+        self.n_agents = n_agents
+        self.regime = regime
+        self.target_rewards = jnp.asarray(target_rewards, dtype=jnp.float32)
+        self.together_reward = together_reward
+        self.travel_reward = travel_reward
+        self.wrong_zone_penalty = wrong_zone_penalty
+        self.no_reward_threshold = 50
+
+        config = REGIMES[regime]
+        self.possibilities = config["possibilities"]
+        self.center_reward = config["center_reward"]
+        self.stay_only = config["stay_only"]
+        self.possibility_codes = jnp.array([REWARD_TARGETS.index(p) for p in self.possibilities])
+
+        tables = compile_tables(self.grid, n_agents)
+        self.n_cells = tables.n_cells
+        self.n_positions = self.n_cells ** n_agents
+        self.n_states = self.n_positions * len(REWARD_TARGETS)
+        self.strides = jnp.asarray(self.n_cells ** np.arange(n_agents - 1, -1, -1))
+        self.neighbors = jnp.asarray(tables.neighbors)
+        self.cell_coords = jnp.asarray(tables.cell_coords)
+        self.center_cell = tables.center_pos[0] * self.grid[1] + tables.center_pos[1]
+        self.reward_mask = jnp.asarray(tables.reward_mask.reshape(len(REWARD_TARGETS), -1))
+        self.wrong_mask = jnp.asarray(tables.wrong_mask.reshape(len(REWARD_TARGETS), -1))
+        # Joint moves in the order of GridWorld.poss_act_combinations.
+        self.combinations = jnp.array(list(product(range(len(tables.move_deltas)), repeat=n_agents)))
+        # Action taken to go from a cell to a neighbor, indexed by [dx + 1, dy + 1],
+        # like QValueAgent.action_map: a move into a wall reads as 'stay'.
+        action_of_delta = np.zeros((3, 3), dtype=np.int32)
+        for action, (dx, dy) in enumerate(tables.move_deltas.tolist()):
+            action_of_delta[dx + 1, dy + 1] = action
+        self.action_of_delta = jnp.asarray(action_of_delta)
+
+    @classmethod
+    def from_env(cls, env):
+        """Build the JAX twin of a GridWorld regime instance."""
+        regime = {GridWorld_r0: "r0", GridWorld_r4: "r4"}.get(type(env))
+        if regime is None:
+            regime = next(name for name, config in REGIMES.items()
+                          if config["possibilities"] == env.possibilities and not config["center_reward"] and not config["stay_only"])
+        return cls(env.grid, len(env.agents), env.target_rewards, env.together_reward,
+                   env.travel_reward, regime, env.wrong_zone_penalty)
+
+    def reset(self, key, state = None, mask = True):
+        """
+        Draw random agent cells and a new true reward target, and clear the active target.
+        With `state` given, only resets it where `mask` is True.
+        """
+        position_key, target_key = jax.random.split(key)
+        new_state = {
+            "cells": jax.random.randint(position_key, (self.n_agents,), 0, self.n_cells),
+            "active": jnp.array(0),
+            "true": jax.random.choice(target_key, self.possibility_codes),
+            "steps_without_reward": jnp.array(0),
+        }
+        if state is None:
+            return new_state
+        return {name: jnp.where(mask, new_state[name], state[name]) for name in state}
+
+    def state_id(self, cells, active):
+        """Flat state index in the StateIndexer layout over REWARD_TARGETS."""
+        return active * self.n_positions + cells @ self.strides
+
+    def possible_states(self, state):
+        """
+        Return the candidate next cells, shape (n_candidates, n_agents), and their state ids.
+        """
+        if self.stay_only:
+            next_cells = state["cells"][None]
+        else:
+            next_cells = self.neighbors[state["cells"][None], self.combinations]
+        return next_cells, self.state_id(next_cells, state["active"])
+
+    def step(self, state, actions, key):
+        """
+        Execute one time step with the same ordering as GridWorld.step.
+
+        Returns:
+            state (dict): State after the step, reset if the trial terminated.
+            frame (dict): The frame the Tracer would log: cells and active target
+                before the reset, rewards and trial events.
+        """
+        # 1. Move agents.
+        cells = self.neighbors[state["cells"], actions]
+        active = state["active"]
+
+        # 2. Activate the true target if none is active and an agent is at the center.
+        at_center = (cells == self.center_cell).any()
+        activated = (active == 0) & at_center
+        active = jnp.where(activated, state["true"], active)
+
+        # 3. Collect: all agents on one cell of the active target, or anyone at the center in r0.
+        together = (cells == cells[0]).all()
+        if self.center_reward:
+            collected = at_center
+        else:
+            collected = self.reward_mask[active, cells[0]] & together
+        reached_wrong_zone = self.wrong_mask[active, cells].any()
+
+        # 4. Together bonus, travel penalty and wrong-zone penalty.
+        rewards = (self.target_rewards * collected + self.together_reward * together
+                   + self.travel_reward + self.wrong_zone_penalty * reached_wrong_zone)
+
+        terminated = collected | (state["steps_without_reward"] > self.no_reward_threshold) | reached_wrong_zone
+        steps_without_reward = state["steps_without_reward"] + (~terminated)
+
+        frame = {
+            "cells": cells,
+            "reward_loc": active,
+            "activated": activated,
+            "collected": collected,
+            "terminated": terminated,
+            "steps_without_reward": steps_without_reward,
+            "rewards": rewards,
+        }
+        # Reset should happen very last
+        state = {"cells": cells, "active": active, "true": state["true"],
+                 "steps_without_reward": jnp.where(terminated, 0, steps_without_reward)}
+        return self.reset(key, state, terminated), frame
+
+class JaxQValueAgent:
+    """Update rule of QValueAgent: one value per global state, acting towards the best next state."""
+    n_actions = None
+
+    @staticmethod
+    def init_table(env, dtype):
+        return jnp.zeros(env.n_states, dtype=dtype)
+
+    @staticmethod
+    def state_values(table, state_ids):
+        return table[state_ids]
+
+    @staticmethod
+    def greedy_action(env, table, state, next_cells, state_ids, agent_id):
+        best = jnp.argmax(table[state_ids])
+        delta = env.cell_coords[next_cells[best, agent_id]] - env.cell_coords[state["cells"][agent_id]]
+        return env.action_of_delta[delta[0] + 1, delta[1] + 1]
+
+    @staticmethod
+    def update(table, state_id, action, reward, next_value, alpha, gamma):
+        return table.at[state_id].set((1 - alpha) * table[state_id] + alpha * (reward + gamma * next_value))
+
+class JaxQAgent:
+    """Update rule of QAgent: action values per global state, max taken over candidates and actions."""
+    n_actions = 5
+
+    @staticmethod
+    def init_table(env, dtype):
+        return jnp.zeros((env.n_states, JaxQAgent.n_actions), dtype=dtype)
+
+    @staticmethod
+    def state_values(table, state_ids):
+        return table[state_ids].max(axis=1)
+
+    @staticmethod
+    def greedy_action(env, table, state, next_cells, state_ids, agent_id):
+        # First best (candidate, action) pair, like the loops of QAgent.
+        return jnp.argmax(table[state_ids]) % JaxQAgent.n_actions
+
+    @staticmethod
+    def update(table, state_id, action, reward, next_value, alpha, gamma):
+        return table.at[state_id, action].add(alpha * (reward + gamma * next_value - table[state_id, action]))
+
+AGENTS = {"QValueAgent": JaxQValueAgent, "QAgent": JaxQAgent}
+
+def init_carry(env, agent, key, dtype = None):
+    """Return the initial training carry: fresh Q-tables, visited masks and a reset environment."""
+    _require_jax()
+    agent = AGENTS.get(agent, agent)
+    dtype = dtype or jnp.zeros(()).dtype
+    reset_key, key = jax.random.split(key)
+    return {
+        "tables": jnp.stack([agent.init_table(env, dtype) for _ in range(env.n_agents)]),
+        "visited": jnp.zeros((env.n_agents, env.n_states), dtype=bool),
+        "env": env.reset(reset_key),
+        "key": key,
+    }
+
+@partial(jax.jit if jax else (lambda f, **kwargs: f), static_argnames=("env", "agent", "num_steps", "log_frames"))
+def train(env, agent, carry, num_steps, epsilon_start, epsilon_end, alpha = 0.1, gamma = 0.9, log_frames = True):
+    """
+    Jitted equivalent of Engine.train for one seed, run as a single lax.scan.
+
+    Every step follows Engine.train: each agent picks an epsilon-greedy action from
+    the candidate next states (epsilon decays linearly from epsilon_start to
+    epsilon_end), the environment steps, and each agent updates towards its best
+    candidate of the following step. Random numbers come from JAX, so runs are
+    comparable to the Python engine in distribution, not draw by draw.
+
+    Args:
+        env (JaxGridWorld): Environment constants.
+        agent (str): "QValueAgent" or "QAgent".
+        carry (dict): Training state from `init_carry` or a previous call, so a
+            long run can be split over several calls.
+        num_steps (int): Number of steps of the epsilon schedule.
+        epsilon_start (float): Initial exploration rate.
+        epsilon_end (float): Final exploration rate.
+        alpha (float): Learning rate.
+        gamma (float): Discount factor.
+        log_frames (bool): Return per-step frames; turn off for very long runs.
+
+    Returns:
+        carry (dict): Training state after the run.
+        frames (dict): Arrays of length num_steps, see `frames_to_columns`. None if not logged.
+    """
+    agent = AGENTS.get(agent, agent)
+    agent_ids = jnp.arange(env.n_agents)
+    next_cells, state_ids = env.possible_states(carry["env"])
+
+    def body(loop, step):
+        carry, next_cells, state_ids = loop
+        key, explore_key, action_key, reset_key = jax.random.split(carry["key"], 4)
+        epsilon = ((epsilon_end - epsilon_start) / num_steps) * step + epsilon_start
+
+        # Each agent chooses an action based on the next possible states.
+        greedy = jax.vmap(lambda table, i: agent.greedy_action(env, table, carry["env"], next_cells, state_ids, i))(carry["tables"], agent_ids)
+        explore = jax.random.uniform(explore_key, (env.n_agents,)) < epsilon
+        actions = jnp.where(explore, jax.random.randint(action_key, (env.n_agents,), 0, 5), greedy)
+
+        # Environment processes the actions.
+        env_state, frame = env.step(carry["env"], actions, reset_key)
+        state_id = env.state_id(frame["cells"], frame["reward_loc"])
+
+        # Each agent updates towards the best of the following candidates.
+        new_next_cells, new_state_ids = env.possible_states(env_state)
+        def update(table, visited, action, reward):
+            values = agent.state_values(table, new_state_ids)
+            best = jnp.argmax(values)
+            table = agent.update(table, state_id, action, reward, values[best], alpha, gamma)
+            return table, visited.at[state_id].set(True).at[new_state_ids[best]].set(True)
+        tables, visited = jax.vmap(update)(carry["tables"], carry["visited"], actions, frame["rewards"].astype(carry["tables"].dtype))
+
+        carry = {"tables": tables, "visited": visited, "env": env_state, "key": key}
+        return (carry, new_next_cells, new_state_ids), (frame if log_frames else None)
+
+    (carry, _, _), frames = lax.scan(body, (carry, next_cells, state_ids), jnp.arange(num_steps))
+    return carry, frames
+
+def train_seeds(env, agent, seeds, num_steps, epsilon_start, epsilon_end, alpha = 0.1, gamma = 0.9, log_frames = True, dtype = None):
+    """
+    Train one independent set of agents per seed in a single compiled program with vmap.
+
+    Returns:
+        carry (dict): Training states with a leading seed axis.
+        frames (dict): Frames with shape (n_seeds, num_steps, ...), or None.
+    """
+    _require_jax()
+    keys = jax.vmap(jax.random.PRNGKey)(jnp.asarray(seeds))
+    carry = jax.vmap(lambda key: init_carry(env, agent, key, dtype))(keys)
+    run = jax.vmap(lambda c: train(env, agent, c, num_steps, epsilon_start, epsilon_end, alpha, gamma, log_frames))
+    return run(carry)
+
+def frames_to_columns(env, frames, start_step = 0):
+    """
+    Convert the frames of one seed to the columns the Tracer writes.
+
+    Returns:
+        columns (dict): frame_idx, reward_loc (strings, None when inactive), activated,
+            collected, terminated, steps_without_reward, a{i}x, a{i}y and r{i}.
+    """
+    cells = np.asarray(frames["cells"])
+    n_frames = len(cells)
+    xs, ys = np.divmod(cells, env.grid[1])
+    columns = {
+        "frame_idx": np.arange(start_step, start_step + n_frames, dtype=np.int64),
+        "reward_loc": np.array(REWARD_TARGETS, dtype=object)[np.asarray(frames["reward_loc"])],
+        "activated": np.asarray(frames["activated"]),
+        "collected": np.asarray(frames["collected"]),
+        "terminated": np.asarray(frames["terminated"]),
+        "steps_without_reward": np.asarray(frames["steps_without_reward"], dtype=np.int64),
+    }
+    for i in range(env.n_agents):
+        columns[f"a{i+1}x"] = xs[:, i].astype(np.int64)
+        columns[f"a{i+1}y"] = ys[:, i].astype(np.int64)
+    rewards = np.asarray(frames["rewards"])
+    for i in range(env.n_agents):
+        columns[f"r{i+1}"] = rewards[:, i]
+    return columns
+
+def frames_to_dataframe(env, frames, regime_idx = 0, start_step = 0):
+    """Return the frames of one seed as a DataFrame laid out like the Tracer's Parquet logs."""
+    columns = frames_to_columns(env, frames, start_step)
+    return pd.DataFrame({"regime_idx": np.full(len(columns["frame_idx"]), regime_idx, dtype=np.int64), **columns})
+
+def to_dense_qtable(env, carry, agent_id = 0):
+    """Copy one agent's table of a single-seed carry into a DenseQTable, e.g. to call to_dict."""
+    values = np.asarray(carry["tables"][agent_id])
+    table = DenseQTable(env.grid, env.n_agents, REWARD_TARGETS,
+                        n_actions=None if values.ndim == 1 else values.shape[1], dtype=values.dtype)
+    table.values[:] = values
+    table.visited[:] = np.asarray(carry["visited"][agent_id])
+    return table
@@ -0,0 +1,177 @@
+from marlax.agents import QAgent, QValueAgent
+from marlax.checkpoints import QTableView
+from marlax.envs.gridworld.gridworld import GridWorld_r4
+from marlax.envs.gridworld.tables import MOVES, REWARD_TARGETS
+from marlax.qtables import DenseQTable, StateIndexer
+
+import json
+import os
+import random
+import numpy as np
+
+FORMAT_VERSION = 1
+MOVE_NAMES = tuple(MOVES)
+
+class GreedyPolicy:
+    def __init__(self, table, indexer):
+        """
+        Greedy joint policy of frozen tabular agents, as one lookup table.
+
+        Row s of the table holds, for every agent, the code (into MOVE_NAMES) of
+        the action its `choose` returns in state s at epsilon 0. A test step is
+        then one state encoding and one row lookup instead of a search over the
+        candidate states for each agent.
+
+        Args:
+            table (np.ndarray): uint8 array of shape (indexer.n_states, n_agents).
+            indexer (StateIndexer): Layout of the states of the table.
+        """
+        self.table = table
+        self.indexer = indexer
+        self.rows = None
+
+    def _action_rows(self):
+        """Action names of every state as tuples, built on first use."""
+        if self.rows is None:
+            self.rows = [tuple(MOVE_NAMES[code] for code in row) for row in np.asarray(self.table).tolist()]
+        return self.rows
+
+    def choose(self, env, epsilon = 0.0):
+        """
+        Return the actions of all agents in the current state of `env`.
+
+        Each agent draws from its exploration stream exactly like its `choose`, so
+        runs with the compiled policy and with the agents give the same frames.
+        """
+        greedy = self._action_rows()[self.indexer.encode(env.get_state())]
+        actions = []
+        for agent, action in zip(env.agents, greedy):
+            rng = agent.rng or random
+            actions.append(rng.choice(agent.actions) if rng.random() < epsilon else action)
+        return actions
+
+    def save(self, path):
+        """
+        Save the policy as a directory that `load_policy` can memory-map:
+            policy.npy - the uint8 action table.
+            meta.json  - grid size, number of agents, targets and action names.
+        """
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "policy.npy"), np.asarray(self.table))
+        meta = {
+            "format_version": FORMAT_VERSION,
+            "grid": list(self.indexer.grid),
+            "n_agents": self.indexer.n_agents,
+            "targets": list(self.indexer.targets),
+            "actions": list(MOVE_NAMES),
+        }
+        # The header is written last, so a directory with meta.json is complete.
+        with open(os.path.join(path, "meta.json"), "w") as file:
+            json.dump(meta, file)
+
+def load_policy(path, mmap_mode = None):
+    """Open a policy written by `GreedyPolicy.save`."""
+    with open(os.path.join(path, "meta.json")) as file:
+        meta = json.load(file)
+    if meta["format_version"] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported policy format version {meta['format_version']} in {path}.")
+    table = np.load(os.path.join(path, "policy.npy"), mmap_mode=mmap_mode)
+    return GreedyPolicy(table, StateIndexer(tuple(meta["grid"]), meta["n_agents"], tuple(meta["targets"])))
+
+def _dense_values(agent, grid, n_agents):
+    """Return the agent's Q-table as a DenseQTable, converting dict tables and saved views."""
+    q_table = agent.q_table
+    if isinstance(q_table, DenseQTable):
+        return q_table
+    if isinstance(q_table, QTableView):
+        return q_table.to_dense()
+    # Unseen states keep the zeros that the dict agents default to.
+    return DenseQTable.from_dict(q_table, grid, n_agents, REWARD_TARGETS,
+                                 actions=agent.actions if isinstance(agent, QAgent) else None)
+
+def _unique_moves(tables):
+    """
+    Distinct next cells of every cell in first-move order, padded with -1, and the
+    code of the move reaching each of them. Shapes (n_cells, n_moves).
+    """
+    n_cells, n_moves = tables.neighbors.shape
+    cells = np.full((n_cells, n_moves), -1, dtype=np.int64)
+    moves = np.zeros((n_cells, n_moves), dtype=np.uint8)
+    for cell, row in enumerate(tables.neighbors.tolist()):
+        for slot, neighbor in enumerate(dict.fromkeys(row)):
+            cells[cell, slot] = neighbor
+            moves[cell, slot] = row.index(neighbor)
+    return cells, moves
+
+def compile_policy(env, chunk_size = 4096):
+    """
+    Precompute the greedy action of every agent in every state of `env`.
+
+    For each joint position and reward target the candidates are the ones of
+    GridWorld.get_possible_states, searched in the same order with the same
+    first-best tie rule, so the table reproduces `choose` at epsilon 0 for
+    QValueAgent (move towards the best next state) and QAgent (best action of
+    the best next state). States are processed in chunks of joint positions.
+
+    Args:
+        env: GridWorld whose agents hold the frozen Q-tables.
+        chunk_size (int): Joint positions evaluated per vectorized step.
+
+    Returns:
+        policy (GreedyPolicy): Table over the targets of `env`, see StateIndexer.for_env.
+    """
+    grid, n_agents = tuple(env.grid), len(env.agents)
+    indexer = StateIndexer.for_env(env)
+    tables = env.tables
+    if isinstance(env, GridWorld_r4):
+        # Regime 4 offers only the current state as candidate.
+        unique_cells = np.arange(tables.n_cells)[:, None]
+        unique_moves = np.zeros((tables.n_cells, 1), dtype=np.uint8)
+    else:
+        unique_cells, unique_moves = _unique_moves(tables)
+    n_moves = unique_cells.shape[1]
+    n_cells, n_positions = indexer.n_cells, indexer.n_positions
+
+    # Per agent: value of every state and the best action code within it, over all targets.
+    agent_values, agent_moves = [], []
+    for agent in env.agents:
+        if not isinstance(agent, (QAgent, QValueAgent)):
+            raise TypeError(f"Cannot compile a greedy policy for {agent.__class__.__name__}.")
+        dense = _dense_values(agent, grid, n_agents)
+        codes = np.array([dense.indexer.target_codes.get(target, -1) for target in indexer.targets])
+        values = dense.values.reshape(len(dense.indexer.targets), dense.indexer.n_positions, *dense.values.shape[1:])
+        values = np.where((codes >= 0).reshape((-1,) + (1,) * (values.ndim - 1)), values[np.maximum(codes, 0)], 0)
+        values = values.reshape(len(indexer.targets) * n_positions, *values.shape[2:])
+        if isinstance(agent, QAgent):
+            move_codes = np.array([MOVE_NAMES.index(action) for action in agent.actions], dtype=np.uint8)
+            agent_moves.append(move_codes[np.argmax(values, axis=1)])
+            values = values.max(axis=1)
+        else:
+            agent_moves.append(None)
+        agent_values.append(values)
+
+    table = np.zeros((indexer.n_states, n_agents), dtype=np.uint8)
+    for start in range(0, n_positions, chunk_size):
+        positions = np.arange(start, min(start + chunk_size, n_positions))
+        # Cells of every agent, agent 1 being the most significant digit.
+        cells = (positions[:, None] // indexer.strides) % n_cells
+        candidates = np.zeros((len(positions), 1), dtype=np.int64)
+        valid = np.ones((len(positions), 1), dtype=bool)
+        for i in range(n_agents):
+            # Product order of CandidateStates: the last agent varies fastest.
+            neighbors = unique_cells[cells[:, i]]
+            candidates = (candidates[:, :, None] * n_cells + neighbors[:, None, :]).reshape(len(positions), -1)
+            valid = (valid[:, :, None] & (neighbors[:, None, :] >= 0)).reshape(len(positions), -1)
+        for code in range(len(indexer.targets)):
+            state_ids = code * n_positions + candidates
+            rows = code * n_positions + positions
+            for i, values in enumerate(agent_values):
+                scores = np.where(valid, values[np.where(valid, state_ids, 0)], -np.inf)
+                best = np.argmax(scores, axis=1)
+                if agent_moves[i] is not None:
+                    table[rows, i] = agent_moves[i][state_ids[np.arange(len(positions)), best]]
+                else:
+                    # Digit i of the best candidate is the slot of agent i's next cell.
+                    slot = (best // n_moves ** (n_agents - 1 - i)) % n_moves
+                    table[rows, i] = unique_moves[cells[:, i], slot]
+    return GreedyPolicy(table, indexer)
@@ -0,0 +1,95 @@
+from time import perf_counter
+
+# Phases of one step, in loop order, for Engine.train and Engine.test.
+TRAIN_PHASES = ("choose", "step", "possible_states", "update", "log")
+TEST_PHASES = ("possible_states", "choose", "step", "log")
+
+class Profiler:
+    def __init__(self, sample_every = 1000, table_every = 100_000, report_every = 10):
+        """
+        Sampled per-phase timing for Engine.train and Engine.test.
+
+        Only every `sample_every`-th step is timed, so the clock is read a handful of
+        times per thousand steps; the cumulative time of each phase is estimated
+        from the sampled steps. Without a profiler the engine skips all of this.
+
+        Args:
+            sample_every (int): Time one step out of this many.
+            table_every (int): Record the Q-table sizes about every this many steps.
+            report_every (int): Update the tqdm bar every this many samples.
+        """
+        self.sample_every = sample_every
+        self.table_every = table_every
+        self.report_every = report_every
+        self.records = []
+
+    def start(self, who, regime_idx, phases, start_step = 0):
+        """Reset the counters at the beginning of a run."""
+        self.who = who
+        self.regime_idx = regime_idx
+        self.phases = phases
+        self.start_step = start_step
+        self.phase_time = [0.0] * len(phases)
+        self.n_samples = 0
+        self.qtable_sizes = []
+        self.last_table_step = None
+        self.start_time = perf_counter()
+
+    def record(self, step, marks, env, progress = None):
+        """
+        Add one timed step.
+
+        Args:
+            step (int): Step index.
+            marks (tuple): perf_counter() readings at the phase boundaries, one more than phases.
+            env: Environment of the run, for the Q-table sizes of its agents.
+            progress (tqdm): Bar to show the phase shares on.
+        """
+        phase_time = self.phase_time
+        for i in range(len(phase_time)):
+            phase_time[i] += marks[i + 1] - marks[i]
+        self.n_samples += 1
+
+        if self.last_table_step is None or step - self.last_table_step >= self.table_every:
+            self.last_table_step = step
+            self.qtable_sizes.append((step, [len(agent.q_table) for agent in env.agents if hasattr(agent, "q_table")]))
+
+        if progress is not None and self.n_samples % self.report_every == 0:
+            total = sum(phase_time) or 1.0
+            progress.set_postfix({phase: f"{time / total:.0%}" for phase, time in zip(self.phases, phase_time)}, refresh=False)
+
+    def stop(self, step, logger = None):
+        """
+        Finish the run and build its summary record. The Tracer, if any, writes it to
+        profiles/{who}_{regime_idx}.json next to the logs.
+
+        Args:
+            step (int): Number of steps the run reached.
+            logger (Tracer): Tracer of the run, for the flush latencies.
+
+        Returns:
+            summary (dict): Timings of the run.
+        """
+        wall_time = perf_counter() - self.start_time
+        steps = step - self.start_step
+        # Estimated cumulative time per phase: mean sampled time times the number of steps.
+        phase_time = {phase: (time / self.n_samples) * steps if self.n_samples else 0.0
+                      for phase, time in zip(self.phases, self.phase_time)}
+        flush_latencies = list(getattr(logger, "flush_latencies", []))
+        summary = {
+            "who": self.who,
+            "regime_idx": self.regime_idx,
+            "steps": steps,
+            "wall_time": wall_time,
+            "steps_per_second": steps / wall_time if wall_time > 0 else None,
+            "sample_every": self.sample_every,
+            "n_samples": self.n_samples,
+            "phase_time": phase_time,
+            "qtable_sizes": self.qtable_sizes,
+            "flush_latencies": flush_latencies,
+            "flush_latency_max": max(flush_latencies, default=None),
+        }
+        self.records.append(summary)
+        if logger:
+            logger._write_profile(summary)
+        return summary
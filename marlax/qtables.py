@@ -0,0 +1,246 @@
+from marlax.envs.gridworld.tables import REWARD_TARGETS
+
+import numpy as np
+from collections import defaultdict
+from functools import partial
+from multiprocessing import shared_memory
+
+class StateIndexer:
+    def __init__(self, grid, n_agents, targets = REWARD_TARGETS):
+        """
+        Map GridWorld state keys ((pos1, pos2, ...), target) to flat integers.
+
+        The index is laid out as [target, agent 1 cell, agent 2 cell, ...] in
+        row-major order, where a cell is x * height + y.
+
+        Args:
+            grid (tuple): (width, height) of the grid.
+            n_agents (int): Number of agents in the state.
+            targets (tuple): Reward targets the index covers, with None for "no active target".
+        """
+        self.grid = tuple(grid)
+        self.n_agents = n_agents
+        self.targets = tuple(targets)
+        self.target_codes = {target: code for code, target in enumerate(self.targets)}
+        self.n_cells = grid[0] * grid[1]
+        self.n_positions = self.n_cells ** n_agents
+        self.n_states = self.n_positions * len(self.targets)
+        # Multiplier of each agent's cell, the first agent being the most significant.
+        self.strides = self.n_cells ** np.arange(n_agents - 1, -1, -1)
+
+    @classmethod
+    def for_env(cls, env):
+        """Build an indexer covering only the reward targets the environment can produce."""
+        targets = [None] + [p for p in env.possibilities if p is not None]
+        return cls(env.grid, len(env.agents), tuple(dict.fromkeys(targets)))
+
+    def encode(self, state_key):
+        """Return the flat index of a single state key."""
+        positions, target = state_key
+        index = self.target_codes[target]
+        height = self.grid[1]
+        for x, y in positions:
+            index = index * self.n_cells + x * height + y
+        return index
+
+    def encode_many(self, state_keys):
+        """Return the flat indices of a sequence of state keys as an integer array."""
+        return np.fromiter((self.encode(state_key) for state_key in state_keys), dtype=np.int64)
+
+    def encode_arrays(self, positions, target_codes):
+        """
+        Vectorized encoding of batched states.
+
+        Args:
+            positions (np.ndarray): Agent positions of shape (..., n_agents, 2).
+            target_codes (np.ndarray): Codes into `self.targets`, broadcastable to positions.shape[:-2].
+
+        Returns:
+            indices (np.ndarray): Flat indices of shape positions.shape[:-2].
+        """
+        cells = positions[..., 0] * self.grid[1] + positions[..., 1]
+        return np.asarray(target_codes) * self.n_positions + cells @ self.strides
+
+    def decode(self, index):
+        """Return the state key stored at a flat index."""
+        index = int(index)
+        cells = []
+        for _ in range(self.n_agents):
+            index, cell = divmod(index, self.n_cells)
+            cells.append(divmod(cell, self.grid[1]))
+        return (tuple(reversed(cells)), self.targets[index])
+
+class DenseQTable:
+    def __init__(self, grid, n_agents, targets = REWARD_TARGETS, n_actions = None, dtype = np.float64):
+        """
+        Array-backed replacement for the dict Q-tables of the tabular agents.
+
+        Values are stored in a NumPy array indexed by `StateIndexer`. With
+        `n_actions=None` it holds one value per state (QValueAgent); otherwise
+        one row of action values per state (QAgent).
+
+        Args:
+            grid (tuple): (width, height) of the grid.
+            n_agents (int): Number of agents in the state.
+            targets (tuple): Reward targets the table covers.
+            n_actions (int): Number of actions per state, or None for state values.
+            dtype: NumPy dtype of the values.
+        """
+        self.indexer = StateIndexer(grid, n_agents, targets)
+        shape = (self.indexer.n_states,) if n_actions is None else (self.indexer.n_states, n_actions)
+        self.values = np.zeros(shape, dtype=dtype)
+        # States an update wrote or bootstrapped from. The dict agents also insert
+        # every candidate they score; those are not marked here, so conversions and
+        # len() cover fewer keys than the dict table of the same run.
+        self.visited = np.zeros(self.indexer.n_states, dtype=bool)
+
+    def __getitem__(self, state_key):
+        return self.values[self.indexer.encode(state_key)]
+
+    def __setitem__(self, state_key, value):
+        index = self.indexer.encode(state_key)
+        self.values[index] = value
+        self.visited[index] = True
+
+    def __contains__(self, state_key):
+        return bool(self.visited[self.indexer.encode(state_key)])
+
+    def __len__(self):
+        return int(np.count_nonzero(self.visited))
+
+    def keys(self):
+        return [self.indexer.decode(index) for index in np.flatnonzero(self.visited)]
+
+    def argmax(self, possible_states):
+        """
+        Return the position in `possible_states` of the highest valued state.
+        Ties resolve to the first state, like np.argmax over the dict values.
+        For action-valued tables the maximum is taken over states and actions.
+        """
+        values = self.values[self._state_ids(possible_states)]
+        if values.ndim == 1:
+            return int(np.argmax(values))
+        return int(np.argmax(values.max(axis=1)))
+
+    def argmax_action(self, possible_states):
+        """
+        Return (state position, action index) of the highest action value over
+        all candidate states, found with a single argmax over the gathered rows.
+        Ties resolve to the first state and then the first action, matching the
+        loops of the dict-based QAgent.
+        """
+        values = self.values[self._state_ids(possible_states)]
+        return divmod(int(np.argmax(values)), values.shape[1])
+
+    def _state_ids(self, possible_states):
+        """Flat indices of candidate states, taken packed from a CandidateStates when possible."""
+        if hasattr(possible_states, "state_ids"):
+            return possible_states.state_ids(self.indexer)
+        return self.indexer.encode_many(possible_states)
+    
+    def update_batch(self, state_ids, action_ids, rewards, next_state_ids, alpha = 0.1, gamma = 0.99):
+        """
+        Apply Q-learning updates for a batch of transitions given as flat indices.
+
+        All TD targets are computed from the values before the batch, and updates
+        hitting the same (state, action) entry are summed.
+        """
+        best_next_values = self.values[next_state_ids].max(axis=1)
+        td_errors = rewards + gamma * best_next_values - self.values[state_ids, action_ids]
+        np.add.at(self.values, (state_ids, action_ids), alpha * td_errors)
+        self.visited[state_ids] = True
+        self.visited[next_state_ids] = True
+        return td_errors
+
+    def to_dict(self, actions = None):
+        """
+        Convert to the dict layout of the tabular agents.
+
+        Only visited states become keys. The zero-valued candidates a dict agent
+        inserts while scoring are left out, so the result has fewer keys than the
+        dict table of the same run.
+
+        Args:
+            actions (list): Action names for action-valued tables. When given, returns
+                {state: {action: value}} as used by QAgent; otherwise returns the
+                defaultdict {state: value} used by QValueAgent.
+        """
+        indices = np.flatnonzero(self.visited)
+        if actions is None:
+            q_table = defaultdict(partial(int, 0))
+            for index in indices:
+                q_table[self.indexer.decode(index)] = self.values[index].item()
+            return q_table
+        return {
+            self.indexer.decode(index): dict(zip(actions, self.values[index].tolist()))
+            for index in indices
+        }
+
+    @classmethod
+    def from_dict(cls, q_table, grid, n_agents, targets = REWARD_TARGETS, actions = None):
+        """Build a dense table from a dict Q-table produced by QValueAgent or QAgent."""
+        table = cls(grid, n_agents, targets, n_actions=None if actions is None else len(actions))
+        for state_key, value in q_table.items():
+            table[state_key] = value if actions is None else [value[a] for a in actions]
+        return table
+
+class SharedQTable(DenseQTable):
+    def __init__(self, table):
+        """
+        DenseQTable whose values and visited flags live in shared memory.
+
+        Pickling sends only the names of the shared blocks, so a table passed to a
+        worker process is attached there, not copied: every process reads and
+        writes the same arrays, without locks. The creating process owns the
+        blocks and frees them with `unlink`.
+
+        Args:
+            table (DenseQTable): Table whose layout and current values are copied in.
+        """
+        self.indexer = table.indexer
+        self.owner = True
+        self.blocks = []
+        self.values = self._share(table.values)
+        self.visited = self._share(table.visited)
+
+    def _share(self, array):
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        self.blocks.append(block)
+        shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+        shared[...] = array
+        return shared
+
+    def __getstate__(self):
+        return {"indexer": self.indexer,
+                "arrays": [(block.name, array.shape, array.dtype.str)
+                           for block, array in zip(self.blocks, (self.values, self.visited))]}
+
+    def __setstate__(self, state):
+        self.indexer = state["indexer"]
+        self.owner = False
+        self.blocks = []
+        arrays = []
+        for name, shape, dtype in state["arrays"]:
+            # Worker processes share the creator's resource tracker, which frees
+            # the block if the creator dies without calling unlink.
+            block = shared_memory.SharedMemory(name=name)
+            self.blocks.append(block)
+            arrays.append(np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf))
+        self.values, self.visited = arrays
+
+    def to_dense(self):
+        """Copy the shared arrays into a private DenseQTable."""
+        table = DenseQTable.__new__(DenseQTable)
+        table.indexer = self.indexer
+        table.values = self.values.copy()
+        table.visited = self.visited.copy()
+        return table
+
+    def unlink(self):
+        """Detach, and free the shared blocks if this process created them."""
+        self.values = self.visited = None
+        for block in self.blocks:
+            block.close()
+            if self.owner:
+                block.unlink()
+        self.blocks = []
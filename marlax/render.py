@@ -0,0 +1,340 @@
+from marlax.analysis import agent_columns, read_log
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import os
+import numpy as np
+
+try:
+    from PIL import GifImagePlugin, Image, ImageDraw, ImageFont
+except ImportError:
+    Image = None
+
+# Look of utils.animate_simulation_by_df: a 6x6 inch figure at 80 dpi with the
+# default subplot box, matplotlib's default colors and the same patch sizes.
+FIGURE_SIZE = 480
+AXES_BOX = (0.125, 0.11, 0.9, 0.88)  # left, bottom, right, top as figure fractions
+AGENT_COLORS = ["lightblue", "coral", "green", "orange", "purple", "pink", "cyan"]
+COLORS = {
+    "lightblue": (173, 216, 230), "coral": (255, 127, 80), "green": (0, 128, 0),
+    "orange": (255, 165, 0), "purple": (128, 0, 128), "pink": (255, 192, 203),
+    "cyan": (0, 255, 255), "gray": (128, 128, 128), "marker_green": (0, 128, 0),
+    "marker_yellow": (191, 191, 0), "xkcd_green": (21, 176, 26), "white": (255, 255, 255),
+}
+MARKER_SIZE = 16 * 80 / 72  # markersize 16 points in pixels at 80 dpi
+SUPERSAMPLE = 4
+META_FIELDS = ("steps_without_reward", "activated", "collected", "terminated", "reward")
+
+def _require_pillow():
+    if Image is None:
+        raise ImportError("The raster renderer needs Pillow, install it with `pip install pillow`.")
+
+def _ellipse_points(cx, cy, width, height, angle, n = 48):
+    """Polygon of a rotated ellipse, in the same units as its center."""
+    t = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    x, y = width / 2 * np.cos(t), height / 2 * np.sin(t)
+    a = np.radians(angle)
+    return np.stack([cx + x * np.cos(a) - y * np.sin(a), cy + x * np.sin(a) + y * np.cos(a)], axis=1)
+
+def _rotate_point(x, y, center_x, center_y, angle):
+    angle_rad = np.radians(angle)
+    x, y = x - center_x, y - center_y
+    return (x * np.cos(angle_rad) - y * np.sin(angle_rad) + center_x,
+            x * np.sin(angle_rad) + y * np.cos(angle_rad) + center_y)
+
+class FrameRenderer:
+    def __init__(self, grid_size = 11, n_agents = 2, size = FIGURE_SIZE):
+        """
+        Draw GridWorld frames into RGB arrays from precomputed images.
+
+        Everything that does not depend on the agents (grid, reward markers, center
+        marker, background color) is drawn once per (reward_loc, collected) pair and
+        cached; agents are pasted as pre-rendered anti-aliased sprites and the
+        metadata lines as cached text images. A frame is then a copy and a few
+        alpha blends of small arrays.
+
+        Args:
+            grid_size (int): The size of the board.
+            n_agents (int): Number of agents in the frames.
+            size (int): Width and height of the images in pixels.
+        """
+        _require_pillow()
+        self.grid_size = grid_size
+        self.n_agents = n_agents
+        self.size = size
+        scale = size / FIGURE_SIZE
+        left, bottom, right, top = AXES_BOX
+        self.box = (left * size, (1 - top) * size, right * size, (1 - bottom) * size)
+        self.cell_w = (self.box[2] - self.box[0]) / grid_size
+        self.cell_h = (self.box[3] - self.box[1]) / grid_size
+        self.marker_size = MARKER_SIZE * scale
+        self.font = ImageFont.load_default(size=max(int(round(10 * 80 / 72 * scale)), 6))
+        self.line_height = int(round(10 * 80 / 72 * scale * 1.2))
+        self.sprites = [self._agent_sprite(i) for i in range(n_agents)]
+        self.boards = {}
+        self.text_cache = {}
+
+    def to_pixel(self, x, y):
+        """Pixel coordinates of a board coordinate, y growing upwards like the matplotlib axes."""
+        return (self.box[0] + (x + 0.5) * self.cell_w, self.box[1] + (self.grid_size - 0.5 - y) * self.cell_h)
+
+    def _agent_sprite(self, i):
+        """RGBA sprite of a mouse centered on its cell, drawn at 4x and downsampled."""
+        color = COLORS[AGENT_COLORS[i % len(AGENT_COLORS)]]
+        angle = 45 if i % 2 == 0 else -45
+        w, h = int(np.ceil(self.cell_w)) * 2, int(np.ceil(self.cell_h)) * 2
+        ss = SUPERSAMPLE
+        # Sprite pixel of a data offset (dx, dy) from the agent.
+        def px(points):
+            points = np.asarray(points)
+            return [((w / 2 + dx * self.cell_w) * ss, (h / 2 - dy * self.cell_h) * ss) for dx, dy in points]
+        # Shapes are drawn in an axes with y up, so angles keep their sign in data space.
+        ear1 = _rotate_point(0.1, 0.1, 0, 0, angle)
+        ear2 = _rotate_point(-0.1, 0.1, 0, 0, angle)
+        tail = _rotate_point(0, -0.25, 0, 0, angle)
+        shapes = [
+            _ellipse_points(0, 0, 0.15, 0.4, angle),
+            _ellipse_points(ear1[0], ear1[1], 0.16, 0.16, 0),
+            _ellipse_points(ear2[0], ear2[1], 0.16, 0.16, 0),
+            _ellipse_points(tail[0], tail[1], 0.03, 0.25, angle),
+        ]
+        # Each patch has alpha 0.75 on its own, so overlaps are darker, as in matplotlib.
+        alpha = np.zeros((h * ss, w * ss))
+        for shape in shapes:
+            mask = Image.new("L", (w * ss, h * ss), 0)
+            ImageDraw.Draw(mask).polygon(px(shape), fill=255)
+            layer = np.asarray(mask, dtype=np.float64) / 255 * 0.75
+            alpha = alpha + layer * (1 - alpha)
+        alpha = alpha.reshape(h, ss, w, ss).mean(axis=(1, 3))
+        return np.asarray(color, dtype=np.float64), alpha[..., None]
+
+    def _board(self, reward_loc, collected):
+        """Background of a frame, cached per reward target and collection state."""
+        key = (reward_loc, bool(collected))
+        board = self.boards.get(key)
+        if board is not None:
+            return board
+        size, ss = self.size, SUPERSAMPLE
+        image = Image.new("RGB", (size * ss, size * ss), COLORS["white"])
+        draw = ImageDraw.Draw(image, "RGBA")
+        left, top, right, bottom = (v * ss for v in self.box)
+        # Change board face color when reward is collected.
+        draw.rectangle([left, top, right, bottom], fill=COLORS["xkcd_green"] if collected else COLORS["white"])
+        for k in range(self.grid_size + 1):
+            x = left + k * self.cell_w * ss
+            y = top + k * self.cell_h * ss
+            draw.line([(x, top), (x, bottom)], fill=COLORS["gray"], width=ss)
+            draw.line([(left, y), (right, y)], fill=COLORS["gray"], width=ss)
+        draw.rectangle([left, top, right, bottom], outline=(0, 0, 0), width=ss)
+        radius = self.marker_size / 2 * ss
+        if reward_loc is not None:
+            for direction in reward_loc[:2]:
+                coord = self._reward_coord(direction)
+                if coord is not None:
+                    cx, cy = (v * ss for v in self.to_pixel(*coord))
+                    draw.ellipse([cx - radius, cy - radius, cx + radius, cy + radius], fill=COLORS["marker_green"] + (128,))
+        else:
+            cx, cy = (v * ss for v in self.to_pixel(self.grid_size // 2, self.grid_size // 2))
+            draw.rectangle([cx - radius, cy - radius, cx + radius, cy + radius], fill=COLORS["marker_yellow"] + (128,))
+        board = np.asarray(image.resize((size, size), Image.LANCZOS), dtype=np.uint8)
+        self.boards[key] = board
+        return board
+
+    def _reward_coord(self, direction):
+        g = self.grid_size
+        return {"u": (g // 2, g - 1), "d": (g // 2, 0), "l": (0, g // 2), "r": (g - 1, g // 2)}.get(direction)
+
+    def _text(self, line):
+        """Coverage mask of one metadata line, cached by its content."""
+        mask = self.text_cache.get(line)
+        if mask is None:
+            image = Image.new("L", (self.size, self.line_height), 0)
+            ImageDraw.Draw(image).text((0, 0), line, fill=255, font=self.font)
+            mask = np.asarray(image, dtype=np.float64)[..., None] / 255
+            self.text_cache[line] = mask
+        return mask
+
+    def _blend(self, frame, color, alpha, x0, y0):
+        """Alpha-blend a sprite or text mask into a frame at (x0, y0), clipped to the image."""
+        h, w = alpha.shape[:2]
+        x1, y1 = max(x0, 0), max(y0, 0)
+        x2, y2 = min(x0 + w, frame.shape[1]), min(y0 + h, frame.shape[0])
+        if x1 >= x2 or y1 >= y2:
+            return
+        a = alpha[y1 - y0:y2 - y0, x1 - x0:x2 - x0]
+        region = frame[y1:y2, x1:x2]
+        region[:] = (region * (1 - a) + color * a + 0.5).astype(np.uint8)
+
+    def render(self, data):
+        """
+        Render frames from log columns.
+
+        Args:
+            data (dict): Columns a{i}x, a{i}y, reward_loc, steps_without_reward,
+                activated, collected, terminated and r1, e.g. from analysis.read_log.
+
+        Returns:
+            frames (np.ndarray): uint8 array of shape (n_frames, size, size, 3).
+        """
+        reward_locs = [None if loc is None or loc != loc else loc for loc in np.asarray(data["reward_loc"], dtype=object)]
+        collected = np.asarray(data["collected"], dtype=bool)
+        # All backgrounds at once: one gather over the distinct boards.
+        keys = list(zip(reward_locs, collected.tolist()))
+        distinct = list(dict.fromkeys(keys))
+        boards = np.stack([self._board(*key) for key in distinct])
+        lookup = {key: i for i, key in enumerate(distinct)}
+        frames = boards[np.fromiter((lookup[key] for key in keys), dtype=np.int64, count=len(keys))]
+
+        text_x = int(round(self.to_pixel(0.05, 0)[0]))
+        text_y = int(round(self.box[1]))
+        meta = {
+            "steps_without_reward": data["steps_without_reward"],
+            "activated": data["activated"],
+            "collected": data["collected"],
+            "terminated": data["terminated"],
+            "reward": data["r1"],
+        }
+        for n, frame in enumerate(frames):
+            for i, (color, alpha) in enumerate(self.sprites):
+                cx, cy = self.to_pixel(data[f"a{i+1}x"][n], data[f"a{i+1}y"][n])
+                self._blend(frame, color, alpha, int(round(cx - alpha.shape[1] / 2)), int(round(cy - alpha.shape[0] / 2)))
+            for k, field in enumerate(META_FIELDS):
+                self._blend(frame, 0.0, self._text(f"{field}: {meta[field][n]}"), text_x, text_y + k * self.line_height)
+        return frames
+
+def _render_range(args):
+    path, start, stop, grid_size, n_agents, size, palette = args
+    data = read_log(path, _columns(n_agents), frames=(start, stop - 1))
+    frames = FrameRenderer(grid_size, n_agents, size).render(data)
+    if palette is None:
+        return frames
+    return np.stack([_quantize(frame, palette) for frame in frames])
+
+def _columns(n_agents):
+    return ([f"a{i+1}{axis}" for i in range(n_agents) for axis in "xy"]
+            + ["reward_loc", "steps_without_reward", "activated", "collected", "terminated", "r1"])
+
+def _palette_image(palette):
+    image = Image.new("P", (1, 1))
+    image.putpalette(palette)
+    return image
+
+def _quantize(frame, palette):
+    """Palette indices of an RGB frame, nearest color, no dithering."""
+    image = Image.fromarray(frame).quantize(palette=_palette_image(palette), dither=Image.Dither.NONE)
+    return np.asarray(image)
+
+def gif_palette(frames, colors = 255):
+    """
+    One 256-color palette for a whole GIF, from a sample of its frames.
+
+    The frames only mix a handful of flat colors, so a palette taken from a few
+    of them fits the rest; mapping to a fixed palette is much cheaper than
+    quantizing every frame on its own, which is what the GIF encoders spend
+    their time on.
+    """
+    sample = np.concatenate(frames[::max(len(frames) // 16, 1)], axis=0)
+    return Image.fromarray(sample).quantize(colors=colors, method=Image.Quantize.MEDIANCUT).getpalette()
+
+def _frame_writer(output, interval, palette = None):
+    """
+    Return (append, close) for the output file. Frames are encoded as they arrive:
+    GIFs with Pillow's GIF encoder, from palette frames, one frame at a time;
+    other formats through imageio.
+    """
+    if output.lower().endswith(".gif"):
+        file = open(output, "wb")
+        started = False
+        def append(frame):
+            nonlocal started
+            image = Image.fromarray(frame, "P") if palette is not None else Image.fromarray(frame).quantize()
+            if palette is not None:
+                image.putpalette(palette)
+            if not started:
+                # Global header with the palette and the looping extension, written once.
+                header, _ = GifImagePlugin.getheader(image, info={"loop": 0, "optimize": False})
+                for block in header:
+                    file.write(block)
+                started = True
+            for block in GifImagePlugin.getdata(image, duration=interval, optimize=False):
+                file.write(block)
+        def close():
+            if started:
+                file.write(b";")
+            file.close()
+            if not started:
+                os.remove(output)
+        return append, close
+    try:
+        import imageio
+    except ImportError:
+        raise ImportError("Writing videos needs imageio, install it with `pip install imageio imageio-ffmpeg`.")
+    writer = imageio.get_writer(output, fps=1000 / interval)
+    return writer.append_data, writer.close
+
+def render_log(path, output, start_frame, end_frame, grid_size = 11, interval = 100, size = FIGURE_SIZE, n_workers = 1, chunk_size = 64):
+    """
+    Render a frame range of a Parquet log straight to a GIF or video file.
+
+    The range is read in chunks with row-group pruning, rendered (on worker
+    processes when n_workers > 1) and every frame is encoded into the file as
+    soon as its chunk is done, in frame order. Memory is bounded by the chunks
+    in flight (at most 2 * n_workers), whatever the length of the range. GIF
+    frames are mapped to one palette taken from the first chunk.
+
+    Args:
+        path (str): Frame log written by the Tracer, file or part-file directory.
+        output (str): .gif, or any video format imageio supports (e.g. .mp4).
+        start_frame (int): Starting frame number (inclusive).
+        end_frame (int): Ending frame number (inclusive).
+        grid_size (int): The size of the board.
+        interval (int): Interval (in ms) between frames.
+        size (int): Width and height of the images in pixels.
+        n_workers (int): Processes rendering chunks in parallel.
+        chunk_size (int): Frames per chunk.
+    """
+    _require_pillow()
+    n_agents = agent_columns(path)
+    ranges = [(start, min(start + chunk_size, end_frame + 1)) for start in range(start_frame, end_frame + 1, chunk_size)]
+    if not ranges:
+        return
+    palette = None
+    if output.lower().endswith(".gif"):
+        palette = gif_palette(_render_range((path, *ranges[0], grid_size, n_agents, size, None)))
+    jobs = [(path, start, stop, grid_size, n_agents, size, palette) for start, stop in ranges]
+    append, close = _frame_writer(output, interval, palette)
+    try:
+        if n_workers == 1:
+            for job in jobs:
+                for frame in _render_range(job):
+                    append(frame)
+            return
+        with ProcessPoolExecutor(n_workers) as pool:
+            # Keep a bounded window of chunks in flight and write them in order.
+            pending = deque()
+            jobs = iter(jobs)
+            for job in jobs:
+                pending.append(pool.submit(_render_range, job))
+                if len(pending) >= 2 * n_workers:
+                    break
+            while pending:
+                for frame in pending.popleft().result():
+                    append(frame)
+                job = next(jobs, None)
+                if job is not None:
+                    pending.append(pool.submit(_render_range, job))
+    finally:
+        close()
+
+def render_df(df, regime, start_frame, end_frame, grid_size = 11, size = FIGURE_SIZE):
+    """
+    Render a frame range of a log DataFrame, with the arguments of animate_simulation_by_df.
+
+    Returns:
+        frames (np.ndarray): uint8 array of shape (n_frames, size, size, 3).
+    """
+    subdf = df[(df['regime_idx'] == regime) &
+               (df['frame_idx'] >= start_frame) &
+               (df['frame_idx'] <= end_frame)].sort_values('frame_idx')
+    n_agents = sum(1 for name in subdf.columns if name.startswith("a") and name.endswith("x") and name[1:-1].isdigit())
+    return FrameRenderer(grid_size, n_agents, size).render({name: subdf[name].to_numpy() for name in _columns(n_agents)})
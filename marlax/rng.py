@@ -0,0 +1,74 @@
+import numpy as np
+
+# First word of the spawn key of each kind of consumer, so that a stream only
+# depends on the experiment seed and on who uses it, never on creation order.
+STREAM_KINDS = {"env": 0, "agent": 1, "worker_env": 2, "worker_agent": 3}
+
+class RandomStream:
+    def __init__(self, generator, block_size = 65_536):
+        """
+        Random numbers drawn from a NumPy Generator in blocks and consumed by index.
+
+        Implements the part of the `random` module used by agents and environments
+        (random, choice, randint), so it can be passed wherever the global module
+        was used. Each call takes exactly one uniform draw from the block, so the
+        sequence of results only depends on the generator's seed and the calls made.
+
+        Args:
+            generator (np.random.Generator): Source of the uniform draws.
+            block_size (int): Number of uniforms drawn at once.
+        """
+        self.generator = generator
+        self.block_size = block_size
+        self.block = []
+        self.index = 0
+
+    def _refill(self):
+        # Python floats, so the hot path never touches NumPy scalars.
+        self.block = self.generator.random(self.block_size).tolist()
+        self.index = 0
+
+    def random(self):
+        """Return a float in [0, 1)."""
+        if self.index >= len(self.block):
+            self._refill()
+        value = self.block[self.index]
+        self.index += 1
+        return value
+
+    def choice(self, seq):
+        """Return a uniformly chosen element of a non-empty sequence."""
+        return seq[int(self.random() * len(seq))]
+
+    def randint(self, a, b):
+        """Return an integer in [a, b], both included."""
+        return a + int(self.random() * (b - a + 1))
+
+class ExperimentRNG:
+    def __init__(self, seed, block_size = 65_536):
+        """
+        Independent random streams for every environment and agent of one experiment.
+
+        Streams are derived with np.random.SeedSequence from the experiment seed and
+        a fixed key per consumer, e.g. `rng.agent(1)` is the same stream whichever
+        process builds it and however many other streams were created before.
+
+        Args:
+            seed (int): Experiment seed.
+            block_size (int): Block size of the returned streams.
+        """
+        self.seed = seed
+        self.block_size = block_size
+
+    def stream(self, kind, index = 0):
+        """Return the stream of the `index`-th consumer of a kind, one of STREAM_KINDS."""
+        sequence = np.random.SeedSequence(self.seed, spawn_key=(STREAM_KINDS[kind], index))
+        return RandomStream(np.random.Generator(np.random.PCG64(sequence)), self.block_size)
+
+    def env(self, regime_idx = 0):
+        """Stream for the resets of the environment of a regime."""
+        return self.stream("env", regime_idx)
+
+    def agent(self, agent_id):
+        """Stream for the exploration of an agent."""
+        return self.stream("agent", agent_id)
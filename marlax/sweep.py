@@ -0,0 +1,283 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import socket
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from itertools import product
+
+def expand_grid(param_grid):
+    """
+    Expand a parameter grid into the list of its cells.
+
+    Args:
+        param_grid (dict): Parameter name -> list of values. A value may itself be a
+            list (e.g. a list of regimes); wrap it in another list to sweep over it.
+
+    Returns:
+        cells (list): One {name: value} dict per combination, in row-major order.
+    """
+    names = list(param_grid)
+    return [dict(zip(names, values)) for values in product(*(param_grid[name] for name in names))]
+
+def cell_id(params):
+    """Return a stable identifier of a cell, the same on every machine and rerun."""
+    encoded = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha1(encoded.encode()).hexdigest()[:16]
+
+def default_cost(params):
+    """Estimate the run time of a cell from its step counts, for longest-first scheduling."""
+    cost = 0
+    for name in ("num_steps", "nsteps"):
+        steps = params.get(name, 0)
+        cost += sum(steps) if isinstance(steps, (list, tuple)) else steps
+    return cost or 1
+
+class Sweep:
+    def __init__(self, fn, param_grid, sweep_dir, n_workers = None, memory_limit = None, pin_cores = True, cost = default_cost, cell_dir_arg = None):
+        """
+        Run a function over every cell of a parameter grid on a process pool.
+
+        Cells are started longest first (by `cost`), so the long runs do not end up
+        alone at the tail of the sweep. Every finished cell writes its record to
+        {sweep_dir}/cells/{cell_id}.json; cells with a "done" record are skipped when
+        the sweep is run again.
+
+        Several machines sharing `sweep_dir` can run the same sweep at once: a cell
+        is claimed by atomically creating {sweep_dir}/locks/{cell_id}.lock, so each
+        cell runs on one machine only. Locks of processes that died on this host are
+        reclaimed; locks from other hosts are left to their owner.
+
+        Args:
+            fn (callable): Picklable function called as fn(**params) for each cell.
+            param_grid (dict): Parameter name -> list of values, see `expand_grid`.
+            sweep_dir (str): Directory for the manifest, lock files and cell outputs.
+            n_workers (int): Number of worker processes. Defaults to the usable cores.
+            memory_limit (int): Address space limit of each worker in bytes. A cell that
+                exceeds it fails with MemoryError instead of taking the node down. A cell
+                whose worker is killed anyway (OOM killer, signal) is recorded as failed
+                and the other cells keep running, see `run`.
+            pin_cores (bool): Pin each worker to its own core (Linux only).
+            cost (callable): params -> estimated run time, used for ordering.
+            cell_dir_arg (str): If given, fn also receives the cell's output directory
+                {sweep_dir}/outputs/{cell_id} under this keyword.
+        """
+        self.fn = fn
+        self.cells = expand_grid(param_grid)
+        self.sweep_dir = sweep_dir
+        self.cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count()))
+        self.n_workers = n_workers or len(self.cores)
+        self.memory_limit = memory_limit
+        self.pin_cores = pin_cores and hasattr(os, "sched_setaffinity")
+        self.cost = cost
+        self.cell_dir_arg = cell_dir_arg
+        self.host = socket.gethostname()
+
+        for sub in ("cells", "locks", "outputs"):
+            os.makedirs(os.path.join(sweep_dir, sub), exist_ok=True)
+
+    def pending(self):
+        """Return (cell_id, params) of the cells without a "done" record, longest first."""
+        pending = []
+        for params in self.cells:
+            cid = cell_id(params)
+            record = self._read_record(cid)
+            if record is None or record["status"] != "done":
+                pending.append((cid, params))
+        return sorted(pending, key=lambda cell: self.cost(cell[1]), reverse=True)
+
+    def run(self):
+        """
+        Run every pending cell this machine can claim.
+
+        A worker killed from outside (OOM killer, SIGKILL) breaks the whole process
+        pool, and every cell running on it fails with BrokenProcessPool. The pool is
+        then rebuilt and those cells become suspects: they are queued again and run
+        alone, one at a time, until the cell that kills its worker is found. Only
+        that cell is recorded as failed.
+
+        Returns:
+            records (list): Manifest records of the cells run by this call.
+        """
+        pending = self.pending()
+        records = []
+        running = {}
+        suspects = set()
+        pool = self._start_pool()
+        try:
+            while pending or running:
+                # 1. Keep every worker busy, claiming cells only when a worker is free
+                #    so the remaining ones stay available to other machines. A suspect
+                #    runs alone, so a broken pool points at it.
+                broken = False
+                while pending and len(running) < self.n_workers:
+                    cid, params = pending[0]
+                    if running and (cid in suspects or any(c in suspects for c, _ in running.values())):
+                        break
+                    pending.pop(0)
+                    if not self._claim(cid):
+                        continue
+                    kwargs = dict(params)
+                    if self.cell_dir_arg:
+                        kwargs[self.cell_dir_arg] = os.path.join(self.sweep_dir, "outputs", cid)
+                    try:
+                        running[pool.submit(_run_cell, self.fn, kwargs)] = (cid, params)
+                    except BrokenProcessPool:
+                        self._release(cid)
+                        pending.insert(0, (cid, params))
+                        broken = True
+                        break
+                if not running and not broken:
+                    break
+
+                # 2. Record finished cells and release their locks.
+                done = set()
+                if running and not broken:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        record = future.result()
+                    except BrokenProcessPool:
+                        broken = True
+                        continue
+                    except Exception as e:
+                        record = {"status": "failed", "error": repr(e)}
+                    cid, params = running.pop(future)
+                    suspects.discard(cid)
+                    self._finish(cid, params, record, records)
+
+                # 3. A dead worker took the pool down with every cell running on it.
+                if broken:
+                    lost = list(running.values())
+                    running.clear()
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    pool = self._start_pool()
+                    if len(lost) == 1 and lost[0][0] in suspects:
+                        cid, params = lost[0]
+                        suspects.discard(cid)
+                        record = {"status": "failed", "error": "The worker process died (killed by a signal or out of memory)."}
+                        self._finish(cid, params, record, records)
+                    else:
+                        for cid, params in reversed(lost):
+                            self._release(cid)
+                            suspects.add(cid)
+                            pending.insert(0, (cid, params))
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+        return records
+
+    def _start_pool(self):
+        # Each worker takes one core from the queue when it starts.
+        cores = multiprocessing.Queue()
+        for i in range(self.n_workers):
+            cores.put(self.cores[i % len(self.cores)] if self.pin_cores else None)
+        return ProcessPoolExecutor(self.n_workers, initializer=_init_worker, initargs=(cores, self.memory_limit))
+
+    def _finish(self, cid, params, record, records):
+        """Write the record of a finished or failed cell and release its lock."""
+        record.update({"cell_id": cid, "params": params, "host": self.host})
+        self._write_record(cid, record)
+        self._release(cid)
+        records.append(record)
+
+    def manifest(self):
+        """Return the records of every finished or failed cell of the sweep."""
+        records = (self._read_record(cell_id(params)) for params in self.cells)
+        return [record for record in records if record is not None]
+
+    def _record_path(self, cid):
+        return os.path.join(self.sweep_dir, "cells", f"{cid}.json")
+
+    def _lock_path(self, cid):
+        return os.path.join(self.sweep_dir, "locks", f"{cid}.lock")
+
+    def _read_record(self, cid):
+        try:
+            with open(self._record_path(cid)) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def _write_record(self, cid, record):
+        # Write and rename, so readers on other machines never see half a record.
+        path = self._record_path(cid)
+        with open(f"{path}.{self.host}.tmp", "w") as file:
+            json.dump(record, file, default=repr)
+        os.replace(f"{path}.{self.host}.tmp", path)
+
+    def _claim(self, cid):
+        """Atomically take the lock of a cell. Returns False if another process holds it."""
+        path = self._lock_path(cid)
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self._reclaim_stale(path):
+                    return False
+                continue
+            with os.fdopen(fd, "w") as file:
+                json.dump({"host": self.host, "pid": os.getpid(), "time": time.time()}, file)
+            # Another machine may have finished the cell between listing and claiming.
+            record = self._read_record(cid)
+            if record is not None and record["status"] == "done":
+                self._release(cid)
+                return False
+            return True
+        return False
+
+    def _reclaim_stale(self, path):
+        """Remove a lock left by a dead process on this host. Returns True if removed."""
+        try:
+            with open(path) as file:
+                owner = json.load(file)
+        except (FileNotFoundError, ValueError):
+            # Gone, or still being written by its owner.
+            return False
+        if owner["host"] != self.host:
+            return False
+        try:
+            os.kill(owner["pid"], 0)
+            return False
+        except ProcessLookupError:
+            pass
+        except PermissionError:
+            return False
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return True
+
+    def _release(self, cid):
+        try:
+            os.remove(self._lock_path(cid))
+        except FileNotFoundError:
+            pass
+
+def _init_worker(cores, memory_limit):
+    core = cores.get()
+    if core is not None:
+        os.sched_setaffinity(0, {core})
+    if memory_limit is not None:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+def _run_cell(fn, kwargs):
+    start = time.time()
+    record = {"started": start, "pid": os.getpid()}
+    try:
+        result = fn(**kwargs)
+        record.update({"status": "done", "result": result})
+    except Exception:
+        record.update({"status": "failed", "error": traceback.format_exc()})
+    record["duration"] = time.time() - start
+    if "result" in record:
+        # Keep the manifest JSON; anything else is recorded by its repr.
+        try:
+            json.dumps(record["result"])
+        except TypeError:
+            record["result"] = repr(record["result"])
+    return record
@@ -1,31 +1,65 @@
 import shutil
 import os
+import numpy as np
 import pyarrow as pa
 import pyarrow.parquet as pq
 import pandas as pd
 import pickle
+import json
+import queue
+import threading
+from time import perf_counter
+
+from marlax.agents import QAgent
+from marlax.checkpoints import load_qtable, save_qtable
+from marlax.envs.gridworld.tables import REWARD_TARGETS
+from marlax.qtables import DenseQTable
 
 class Tracer:
     
-    def __init__(self, log_path):
+    def __init__(self, log_path, async_writes=False, max_pending_flushes=2, log_frames=True, trial_stats=False, occupancy=False, occupancy_every=None, resume=False):
         """
         Initialize the tracer.
         
         Args:
             log_path (str): Path to the log directory.
+            async_writes (bool): Hand full buffers to a background thread that converts
+                and writes them, instead of writing inside the training loop.
+            max_pending_flushes (int): Number of full buffers that may wait for the writer
+                thread before logging blocks. 0 never blocks, at the cost of unbounded memory.
+            log_frames (bool): Write every frame to logs/{who}_{regime_idx}.parquet.
+            trial_stats (bool): Aggregate trial-level records while logging and write them
+                to trial_stats/{who}_{regime_idx}.parquet.
+            occupancy (bool): Count the cells every agent visits, per reward target and per
+                phase (before or after activation), and write the counts to
+                occupancy/{who}_{regime_idx}.npz at the end of each run.
+            occupancy_every (int): Start a new set of counts every this many steps, e.g.
+                1_000_000 for one histogram per million steps. One set per run if None.
+            resume (bool): Keep the existing log directory so an interrupted run can
+                continue from its checkpoints instead of starting over.
         """
         
         # Logger attributes
         self.logger_active = False
-        self.log_buffer = []
+        self.log_buffer = None
+        self.log_size = 0
         self.flush_every = None
         self.regime_idx = None
         self.log_filename = None
         self.parquet_writer = None
         self.log_path = log_path
+        self.resume = resume
+        self.async_writes = async_writes
+        self.max_pending_flushes = max_pending_flushes
+        self.log_frames = log_frames
+        self.trial_stats = trial_stats
+        self.trial_aggregator = None
+        self.occupancy = occupancy
+        self.occupancy_every = occupancy_every
+        self.occupancy_counter = None
         
         # Remove folder if it exists
-        if os.path.exists(self.log_path):
+        if not resume and os.path.exists(self.log_path):
             shutil.rmtree(self.log_path)
     
     def _init_logger(self, flush_every, regime_idx, who="training"):
@@ -46,7 +80,7 @@ class Tracer:
         self.log_store = pd.HDFStore(self.log_filename, mode='a')
         self.logger_active = True
         
-    def _init_logger(self, flush_every, regime_idx, who="training"):
+    def _init_logger(self, flush_every, regime_idx, who="training", env=None, segmented=False, resume_state=None):
         """
         Initialize the logger that appends rows to a single Parquet file.
         
@@ -54,94 +88,668 @@ class Tracer:
             flush_every (int): Number of frames to buffer before writing to disk.
             regime_idx (int): Regime identifier that is recorded with each row.
             who (str): Label to differentiate logs (e.g. 'training' or 'test').
+            env: The environment being logged. Required for trial statistics.
+            segmented (bool): Write {who}_{regime_idx}.parquet as a directory of part files,
+                one per checkpoint interval, which pyarrow and pandas read as one dataset.
+            resume_state (dict): State returned by `_checkpoint_logger`. Parts written
+                after that checkpoint are dropped and logging continues with the next part.
         """
+        if self.trial_stats and env is not None:
+            # Checked before any file or thread is opened.
+            TrialStats.check_env(env)
         # Ensure the log directory exists.
         os.makedirs(self.log_path+"/logs", exist_ok=True)
         # Create the log filename.
-        self.log_filename = os.path.join(self.log_path+"/logs", f"{who}_{regime_idx}.parquet")
+        self.log_name = f"{who}_{regime_idx}.parquet"
+        self.segmented = segmented or resume_state is not None
+        self.log_part = 0 if resume_state is None else resume_state["log_part"]
+        if self.segmented:
+            for directory in (self.log_path+"/logs", self.log_path+"/trial_stats"):
+                self._drop_parts(os.path.join(directory, self.log_name), self.log_part)
+        self.log_filename = self._part_filename(self.log_path+"/logs")
         self.flush_every = flush_every
         self.regime_idx = regime_idx
-        self.log_buffer = []
+        self.log_buffer = None  # Column buffers are allocated on the first frame
+        self.log_size = 0
+        self.reward_loc_codes = {None: 0}
+        self.reward_loc_values = [None]
         self.parquet_writer = None  # We'll initialize this on the first flush
+        self.flush_latencies = []  # Seconds the training loop spent in each flush
         self.logger_active = True
+        if self.async_writes and self.log_frames:
+            self._start_writer()
+        if self.trial_stats:
+            if env is None:
+                raise ValueError("Trial statistics need the environment passed to _init_logger.")
+            os.makedirs(self.log_path+"/trial_stats", exist_ok=True)
+            self.trial_aggregator = TrialStats(env, self._part_filename(self.log_path+"/trial_stats"), flush_every)
+            if resume_state is not None:
+                self.trial_aggregator.restore_checkpoint_state(resume_state["trial_stats"])
+        if self.occupancy:
+            if env is None:
+                raise ValueError("Occupancy counts need the environment passed to _init_logger.")
+            os.makedirs(self.log_path+"/occupancy", exist_ok=True)
+            filename = os.path.join(self.log_path+"/occupancy", f"{who}_{regime_idx}.npz")
+            self.occupancy_counter = Occupancy(env, filename, self.occupancy_every)
+            if resume_state is not None:
+                self.occupancy_counter.restore_checkpoint_state(resume_state["occupancy"])
     
-    def _flush_buffer(self):
-        """Flush the log buffer to the Parquet file using PyArrow."""
-        if not self.log_buffer:
+    def _part_filename(self, directory):
+        """Return the file the current log part goes to inside `directory`."""
+        if not self.segmented:
+            return os.path.join(directory, self.log_name)
+        os.makedirs(os.path.join(directory, self.log_name), exist_ok=True)
+        return os.path.join(directory, self.log_name, f"part-{self.log_part:05d}.parquet")
+    
+    @staticmethod
+    def _drop_parts(directory, first_part):
+        """Delete the part files numbered `first_part` and above, e.g. written after the last checkpoint."""
+        if os.path.isfile(directory):
+            os.remove(directory)
+        if not os.path.isdir(directory):
             return
+        for filename in os.listdir(directory):
+            if filename.startswith("part-") and int(filename[5:10]) >= first_part:
+                os.remove(os.path.join(directory, filename))
+    
+    def _checkpoint_logger(self):
+        """
+        Close the current log part so that every frame logged so far is on disk,
+        and move on to the next part.
         
-        # Convert the buffer to a pandas DataFrame.
-        df = pd.DataFrame(self.log_buffer)
-        # Convert the DataFrame to a PyArrow Table.
-        table = pa.Table.from_pandas(df)
+        Returns:
+            state (dict): Position to pass back to `_init_logger` as resume_state.
+        """
+        self._close_log_file()
+        self.log_part += 1
+        self.log_filename = self._part_filename(self.log_path+"/logs")
+        if self.async_writes and self.log_frames:
+            self._start_writer()
+        state = {"log_part": self.log_part, "trial_stats": None, "occupancy": None}
+        if self.trial_aggregator is not None:
+            self.trial_aggregator.rotate(self._part_filename(self.log_path+"/trial_stats"))
+            state["trial_stats"] = self.trial_aggregator.checkpoint_state()
+        if self.occupancy_counter is not None:
+            state["occupancy"] = self.occupancy_counter.checkpoint_state()
+        return state
+    
+    def _init_buffer(self, n_agents, reward_dtype):
+        """
+        Set up the column layout and the Parquet schema, then allocate the first buffer.
         
-        if self.parquet_writer is None:
-            # Create a ParquetWriter with the schema inferred from the first flush.
-            self.parquet_writer = pq.ParquetWriter(self.log_filename, table.schema)
+        Args:
+            n_agents (int): Number of agents in the frames.
+            reward_dtype (np.dtype): Type of the reward columns.
+        """
+        # Columns in the order of the Parquet schema, regime_idx being constant per file.
+        self.log_dtypes = {
+            "frame_idx": np.int64,
+            "reward_loc": np.int32,  # Codes into reward_loc_values
+            "activated": bool,
+            "collected": bool,
+            "terminated": bool,
+            "steps_without_reward": np.int64,
+        }
+        for i in range(n_agents):
+            self.log_dtypes[f"a{i+1}x"] = np.int64
+            self.log_dtypes[f"a{i+1}y"] = np.int64
+        for i in range(n_agents):
+            self.log_dtypes[f"r{i+1}"] = reward_dtype
+        self.log_n_agents = n_agents
+        self.log_schema = pa.schema(
+            [("regime_idx", pa.int64()), ("frame_idx", pa.int64()), ("reward_loc", pa.string())]
+            + [(name, pa.from_numpy_dtype(np.dtype(dtype))) for name, dtype in self.log_dtypes.items()
+               if name not in ("frame_idx", "reward_loc")]
+        )
+        self._set_buffer(self._allocate_buffer())
+    
+    def _allocate_buffer(self):
+        """Allocate one typed column buffer of `flush_every` rows per logged field."""
+        return {name: np.empty(self.flush_every, dtype=dtype) for name, dtype in self.log_dtypes.items()}
+    
+    def _set_buffer(self, buffer):
+        """Make `buffer` the one frames are written into."""
+        self.log_buffer = buffer
+        self.position_columns = [(buffer[f"a{i+1}x"], buffer[f"a{i+1}y"]) for i in range(self.log_n_agents)]
+        self.reward_columns = [buffer[f"r{i+1}"] for i in range(self.log_n_agents)]
+        self.log_size = 0
+    
+    def _flush_buffer(self):
+        """
+        Flush the log buffer to the Parquet file using PyArrow.
+        In async mode the buffer is handed to the writer thread and a free one takes its place.
+        """
+        if not self.log_size:
+            return
         
+        start = perf_counter()
+        if self.async_writes:
+            self._raise_writer_error()
+            # Blocks while max_pending_flushes buffers are already waiting.
+            self.write_queue.put((self.log_buffer, self.log_size, list(self.reward_loc_values)))
+            try:
+                buffer = self.free_buffers.get_nowait()
+            except queue.Empty:
+                buffer = self._allocate_buffer()
+            self._set_buffer(buffer)
+        else:
+            self._write_table(self._buffer_to_table(self.log_buffer, self.log_size, self.reward_loc_values))
+            self.log_size = 0
+        self.flush_latencies.append(perf_counter() - start)
+    
+    def _write_table(self, table):
+        """Append a row group, creating the Parquet writer on the first one."""
+        if self.parquet_writer is None:
+            self.parquet_writer = pq.ParquetWriter(self.log_filename, self.log_schema)
         self.parquet_writer.write_table(table)
-        self.log_buffer = []
+    
+    def _buffer_to_table(self, buffer, size, reward_loc_values):
+        """Build a PyArrow table from the first `size` rows of the column buffers."""
+        # reward_loc is dictionary-encoded in the buffer and decoded to strings for the file;
+        # non-string targets (Pong's ball codes) are written as their str().
+        reward_loc = pa.DictionaryArray.from_arrays(
+            pa.array(buffer["reward_loc"][:size]),
+            pa.array([value if value is None or isinstance(value, str) else str(value) for value in reward_loc_values],
+                     type=pa.string()),
+        ).dictionary_decode()
+        arrays = [pa.array(np.full(size, self.regime_idx, dtype=np.int64)),
+                  pa.array(buffer["frame_idx"][:size]),
+                  reward_loc]
+        arrays += [pa.array(column[:size]) for name, column in buffer.items() if name not in ("frame_idx", "reward_loc")]
+        return pa.Table.from_arrays(arrays, schema=self.log_schema)
+    
+    def _start_writer(self):
+        """Start the thread that converts and writes handed-off buffers."""
+        self.write_queue = queue.Queue(maxsize=self.max_pending_flushes)
+        self.free_buffers = queue.Queue()
+        self.writer_error = None
+        self.writer_thread = threading.Thread(target=self._writer_loop, name="marlax-tracer-writer", daemon=True)
+        self.writer_thread.start()
+    
+    def _writer_loop(self):
+        """
+        Write buffers from the queue until the None sentinel arrives, then close the file.
+        PyArrow releases the GIL while converting and compressing, so this overlaps the training loop.
+        After a failure, buffers are still drained so the training loop never blocks on a dead writer.
+        """
+        while True:
+            item = self.write_queue.get()
+            if item is None:
+                break
+            if self.writer_error is not None:
+                continue
+            buffer, size, reward_loc_values = item
+            try:
+                self._write_table(self._buffer_to_table(buffer, size, reward_loc_values))
+            except BaseException as e:
+                self.writer_error = e
+            # Frame blocks from _log_block are not buffers of this tracer and are dropped.
+            if len(buffer["frame_idx"]) == self.flush_every:
+                self.free_buffers.put(buffer)
+        try:
+            if self.parquet_writer is not None:
+                self.parquet_writer.close()
+        except BaseException as e:
+            if self.writer_error is None:
+                self.writer_error = e
+    
+    def _raise_writer_error(self):
+        """Re-raise a failure of the writer thread in the training process."""
+        if self.writer_error is not None:
+            raise RuntimeError(f"Tracer writer thread failed while writing {self.log_filename}") from self.writer_error
     
     def _log_frame(self, step, next_state, rewards, info):
         """
-        Build a row from the current frame data and add it to the log buffer.
+        Write the current frame data into the column buffers.
         Flush to disk when the buffer size reaches flush_every.
         """
         # Expect next_state to be a tuple: (agent_states, reward_loc)
         agent_states, reward_loc = next_state
-        row = {
-            "regime_idx": self.regime_idx,
-            "frame_idx": step,
-            "reward_loc": reward_loc,
-            "activated": info["activated"],
-            "collected": info["collected"],
-            "terminated": info["terminated"],
-            "steps_without_reward": info["steps_without_reward"]
-        }
+        if self.trial_aggregator is not None:
+            self.trial_aggregator.add_frame(step, agent_states, reward_loc, rewards, info)
+        if self.occupancy_counter is not None:
+            self.occupancy_counter.add_frame(step, agent_states, reward_loc, info)
+        if not self.log_frames:
+            return
+        if self.log_buffer is None:
+            self._init_buffer(len(agent_states), np.asarray(rewards).dtype)
+        
+        buffer = self.log_buffer
+        row = self.log_size
+        reward_loc_code = self.reward_loc_codes.get(reward_loc)
+        if reward_loc_code is None:
+            reward_loc_code = self.reward_loc_codes[reward_loc] = len(self.reward_loc_values)
+            self.reward_loc_values.append(reward_loc)
+        
+        buffer["frame_idx"][row] = step
+        buffer["reward_loc"][row] = reward_loc_code
+        buffer["activated"][row] = info["activated"]
+        buffer["collected"][row] = info["collected"]
+        buffer["terminated"][row] = info["terminated"]
+        buffer["steps_without_reward"][row] = info["steps_without_reward"]
         # Add agent coordinates.
-        for i, (x, y) in enumerate(agent_states):
-            row[f"a{i+1}x"] = x
-            row[f"a{i+1}y"] = y
+        for (x, y), (x_column, y_column) in zip(agent_states, self.position_columns):
+            x_column[row] = x
+            y_column[row] = y
         # Add rewards.
-        for i, reward in enumerate(rewards):
-            row[f"r{i+1}"] = reward
+        for reward, reward_column in zip(rewards, self.reward_columns):
+            reward_column[row] = reward
         
-        self.log_buffer.append(row)
-        if len(self.log_buffer) >= self.flush_every:
+        self.log_size = row + 1
+        if self.log_size >= self.flush_every:
             self._flush_buffer()
     
+    def _log_block(self, block, reward_loc_values):
+        """
+        Write a block of frames collected elsewhere, e.g. by a training worker process,
+        after the frames logged so far.
+        
+        Args:
+            block (dict): Column arrays named like the log buffer, frame_idx included,
+                with reward_loc as codes into reward_loc_values.
+            reward_loc_values (list): Reward targets of the block's reward_loc codes.
+        """
+        if not self.log_frames:
+            return
+        if self.log_buffer is None:
+            n_agents = sum(1 for name in block if name.startswith("r") and name[1:].isdigit())
+            self._init_buffer(n_agents, block["r1"].dtype)
+        self._flush_buffer()
+        # Same column order as the schema.
+        block = {name: np.asarray(block[name], dtype=dtype) for name, dtype in self.log_dtypes.items()}
+        size = len(block["frame_idx"])
+        start = perf_counter()
+        if self.async_writes:
+            self._raise_writer_error()
+            self.write_queue.put((block, size, list(reward_loc_values)))
+        else:
+            self._write_table(self._buffer_to_table(block, size, reward_loc_values))
+        self.flush_latencies.append(perf_counter() - start)
+    
     def _flush_logger(self):
         """
         Flush any remaining buffered rows and close the Parquet writer.
+        In async mode, wait for the writer thread to drain and raise its error if it failed.
         """
         if self.logger_active:
-            if self.log_buffer:
-                self._flush_buffer()
-            if self.parquet_writer is not None:
-                self.parquet_writer.close()
             self.logger_active = False
+            if self.trial_aggregator is not None:
+                self.trial_aggregator.close()
+                self.trial_aggregator = None
+            if self.occupancy_counter is not None:
+                self.occupancy_counter.close()
+                self.occupancy_counter = None
+            self._close_log_file()
+    
+    def _close_log_file(self):
+        """Write out the buffered frames and close the current Parquet file."""
+        if self.async_writes and self.log_frames:
+            try:
+                self._flush_buffer()
+            finally:
+                self.write_queue.put(None)
+                self.writer_thread.join()
+            self.parquet_writer = None
+            self._raise_writer_error()
+            return
+        if self.log_size:
+            self._flush_buffer()
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+            self.parquet_writer = None
             
-    def export_agents(self, env):
+    def _write_profile(self, summary):
+        """Write a Profiler summary to profiles/{who}_{regime_idx}.json."""
+        os.makedirs(self.log_path+"/profiles", exist_ok=True)
+        filename = os.path.join(self.log_path+"/profiles", f"{summary['who']}_{summary['regime_idx']}.json")
+        with open(filename, "w") as file:
+            json.dump(summary, file, indent=2)
+    
+    def _write_convergence(self, summary):
+        """Write a ConvergenceMonitor summary, with the step training stopped at, to convergence/training_{regime_idx}.json."""
+        os.makedirs(self.log_path+"/convergence", exist_ok=True)
+        filename = os.path.join(self.log_path+"/convergence", f"training_{summary['regime_idx']}.json")
+        with open(filename, "w") as file:
+            json.dump(summary, file, indent=2)
+    
+    def export_agents(self, env, as_dict=False, format="pickle"):
         """
         Export agents to a file.
+        
+        Args:
+            env: Environment holding the agents.
+            as_dict (bool): Convert dense Q-tables to the dict layout before pickling,
+                so that analysis code written for dict Q-tables can read them.
+            format (str): "pickle" writes qvals/agent_{idx}.pkl. "npy" writes the
+                memory-mappable qvals/agent_{idx}/ directory of `marlax.checkpoints`;
+                it only takes tabular agents, a DeepQAgent raises TypeError.
         """
         os.makedirs(self.log_path+"/qvals", exist_ok=True)
         for idx, agent in enumerate(env.agents):
+            q_table = agent.q_table
+            if format == "npy":
+                save_qtable(f"{self.log_path}/qvals/agent_{idx}", q_table, env.grid, len(env.agents),
+                            agent.__class__.__name__, agent.actions, regime=env.__class__.__name__,
+                            action_values=isinstance(agent, QAgent))
+                continue
+            if as_dict and isinstance(q_table, DenseQTable):
+                q_table = q_table.to_dict(agent.actions if q_table.values.ndim == 2 else None)
             filename = f"{self.log_path}/qvals/agent_{idx}.pkl"
             with open(filename, "wb") as file:
-                pickle.dump(agent.q_table, file)
+                pickle.dump(q_table, file)
+    
+    def export_policy(self, policy, regime_idx):
+        """
+        Save a compiled GreedyPolicy to policies/{regime_idx}/, next to the exported
+        Q-tables, so later evaluations can load it with marlax.policy.load_policy.
+        """
+        path = f"{self.log_path}/policies/{regime_idx}"
+        policy.save(path)
+        return path
     
-    def import_agents(self, agent):
+    def import_agents(self, agent, mmap=False):
         """
         Import agents from a file.
+        
+        Args:
+            agent: Agent class to instantiate for every exported Q-table.
+            mmap (bool): For tables exported with format="npy", attach a read-only
+                memory-mapped view instead of materializing the dict. Such agents
+                can be tested but not trained.
         """
         all_agents = []
         
-        # load all the pkl files in the folder
-        for filename in os.listdir(self.log_path+"/qvals"):
+        # load all the exported Q-tables in the folder
+        for filename in sorted(os.listdir(self.log_path+"/qvals")):
+            path = f"{self.log_path}/qvals/{filename}"
             if filename.endswith(".pkl"):
-                with open(f"{self.log_path}/qvals/{filename}", "rb") as file:
+                with open(path, "rb") as file:
                     a = agent()
                     a.q_table = pickle.load(file)
                     all_agents.append(a)
-        return all_agents
\ No newline at end of file
+            elif os.path.exists(f"{path}/meta.json"):
+                view = load_qtable(path, mmap_mode="r" if mmap else None)
+                a = agent()
+                a.q_table = view if mmap else view.to_dict()
+                all_agents.append(a)
+        return all_agents
+
+class TrialStats:
+    
+    # Trial-level columns, matching the per-trial tables built in the analysis notebooks.
+    schema = pa.schema([
+        ("trial_id", pa.int64()),
+        ("trial_length", pa.int64()),
+        ("activated", pa.bool_()),
+        ("collected", pa.bool_()),
+        ("wz_cancel", pa.bool_()),
+        ("collected_zone", pa.string()),
+        ("reward_loc", pa.string()),
+        ("activated_by", pa.string()),
+        ("activated_frame", pa.int64()),
+        ("first_close_to_zone", pa.string()),
+        ("first_close_to_zone_frame", pa.int64()),
+        ("first_to_zone", pa.string()),
+        ("first_to_zone_frame", pa.int64()),
+        ("reward_counter", pa.float64()),
+    ])
+    
+    def __init__(self, env, filename, flush_every, closeness_thresh=2):
+        """
+        Aggregate trial-level statistics frame by frame, with O(1) state per trial.
+        
+        A trial ends on a frame with terminated == True, like splitting the frame log on
+        terminated.cumsum().shift(). The leader statistics depend on the reward target,
+        which is only known at the end of a trial, so the first frame each single reward
+        zone was approached or reached (and by whom) is tracked for all zones at once.
+        Zone frames are frame indices, activated_frame is relative to the trial start.
+        
+        Args:
+            env: The GridWorld whose frames are aggregated.
+            filename (str): Parquet file the trial records are written to.
+            flush_every (int): Number of trial records to buffer before writing to disk.
+            closeness_thresh (float): Euclidean distance counted as close to a zone.
+        """
+        self.check_env(env)
+        self.filename = filename
+        self.flush_every = flush_every
+        self.no_reward_threshold = env.no_reward_threshold
+        self.center_pos = env.center_pos
+        self.zone_coords = {zone: env.reward_place_to_coord[zone][0] for zone in "urdl"}
+        self.coord_zones = {coord: zone for zone, coord in self.zone_coords.items()}
+        self.target_zones = {
+            target: tuple(self.coord_zones[coord] for coord in coords)
+            for target, coords in env.reward_place_to_coord.items()
+        }
+        # Zones within reach of every cell, so a frame costs one lookup per agent.
+        self.near_zones = {}
+        for x in range(env.grid[0]):
+            for y in range(env.grid[1]):
+                self.near_zones[(x, y)] = tuple(
+                    zone for zone, (zx, zy) in self.zone_coords.items()
+                    if ((x - zx) ** 2 + (y - zy) ** 2) ** 0.5 <= closeness_thresh
+                )
+        self.records = {name: [] for name in self.schema.names}
+        self.parquet_writer = None
+        self.trial_id = 0
+        self._start_trial()
+    
+    @staticmethod
+    def check_env(env):
+        """Raise TypeError for environments without the GridWorld reward zones the statistics are about."""
+        missing = [name for name in ("no_reward_threshold", "center_pos", "reward_place_to_coord") if not hasattr(env, name)]
+        if missing:
+            raise TypeError(f"Trial statistics are computed for GridWorld reward zones; {type(env).__name__} "
+                            f"has no {', '.join(missing)}. Use a Tracer with trial_stats=False.")
+    
+    # Attributes holding the state of the unfinished trial.
+    trial_fields = ("trial_id", "trial_length", "trial_start", "reward_counter", "activated_frame",
+                    "activated_by", "first_close", "first_on", "last_frame")
+    
+    def _start_trial(self):
+        self.trial_length = 0
+        self.trial_start = None
+        self.reward_counter = 0
+        self.activated_frame = None
+        self.activated_by = None
+        # zone -> (frame, agents at that frame)
+        self.first_close = {}
+        self.first_on = {}
+        self.last_frame = None
+    
+    def add_frame(self, step, agent_states, reward_loc, rewards, info):
+        """Fold one frame into the current trial and close the trial on termination."""
+        if self.trial_length == 0:
+            self.trial_start = step
+        self.trial_length += 1
+        self.reward_counter += rewards[0]
+        
+        if info["activated"] and self.activated_frame is None:
+            self.activated_frame = step - self.trial_start
+            at_center = [i for i, position in enumerate(agent_states) if position == self.center_pos]
+            if len(at_center) > 1:
+                self.activated_by = "tie"
+            elif at_center:
+                self.activated_by = f"a{at_center[0]+1}"
+        
+        if len(self.first_on) < 4:
+            for i, position in enumerate(agent_states):
+                for zone in self.near_zones[position]:
+                    first = self.first_close.get(zone)
+                    if first is None:
+                        self.first_close[zone] = (step, [i])
+                    elif first[0] == step:
+                        first[1].append(i)
+                zone = self.coord_zones.get(position)
+                if zone is not None:
+                    first = self.first_on.get(zone)
+                    if first is None:
+                        self.first_on[zone] = (step, [i])
+                    elif first[0] == step:
+                        first[1].append(i)
+        
+        self.last_frame = (agent_states, reward_loc, info["collected"], info["steps_without_reward"])
+        if info["terminated"]:
+            self._end_trial()
+    
+    def _leader(self, firsts, zones):
+        """
+        Return (who, frame) for the first frame any agent met one of `zones`, scanning the
+        zones in target order and calling it a tie when several agents met the same zone.
+        """
+        frames = [firsts[zone][0] for zone in zones if zone in firsts]
+        if not frames:
+            return None, None
+        frame = min(frames)
+        for zone in zones:
+            if zone in firsts and firsts[zone][0] == frame:
+                agents = firsts[zone][1]
+                return ("tie" if len(agents) > 1 else f"a{agents[0]+1}"), frame
+    
+    def _end_trial(self):
+        """Append the record of the current trial and start a new one."""
+        if self.trial_length == 0:
+            return
+        agent_states, reward_loc, collected, steps_without_reward = self.last_frame
+        zones = self.target_zones.get(reward_loc, ()) if reward_loc not in ['None', None] else ()
+        first_close_to_zone, first_close_to_zone_frame = self._leader(self.first_close, zones)
+        first_to_zone, first_to_zone_frame = self._leader(self.first_on, zones)
+        record = {
+            "trial_id": self.trial_id,
+            "trial_length": self.trial_length,
+            "activated": self.activated_frame is not None,
+            "collected": bool(collected),
+            "wz_cancel": (not collected) and steps_without_reward < self.no_reward_threshold + 1,
+            "collected_zone": self.coord_zones.get(agent_states[0]) if collected else None,
+            "reward_loc": reward_loc,
+            "activated_by": self.activated_by,
+            "activated_frame": self.activated_frame,
+            "first_close_to_zone": first_close_to_zone,
+            "first_close_to_zone_frame": first_close_to_zone_frame,
+            "first_to_zone": first_to_zone,
+            "first_to_zone_frame": first_to_zone_frame,
+            "reward_counter": float(self.reward_counter),
+        }
+        for name, value in record.items():
+            self.records[name].append(value)
+        self.trial_id += 1
+        self._start_trial()
+        if len(self.records["trial_id"]) >= self.flush_every:
+            self._flush()
+    
+    def _flush(self):
+        """Write the buffered trial records as one row group."""
+        if not self.records["trial_id"]:
+            return
+        table = pa.Table.from_pydict(self.records, schema=self.schema)
+        if self.parquet_writer is None:
+            self.parquet_writer = pq.ParquetWriter(self.filename, self.schema)
+        self.parquet_writer.write_table(table)
+        self.records = {name: [] for name in self.schema.names}
+    
+    def rotate(self, filename):
+        """Close the current file, keeping the unfinished trial, and continue in `filename`."""
+        self._flush()
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+            self.parquet_writer = None
+        self.filename = filename
+    
+    def checkpoint_state(self):
+        """Return the unfinished trial, to be restored with `restore_checkpoint_state`."""
+        return {name: getattr(self, name) for name in self.trial_fields}
+    
+    def restore_checkpoint_state(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+    
+    def close(self):
+        """Record the unfinished last trial, flush and close the file."""
+        self._end_trial()
+        self._flush()
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+
+class Occupancy:
+    
+    # Phases of a trial: before the center activated the reward zones, and from the
+    # activating frame until the trial terminates.
+    phases = ("before_activation", "after_activation")
+    
+    def __init__(self, env, filename, chunk_every=None):
+        """
+        Count the cells visited by every agent, frame by frame, into small integer arrays.
+        
+        Counts are kept per reward target (REWARD_TARGETS order, None being the center
+        phase), per phase and per agent, as one array of shape
+        (len(REWARD_TARGETS), 2, n_agents, width, height) per chunk of steps. A frame is
+        one flat index computation and one increment per agent.
+        
+        Args:
+            env: The GridWorld whose frames are counted.
+            filename (str): .npz file the counts are written to on close.
+            chunk_every (int): Steps per chunk; a chunk covers steps
+                [k * chunk_every, (k + 1) * chunk_every). One chunk if None.
+        """
+        self.filename = filename
+        self.chunk_every = chunk_every
+        n_agents = len(env.agents)
+        self.shape = (len(REWARD_TARGETS), len(self.phases), n_agents) + tuple(env.grid)
+        self.target_codes = {target: code for code, target in enumerate(REWARD_TARGETS)}
+        self.height = env.grid[1]
+        # Offset of (target, phase) and of each agent in the flattened array.
+        self.agent_offsets = [i * env.grid[0] * self.height for i in range(n_agents)]
+        self.phase_stride = n_agents * env.grid[0] * self.height
+        self.chunks = {}
+        self.chunk = None
+        self.counts = None
+        # info["activated"] only marks the activating frame; the phase lasts until the trial ends.
+        self.activated_this_trial = False
+    
+    def _start_chunk(self, chunk):
+        self.chunk = chunk
+        counts = self.chunks.get(chunk)
+        if counts is None:
+            counts = self.chunks[chunk] = np.zeros(self.shape, dtype=np.int64)
+        self.counts = counts.reshape(-1)
+    
+    def add_frame(self, step, agent_states, reward_loc, info):
+        """Count the cell of every agent in this frame."""
+        chunk = step // self.chunk_every if self.chunk_every else 0
+        if chunk != self.chunk:
+            self._start_chunk(chunk)
+        if info["activated"]:
+            self.activated_this_trial = True
+        code = self.target_codes.get(reward_loc, 0)
+        base = (2 * code + self.activated_this_trial) * self.phase_stride
+        counts, height = self.counts, self.height
+        for (x, y), offset in zip(agent_states, self.agent_offsets):
+            counts[base + offset + x * height + y] += 1
+        if info["terminated"]:
+            self.activated_this_trial = False
+    
+    def checkpoint_state(self):
+        """Return the counts so far and the trial phase, to be restored with `restore_checkpoint_state`."""
+        return {"chunks": {chunk: counts.copy() for chunk, counts in self.chunks.items()},
+                "activated_this_trial": self.activated_this_trial}
+    
+    def restore_checkpoint_state(self, state):
+        self.chunks = {chunk: counts.copy() for chunk, counts in state["chunks"].items()}
+        self.activated_this_trial = state["activated_this_trial"]
+        self.chunk = None
+    
+    def close(self):
+        """
+        Write the counts to the .npz file:
+            counts: int64 array (n_chunks, n_targets, 2, n_agents, width, height).
+            chunk_start: first step of every chunk.
+            targets: reward target names, "None" for no target.
+            phases: phase names.
+        """
+        chunks = sorted(self.chunks)
+        counts = np.stack([self.chunks[chunk] for chunk in chunks]) if chunks else np.zeros((0,) + self.shape, dtype=np.int64)
+        np.savez(self.filename,
+                 counts=counts,
+                 chunk_start=np.array([chunk * (self.chunk_every or 0) for chunk in chunks], dtype=np.int64),
+                 targets=np.array([str(target) for target in REWARD_TARGETS]),
+                 phases=np.array(self.phases))
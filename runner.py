@@ -2,9 +2,11 @@
 from marlax.agents import QAgent, QValueAgent
 from marlax.envs import GridWorld_r0, GridWorld_r3, GridWorld_r4
 from marlax import Engine, Tracer
+from marlax.policy import compile_policy
+from marlax.rng import ExperimentRNG
 
 # %%
-from joblib import Parallel, delayed
+from marlax.sweep import Sweep
 
 # %%
 def train_and_test( seed=42, 
@@ -16,33 +18,48 @@ def train_and_test( seed=42,
                     epsilon_start=0.99,
                     epsilon_end=0.4,
                     alpha=0.1,
-                    gamma=0.9 ): 
+                    gamma=0.9,
+                    regimes=("r0", "r3"),
+                    nsteps=(1_000_000, 200_000_000),
+                    log_path=None ): 
 
-    # Set the random seed for reproducibility.
-    # random.seed(seed)
+    # Independent random streams for every agent and environment, derived from the seed.
+    rng = ExperimentRNG(seed)
 
     # Agents
     target_rewards = [target_reward] * n_agents  # Reward for each agent when target is met
-    agents = [QValueAgent() for _ in range(n_agents)] 
-    # agents = [QAgent() for _ in range(n_agents)] 
+    agents = [QValueAgent(rng=rng.agent(i)) for i in range(n_agents)] 
+    # agents = [QAgent(rng=rng.agent(i)) for i in range(n_agents)] 
 
     # List the environments and train sequentially.
-    environments = [GridWorld_r0, GridWorld_r3]
-    nsteps = [1_000_000, 200_000_000]
+    regime_classes = {"r0": GridWorld_r0, "r3": GridWorld_r3, "r4": GridWorld_r4}
+    environments = [regime_classes[r] for r in regimes]
     
-    tracer = Tracer(f"store/{seed}")
+    tracer = Tracer(log_path or f"store/{seed}")
     trainer = Engine(epsilon_start, epsilon_end, epsilon_test=0.0)
     
     for (i, e), steps in zip(enumerate(environments), nsteps):
         # Create one environment per regime.
-        environment = e(grid_size, agents, target_rewards, together_reward, travel_reward)
+        environment = e(grid_size, agents, target_rewards, together_reward, travel_reward, rng=rng.env(i))
         trainer.train(environment, tracer, num_steps=steps, alpha=alpha, gamma=gamma, regime_idx=i)
-        trainer.test(environment, tracer, num_steps=10_000_00, regime_idx=i)
+        # The Q-tables are frozen while testing, so the greedy actions are looked up.
+        policy = compile_policy(environment)
+        tracer.export_policy(policy, i)
+        trainer.test(environment, tracer, num_steps=10_000_00, regime_idx=i, policy=policy)
     tracer.export_agents(environment)
 
 # %%
 if __name__ == '__main__':
-    seeds = list(range(100))
-    results = Parallel(n_jobs=-1)(delayed(train_and_test)(seed=s) for s in seeds)
+    param_grid = {
+        "seed": list(range(100)),
+        "alpha": [0.1],
+        "gamma": [0.9],
+        "regimes": [("r0", "r3")],
+        "nsteps": [(1_000_000, 200_000_000)],
+    }
+    # Rerunning skips finished seeds; other machines can join on the same store/.
+    # Logs still go to store/{seed}; store/sweep only holds the manifest and locks.
+    sweep = Sweep(train_and_test, param_grid, "store/sweep")
+    sweep.run()
 
 